@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Module: bandwidth
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import json
+import os
+import time
+import traceback
+
+THROUGHPUT = 'throughput'
+# Samples smaller than this say more about latency than throughput
+MIN_SAMPLE_BYTES = 256 * 1024
+MIN_SAMPLE_SECONDS = 0.05
+# Only use this share of the measured throughput for the stream
+HEADROOM = 0.8
+
+
+class ThroughputEstimator:
+    """Rolling (exponentially weighted) throughput estimate kept in the profile."""
+
+    def __init__(self, profile, alpha=0.3, max_age=7 * 24 * 3600):
+        self.path = os.path.join(profile, THROUGHPUT)
+        self.alpha = alpha
+        self.max_age = max_age
+
+    def _load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as file:
+                return json.loads(file.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def record(self, nbytes, seconds):
+        """Add a measurement of nbytes transferred in given seconds."""
+        if nbytes < MIN_SAMPLE_BYTES or seconds < MIN_SAMPLE_SECONDS:
+            return
+        rate = nbytes / float(seconds)
+        state = self._load()
+        if state.get('bps') and time.time() - state.get('updated', 0) < self.max_age:
+            rate = self.alpha * rate + (1 - self.alpha) * state['bps']
+            samples = state.get('samples', 0) + 1
+        else:
+            samples = 1
+        state = {'bps': rate, 'samples': samples, 'updated': int(time.time())}
+        tmp = self.path + '.tmp'
+        try:
+            with io.open(tmp, 'w', encoding='utf8') as file:
+                file.write(json.dumps(state))
+            os.replace(tmp, self.path)
+        except Exception:
+            traceback.print_exc()
+
+    def estimate(self):
+        """Return estimated throughput in bytes per second or None."""
+        state = self._load()
+        if not state.get('bps') or time.time() - state.get('updated', 0) > self.max_age:
+            return None
+        return state['bps']
+
+
+def probe(session, link, nbytes=1024 * 1024, timeout=10):
+    """Read the start of a link, return (bytes received, seconds) or None when it fails.
+
+    Time is counted from the first received byte, so the connection setup
+    does not lower the throughput figure.
+    """
+    response = session.get(link, headers={'Range': 'bytes=0-%d' % (nbytes - 1)},
+                           stream=True, timeout=timeout)
+    try:
+        if response.status_code not in (200, 206):
+            return None
+        received = 0
+        first = None
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if first is None:
+                first = time.time()
+            received += len(chunk)
+            if received >= nbytes:
+                break
+        if first is None:
+            return None
+        return received, time.time() - first
+    finally:
+        response.close()
+
+
+def bitrate(size, duration):
+    """Average bitrate of a file in bytes per second."""
+    try:
+        return int(size) / float(duration)
+    except (ValueError, TypeError, ZeroDivisionError):
+        return None
+
+
+def pick_streamable(candidates, throughput, duration):
+    """Pick the best candidate which streams without stalling.
+
+    Candidates are ordered from the best to the worst filename score and
+    duration(candidate) gives the length of each in seconds, it is asked
+    only for the candidates judged. The first one whose average bitrate fits
+    into the measured throughput wins, when none fits the smallest known
+    bitrate is used. Without a throughput estimate or any duration the best
+    scored candidate is returned.
+    """
+    if not candidates:
+        return None
+    if not throughput or len(candidates) == 1:
+        return candidates[0]
+    budget = throughput * HEADROOM
+    rates = []
+    for candidate in candidates:
+        rate = bitrate(candidate.get('size'), duration(candidate))
+        if rate is None:
+            continue
+        if rate <= budget:
+            return candidate
+        rates.append((rate, candidate))
+    if not rates:
+        return candidates[0]
+    return min(rates, key=lambda pair: pair[0])[1]
@@ -15,17 +15,38 @@ rm -rf temp/
 mkdir -p temp/$ZIP_FOLDER
 
 # Copy all plugin files to the temp directory
+# (tests, mock_*.py and tools/ with the benchmarks are for development only)
 cp addon.xml temp/$ZIP_FOLDER/
 cp main.py temp/$ZIP_FOLDER/
 cp md5crypt.py temp/$ZIP_FOLDER/
+cp service.py temp/$ZIP_FOLDER/
 cp series_manager.py temp/$ZIP_FOLDER/
+cp offline_db.py temp/$ZIP_FOLDER/
 cp movie_manager.py temp/$ZIP_FOLDER/
+cp bandwidth.py temp/$ZIP_FOLDER/
+cp download_manager.py temp/$ZIP_FOLDER/
+cp downloader.py temp/$ZIP_FOLDER/
+cp link_cache.py temp/$ZIP_FOLDER/
+cp queue_cache.py temp/$ZIP_FOLDER/
+cp metrics.py temp/$ZIP_FOLDER/
+cp listing.py temp/$ZIP_FOLDER/
+cp manager_views.py temp/$ZIP_FOLDER/
+cp ratelimit.py temp/$ZIP_FOLDER/
+cp stream_proxy.py temp/$ZIP_FOLDER/
+cp trakt_client.py temp/$ZIP_FOLDER/
 cp yawsp.py temp/$ZIP_FOLDER/
 mkdir -p temp/$ZIP_FOLDER/resources
 cp -r resources temp/$ZIP_FOLDER/
 cp LICENSE temp/$ZIP_FOLDER/
 cp README.md temp/$ZIP_FOLDER/
 
+# Make sure no development file got into the zip folder
+if ls temp/$ZIP_FOLDER | grep -qE '^(test_.*|mock_.*|bench_.*|tools)$'; then
+    echo "Development files in temp/$ZIP_FOLDER, not creating the zip"
+    rm -rf temp/
+    exit 1
+fi
+
 # Create the zip file in the plugin directory with -master suffix
 cd temp
 zip -r ../plugin/$ZIP_FOLDER.zip $ZIP_FOLDER/
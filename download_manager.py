@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# Module: download_manager
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+
+import downloader
+from ratelimit import TokenBucket
+
+DOWNLOADS = 'downloads'
+SPOOL = 'download_spool'
+QUEUED = 'queued'
+RUNNING = 'running'
+PAUSED = 'paused'
+DONE = 'done'
+FAILED = 'failed'
+# Progress of running jobs is written at most this often
+SAVE_INTERVAL = 5
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with io.open(tmp, 'w', encoding='utf8') as file:
+        file.write(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def load_jobs(profile):
+    """Jobs as last saved by the service, in queue order."""
+    try:
+        with io.open(os.path.join(profile, DOWNLOADS), 'r', encoding='utf8') as file:
+            return json.loads(file.read()).get('jobs', [])
+    except (IOError, OSError, ValueError):
+        return []
+
+
+def send(profile, command, wait=3.0):
+    """Hand a command to the service, return True once it was applied.
+
+    Commands are files in a spool folder, the service applies them in the
+    order they were written and removes them. Waiting lets the plugin list
+    the jobs with the command already applied.
+    """
+    spool = os.path.join(profile, SPOOL)
+    if not os.path.exists(spool):
+        os.makedirs(spool)
+    name = os.path.join(spool, '%015d-%s.json' % (time.time() * 1000, uuid.uuid4().hex))
+    _write_json(name, command)
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        if not os.path.exists(name):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+class DownloadManager:
+    """Download queue run by the service.
+
+    Jobs are kept in the profile so the queue survives restarts. At most
+    `concurrent` jobs download at a time and all of them share one token
+    bucket which caps the total speed. factory(job, throttle) returns a
+    downloader.Download for a job, finished(job, download) is called once
+    a job is done or failed.
+    """
+
+    def __init__(self, profile, factory, finished=None, clock=time.time):
+        self.path = os.path.join(profile, DOWNLOADS)
+        self.spool = os.path.join(profile, SPOOL)
+        self.factory = factory
+        self.finished = finished
+        self.clock = clock
+        self.concurrent = 1
+        self.bucket = TokenBucket(0)
+        self.active = {}  # job id -> [thread, download, job]
+        self.saved = 0
+        self.jobs = load_jobs(profile)
+        for job in self.jobs:
+            if job['state'] == RUNNING:
+                # the service stopped while downloading, continue
+                job['state'] = QUEUED
+
+    def configure(self, concurrent, rate):
+        """Set number of simultaneous jobs and total speed in bytes/s (0 = unlimited)."""
+        self.concurrent = max(1, concurrent)
+        if rate != self.bucket.rate:
+            self.bucket.set_rate(rate, max(rate, downloader.MB))
+
+    def save(self):
+        try:
+            _write_json(self.path, {'jobs': self.jobs})
+        except (IOError, OSError):
+            traceback.print_exc()
+        self.saved = self.clock()
+
+    def job(self, job_id):
+        for job in self.jobs:
+            if job['id'] == job_id:
+                return job
+        return None
+
+    def add(self, ident, name, folder=None, size=None):
+        """Queue a file, returns None when it is already waiting or downloading."""
+        for job in self.jobs:
+            if job['ident'] == ident and job['state'] in (QUEUED, RUNNING, PAUSED):
+                return None
+        job = {'id': uuid.uuid4().hex, 'ident': ident, 'name': name, 'folder': folder, 'state': QUEUED,
+               'done': 0, 'size': size, 'rate': 0, 'error': None, 'seconds': 0,
+               'added': int(self.clock())}
+        self.jobs.append(job)
+        return job
+
+    def _stop(self, job):
+        if job['id'] in self.active:
+            self.active[job['id']][1].cancel()
+
+    def apply(self, command):
+        cmd = command.get('cmd')
+        if cmd == 'add':
+            for item in command.get('items') or [command]:
+                self.add(item['ident'], item['name'], item.get('folder'), item.get('size'))
+            return
+        if cmd == 'clear':
+            self.jobs = [j for j in self.jobs if j['state'] != DONE]
+            return
+        job = self.job(command.get('id'))
+        if job is None:
+            return
+        index = self.jobs.index(job)
+        if cmd == 'pause' and job['state'] in (QUEUED, RUNNING):
+            job['state'] = PAUSED
+            self._stop(job)
+        elif cmd == 'resume' and job['state'] in (PAUSED, FAILED):
+            job['state'] = QUEUED
+            job['error'] = None
+        elif cmd == 'remove':
+            self.jobs.remove(job)
+            job['state'] = None
+            if job['id'] in self.active:
+                self.active[job['id']][1].cancel()
+            elif job.get('done'):
+                self._discard(job)
+        elif cmd == 'up' and index > 0:
+            self.jobs[index - 1], self.jobs[index] = job, self.jobs[index - 1]
+        elif cmd == 'down' and index < len(self.jobs) - 1:
+            self.jobs[index + 1], self.jobs[index] = job, self.jobs[index + 1]
+
+    def _discard(self, job):
+        try:
+            self.factory(job, None).discard()
+        except Exception:
+            traceback.print_exc()
+
+    def commands(self):
+        """Apply spooled commands, return True when there were any."""
+        try:
+            names = sorted(n for n in os.listdir(self.spool) if n.endswith('.json'))
+        except OSError:
+            return False
+        for name in names:
+            path = os.path.join(self.spool, name)
+            try:
+                with io.open(path, 'r', encoding='utf8') as file:
+                    self.apply(json.loads(file.read()))
+            except Exception:
+                traceback.print_exc()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return bool(names)
+
+    def _run(self, job, download):
+        started = self.clock()
+
+        def progress(done, size, rate):
+            job['done'], job['size'], job['rate'] = done, size, rate
+        try:
+            job['size'] = download.run(progress, 1)
+            job['done'] = job['size']
+            job['state'] = DONE
+        except downloader.Cancelled:
+            if job['state'] is None:
+                # removed from the queue
+                download.discard()
+        except Exception as e:
+            traceback.print_exc()
+            job['state'] = FAILED
+            job['error'] = str(e)
+        job['rate'] = 0
+        job['seconds'] = self.clock() - started
+        if self.finished is not None and job['state'] in (DONE, FAILED):
+            try:
+                self.finished(job, download)
+            except Exception:
+                traceback.print_exc()
+
+    def _start(self, job):
+        try:
+            download = self.factory(job, self.bucket.acquire)
+        except Exception as e:
+            traceback.print_exc()
+            job['state'] = FAILED
+            job['error'] = str(e)
+            return
+        job['state'] = RUNNING
+        thread = threading.Thread(target=self._run, args=(job, download))
+        thread.daemon = True
+        self.active[job['id']] = [thread, download, job]
+        thread.start()
+
+    def tick(self):
+        """Apply commands, reap finished jobs and start queued ones."""
+        changed = self.commands()
+        for job_id, (thread, download, job) in list(self.active.items()):
+            if not thread.is_alive():
+                del self.active[job_id]
+                changed = True
+        for job in self.jobs:
+            if len(self.active) >= self.concurrent:
+                break
+            if job['state'] == QUEUED:
+                self._start(job)
+                changed = True
+        if changed or (self.active and self.clock() - self.saved >= SAVE_INTERVAL):
+            self.save()
+
+    def stop(self):
+        """Stop all downloads and keep them queued for the next start."""
+        for thread, download, job in list(self.active.values()):
+            download.cancel()
+        for thread, download, job in list(self.active.values()):
+            thread.join(10)
+            if job['state'] == RUNNING:
+                job['state'] = QUEUED
+        self.active = {}
+        self.save()
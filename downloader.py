@@ -0,0 +1,700 @@
+# -*- coding: utf-8 -*-
+# Module: downloader
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import json
+import os
+import threading
+import time
+import traceback
+
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    from Queue import Queue, Empty, Full
+
+import requests
+
+MB = 1024 * 1024
+CHUNK_SIZE = 4 * MB
+# Chunks held between reader and writer, memory use is about
+# (QUEUE_CHUNKS + 2) * chunk size no matter how big the file is
+QUEUE_CHUNKS = 4
+PROGRESS_INTERVAL = 10
+PART = '.part'
+STATE = '.state'
+# Consecutive failed attempts without any progress before giving up
+RETRIES = 5
+BACKOFF = 2
+TIMEOUT = 30
+# Segmented downloads: connections are added while they raise throughput
+CONNECTIONS = 4
+MIN_SEGMENT = 8 * MB  # never split a segment below this
+SEGMENT_CHUNK = 1 * MB
+SEGMENT_QUEUE = 2
+ADAPT_INTERVAL = 1
+ADAPT_GAIN = 0.1  # share another connection has to add to the throughput
+
+
+class Pipeline:
+    """Copies chunks to a file with separate reader and writer threads.
+
+    The reader pulls chunks from the network into a bounded queue while the
+    writer stores them, so a slow target (SMB through xbmcvfs) and the
+    network do not wait for each other. The calling thread only reports
+    progress every interval seconds until both threads are done.
+    """
+
+    def __init__(self, chunks, out, queue_chunks=QUEUE_CHUNKS):
+        self.chunks = chunks
+        self.out = out
+        self.queue = Queue(max(1, queue_chunks))
+        self.stopped = threading.Event()
+        self.written = 0
+        self.error = None
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
+
+    def _read(self):
+        try:
+            for chunk in self.chunks:
+                if chunk and not self._put(chunk):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(None)
+
+    def _write(self):
+        try:
+            while True:
+                try:
+                    chunk = self.queue.get(timeout=0.5)
+                except Empty:
+                    if self.stopped.is_set():
+                        return
+                    continue
+                if chunk is None:
+                    return
+                self.out.write(chunk)
+                self.written += len(chunk)
+        except Exception as e:
+            self._fail(e)
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self, progress=None, interval=PROGRESS_INTERVAL):
+        """Copy everything, return number of bytes written.
+
+        progress(written, seconds) is called from the calling thread every
+        interval seconds. Errors of the reader or the writer are raised here.
+        """
+        started = time.time()
+        reader = threading.Thread(target=self._read)
+        writer = threading.Thread(target=self._write)
+        reader.daemon = writer.daemon = True
+        reader.start()
+        writer.start()
+        try:
+            while writer.is_alive():
+                writer.join(interval)
+                if writer.is_alive() and progress is not None:
+                    progress(self.written, time.time() - started)
+        finally:
+            self.stopped.set()
+            reader.join()
+        if self.error is not None:
+            raise self.error
+        return self.written
+
+
+def copy(chunks, out, queue_chunks=QUEUE_CHUNKS, progress=None, interval=PROGRESS_INTERVAL):
+    """Write an iterable of chunks to out through a Pipeline."""
+    return Pipeline(chunks, out, queue_chunks).run(progress, interval)
+
+
+def sizeof(nbytes):
+    """Human readable size for progress messages."""
+    if nbytes >= 1024 * MB:
+        return '%.1f GB' % (nbytes / float(1024 * MB))
+    return '%d MB' % (nbytes // MB)
+
+
+def content_total(response, offset):
+    """Full size of the file a (ranged) response belongs to or None."""
+    if response.status_code == 206:
+        try:
+            return int(response.headers['Content-Range'].rsplit('/', 1)[1])
+        except (KeyError, ValueError):
+            return None
+    length = response.headers.get('content-length')
+    return int(length) if length is not None else None
+
+
+class LocalTarget:
+    """Download folder on a local filesystem, partial files survive restarts."""
+    resumable = True
+
+    def size(self, path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
+
+    def open(self, path, offset):
+        if not offset:
+            return io.open(path, 'wb')
+        out = io.open(path, 'r+b')
+        out.truncate(offset)
+        out.seek(offset)
+        return out
+
+    def rename(self, src, dst):
+        os.replace(src, dst)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def load_state(self, path):
+        try:
+            with io.open(path, 'r', encoding='utf8') as file:
+                return json.loads(file.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def save_state(self, path, state):
+        try:
+            with io.open(path, 'w', encoding='utf8') as file:
+                file.write(json.dumps(state))
+        except (IOError, OSError):
+            traceback.print_exc()
+
+    def preallocate(self, path, size):
+        with io.open(path, 'wb') as out:
+            out.truncate(size)
+
+    def open_segment(self, path, segment):
+        """Segments write at their offset straight into the part file."""
+        out = io.open(path, 'r+b')
+        out.seek(segment.pos)
+        return out
+
+    def join_segments(self, path, segments, chunk_size):
+        pass
+
+    def remove_segments(self, path, segments):
+        pass
+
+
+class VfsTarget(LocalTarget):
+    """Download folder reached through xbmcvfs (SMB, NFS, ...).
+
+    xbmcvfs can not append to a file, so a download resumes only while its
+    file is still open, a restarted download starts from the beginning.
+    """
+    resumable = False
+
+    def size(self, path):
+        import xbmcvfs
+        if not xbmcvfs.exists(path):
+            return None
+        return xbmcvfs.Stat(path).st_size()
+
+    def open(self, path, offset):
+        import xbmcvfs
+        return xbmcvfs.File(path, 'w')
+
+    def rename(self, src, dst):
+        import xbmcvfs
+        if xbmcvfs.exists(dst):
+            xbmcvfs.delete(dst)
+        if not xbmcvfs.rename(src, dst):
+            raise IOError('can not rename ' + src)
+
+    def remove(self, path):
+        import xbmcvfs
+        if xbmcvfs.exists(path):
+            xbmcvfs.delete(path)
+
+    def load_state(self, path):
+        return {}
+
+    def save_state(self, path, state):
+        pass
+
+    def preallocate(self, path, size):
+        pass
+
+    def open_segment(self, path, segment):
+        """Every segment gets its own file, they are joined at the end."""
+        import xbmcvfs
+        return xbmcvfs.File('%s.%d' % (path, segment.index), 'w')
+
+    def join_segments(self, path, segments, chunk_size):
+        import xbmcvfs
+        out = xbmcvfs.File(path, 'w')
+        try:
+            for segment in sorted(segments, key=lambda s: s.start):
+                name = '%s.%d' % (path, segment.index)
+                src = xbmcvfs.File(name)
+                try:
+                    while True:
+                        data = src.readBytes(chunk_size)
+                        if not data:
+                            break
+                        out.write(data)
+                finally:
+                    src.close()
+                xbmcvfs.delete(name)
+        finally:
+            out.close()
+
+    def remove_segments(self, path, segments):
+        for segment in segments:
+            self.remove('%s.%d' % (path, segment.index))
+
+
+class Cancelled(Exception):
+    """Download stopped by Download.cancel(), its part file is kept."""
+
+
+class Segment:
+    """Byte range start..end (inclusive) of a segmented download."""
+
+    def __init__(self, index, start, end, pos=None):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.pos = start if pos is None else pos  # next byte to write
+        self.fetched = self.pos  # next byte to read from the network
+        self.thread = None
+        self.pipeline = None
+
+    @property
+    def done(self):
+        return self.pos > self.end
+
+    @property
+    def active(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+class SegmentWriter:
+    """File wrapper moving the segment position with every write."""
+
+    def __init__(self, out, segment):
+        self.out = out
+        self.segment = segment
+
+    def write(self, data):
+        self.out.write(data)
+        if hasattr(self.out, 'flush'):
+            # the saved state must never claim more than is on disk
+            self.out.flush()
+        self.segment.pos += len(data)
+
+
+class Download:
+    """Resumable download of one file into path.
+
+    Data goes to path + '.part' with a small state file next to it naming
+    the ident and full size. After a network error the download continues
+    from the last written byte with a Range request on a freshly resolved
+    link. resolve(fresh) returns the link, fresh is True after a failure.
+    The part file is renamed to path only when its size matches.
+
+    With more than one connection, a file served with ranges is fetched in
+    segments. It starts with one connection and splits the biggest
+    remaining segment in half for another connection as long as each new
+    connection raises the measured throughput.
+
+    throttle(nbytes) is called for every received chunk and may block to
+    limit the speed. cancel() stops the download from another thread.
+    """
+
+    def __init__(self, session, resolve, path, ident, target=None, chunk_size=CHUNK_SIZE,
+                 queue_chunks=QUEUE_CHUNKS, retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT,
+                 sleep=time.sleep, connections=1, min_segment=MIN_SEGMENT,
+                 adapt_interval=ADAPT_INTERVAL, throttle=None):
+        self.session = session
+        self.resolve = resolve
+        self.path = path
+        self.part = path + PART
+        self.state_path = path + PART + STATE
+        self.ident = ident
+        self.target = target or LocalTarget()
+        self.chunk_size = chunk_size
+        self.queue_chunks = queue_chunks
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sleep = sleep
+        self.size = None
+        self.received = 0  # bytes transferred by this run, for throughput
+        self.resumed_at = 0
+        self.connections = connections
+        self.min_segment = min_segment
+        self.adapt_interval = adapt_interval
+        self.peak_connections = 0
+        self.retried = 0  # reconnects after network errors, all connections
+        self.link = None
+        self.lock = threading.Lock()
+        self.error = None
+        self.throttle = throttle
+        self.cancelled = threading.Event()
+        self._stop = None
+        self._pipeline = None
+
+    def cancel(self):
+        self.cancelled.set()
+        if self._stop is not None:
+            self._stop.set()
+        if self._pipeline is not None:
+            self._pipeline.stop()
+
+    def discard(self):
+        """Remove what a stopped download left behind."""
+        self.target.remove(self.part)
+        self.target.remove(self.state_path)
+
+    def _chunks(self, response, chunk_size):
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if self.cancelled.is_set():
+                return
+            if self.throttle is not None:
+                self.throttle(len(chunk))
+            yield chunk
+
+    def _link(self, fresh=False, seen=None):
+        """Return a download link shared by all connections.
+
+        Only the first connection noticing a dead link resolves a new one,
+        the others get the link it resolved.
+        """
+        with self.lock:
+            if self.link is None or (fresh and self.link == seen):
+                self.link = self.resolve(fresh)
+            if not self.link:
+                self.link = None
+                raise requests.RequestException('no link for ' + self.ident)
+            return self.link
+
+    def _request(self, offset, fresh):
+        link = self._link(fresh, self.link)
+        headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+        response = self.session.get(link, headers=headers, stream=True, timeout=self.timeout)
+        if response.status_code == 416 and offset and offset == self.size:
+            return response  # nothing left to download
+        if response.status_code >= 400:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    def _offset(self):
+        """Where to continue, 0 when there is nothing to resume."""
+        if not self.target.resumable:
+            return 0
+        state = self.target.load_state(self.state_path)
+        if state.get('ident') != self.ident or state.get('segments'):
+            return 0
+        self.size = state.get('size')
+        return self.target.size(self.part) or 0
+
+    def run(self, progress=None, interval=PROGRESS_INTERVAL):
+        """Download the file, return its size.
+
+        progress(done, size, rate) gets bytes done, full size (or None) and
+        the current speed in bytes per second.
+        """
+        state = self.target.load_state(self.state_path) if self.target.resumable else {}
+        resuming = state.get('ident') == self.ident
+        if resuming and state.get('segments'):
+            if self.target.size(self.part) == state.get('size'):
+                return self._run_segmented(progress, interval, state)
+            self.target.remove(self.state_path)
+        elif self.connections > 1 and not resuming:
+            size = self._run_segmented(progress, interval)
+            if size is not None:
+                return size
+        return self._run_single(progress, interval)
+
+    def _run_single(self, progress, interval):
+        pos = self.resumed_at = self._offset()
+        out = None
+        out_pos = None
+        failures = 0
+        retry = False
+        started = time.time()
+        try:
+            while True:
+                response = None
+                try:
+                    response = self._request(pos, retry)
+                    if response.status_code == 416:
+                        break
+                    if pos and response.status_code != 206:
+                        # server ignores ranges, start over
+                        pos = 0
+                    total = content_total(response, pos)
+                    if pos and self.size is not None and total != self.size:
+                        # another file behind the ident now
+                        pos = 0
+                        response.close()
+                        continue
+                    self.size = total
+                    if out is None or out_pos != pos:
+                        if out is not None:
+                            out.close()
+                        out = self.target.open(self.part, pos)
+                        out_pos = pos
+                        self.target.save_state(self.state_path, {'ident': self.ident, 'size': total})
+
+                    base = pos
+                    pipeline = self._pipeline = Pipeline(self._chunks(response, self.chunk_size), out,
+                                                         self.queue_chunks)
+                    if self.cancelled.is_set():
+                        raise Cancelled()
+
+                    def report(written, seconds):
+                        done = self.received + written
+                        progress(base + written, self.size, done / max(time.time() - started, 0.001))
+                    try:
+                        pipeline.run(report if progress is not None else None, interval)
+                    finally:
+                        self.received += pipeline.written
+                        pos = out_pos = base + pipeline.written
+                        if pipeline.written:
+                            failures = 0
+                    if self.cancelled.is_set():
+                        raise Cancelled()
+                    if self.size is None or pos >= self.size:
+                        break
+                    raise requests.RequestException('connection closed at %d of %d' % (pos, self.size))
+                except requests.RequestException:
+                    traceback.print_exc()
+                    retry = True
+                    failures += 1
+                    self.retried += 1
+                    if failures > self.retries:
+                        raise
+                    self.sleep(min(self.backoff * 2 ** (failures - 1), 60))
+                finally:
+                    if response is not None:
+                        response.close()
+        except Exception:
+            if out is not None:
+                out.close()
+            if not self.target.resumable:
+                self.target.remove(self.part)
+            raise
+        if out is not None:
+            out.close()
+        size = self.target.size(self.part)
+        if self.size is not None and size != self.size:
+            raise IOError('size mismatch %s != %s' % (size, self.size))
+        self.target.rename(self.part, self.path)
+        self.target.remove(self.state_path)
+        return size
+
+    def _probe(self):
+        """First request of a segmented download, None when ranges are not served."""
+        try:
+            response = self.session.get(self._link(), headers={'Range': 'bytes=0-'},
+                                        stream=True, timeout=self.timeout)
+        except requests.RequestException:
+            return None
+        size = content_total(response, 0)
+        if response.status_code != 206 or size is None or size < 2 * self.min_segment:
+            response.close()
+            return None
+        self.size = size
+        return response
+
+    def _split(self, segments):
+        """Split the biggest remaining range in half, return the new segment."""
+        with self.lock:
+            running = [s for s in segments if not s.done]
+            if not running:
+                return None
+            segment = max(running, key=lambda s: s.end - s.fetched)
+            left = segment.end - segment.fetched + 1
+            if left < 2 * self.min_segment:
+                return None
+            middle = segment.fetched + left // 2
+            new = Segment(len(segments), middle, segment.end)
+            segment.end = middle - 1
+            segments.append(new)
+            return new
+
+    def _bounded(self, segment, response):
+        """Chunks of a response cut at the (shrinking) end of the segment."""
+        for chunk in self._chunks(response, min(self.chunk_size, SEGMENT_CHUNK)):
+            with self.lock:
+                left = segment.end - segment.fetched + 1
+                if left <= 0:
+                    return
+                chunk = chunk[:left]
+                segment.fetched += len(chunk)
+            yield chunk
+            if len(chunk) >= left:
+                return
+
+    def _segment(self, segment, response, stop):
+        """Fetch one segment, reconnecting after network errors."""
+        out = None
+        link = self.link
+        failures = 0
+        try:
+            while not segment.done and not stop.is_set():
+                try:
+                    if response is None:
+                        link = self._link(failures > 0, link)
+                        headers = {'Range': 'bytes=%d-%d' % (segment.pos, segment.end)}
+                        response = self.session.get(link, headers=headers, stream=True, timeout=self.timeout)
+                        if response.status_code != 206:
+                            raise requests.RequestException('range not served: %d' % response.status_code)
+                    if out is None:
+                        out = self.target.open_segment(self.part, segment)
+                    before = segment.pos
+                    segment.fetched = segment.pos
+                    segment.pipeline = Pipeline(self._bounded(segment, response),
+                                                SegmentWriter(out, segment), SEGMENT_QUEUE)
+                    if stop.is_set():
+                        break
+                    segment.pipeline.run()
+                    if segment.pos > before:
+                        failures = 0
+                    if not segment.done and not stop.is_set():
+                        raise requests.RequestException('segment %d closed at %d' % (segment.index, segment.pos))
+                except requests.RequestException:
+                    traceback.print_exc()
+                    failures += 1
+                    with self.lock:
+                        self.retried += 1
+                    if failures > self.retries:
+                        raise
+                    self.sleep(min(self.backoff * 2 ** (failures - 1), 60))
+                finally:
+                    if response is not None:
+                        response.close()
+                        response = None
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            stop.set()
+        finally:
+            if out is not None:
+                out.close()
+
+    def _start(self, segment, stop, response=None):
+        segment.thread = threading.Thread(target=self._segment, args=(segment, response, stop))
+        segment.thread.daemon = True
+        segment.thread.start()
+
+    def _save_segments(self, segments):
+        self.target.save_state(self.state_path, {
+            'ident': self.ident, 'size': self.size,
+            'segments': [[s.start, s.end, s.pos] for s in segments]})
+
+    def _run_segmented(self, progress, interval, state=None):
+        if state:
+            self.size = state['size']
+            segments = [Segment(i, start, end, pos) for i, (start, end, pos) in enumerate(state['segments'])]
+            first = None
+        else:
+            first = self._probe()
+            if first is None:
+                return None
+            self.target.preallocate(self.part, self.size)
+            segments = [Segment(0, 0, self.size - 1)]
+        self.resumed_at = sum(s.pos - s.start for s in segments)
+        self._save_segments(segments)
+
+        stop = self._stop = threading.Event()
+        if self.cancelled.is_set():
+            stop.set()
+        wanted = 1
+        best = 0
+        grow = True
+        started = last_adapt = last_report = time.time()
+        last_done = self.resumed_at
+        try:
+            while not stop.is_set():
+                pending = [s for s in segments if not s.done and not s.active]
+                active = [s for s in segments if s.active]
+                if not pending and not active:
+                    break
+                while len(active) < wanted:
+                    segment = pending.pop(0) if pending else self._split(segments)
+                    if segment is None:
+                        break
+                    self._start(segment, stop, first)
+                    first = None
+                    active.append(segment)
+                self.peak_connections = max(self.peak_connections, len(active))
+                stop.wait(0.2)
+
+                now = time.time()
+                done = sum(s.pos - s.start for s in segments)
+                self.received = done - self.resumed_at
+                if now - last_adapt >= self.adapt_interval:
+                    rate = (done - last_done) / (now - last_adapt)
+                    if grow and wanted < self.connections and len(active) >= wanted:
+                        if rate > best * (1 + ADAPT_GAIN):
+                            wanted += 1
+                        else:
+                            # the last connection did not help, give it up
+                            wanted = max(1, wanted - 1)
+                            grow = False
+                    best = max(best, rate)
+                    last_adapt, last_done = now, done
+                    self._save_segments(segments)
+                if progress is not None and now - last_report >= interval:
+                    progress(done, self.size, self.received / max(now - started, 0.001))
+                    last_report = now
+        finally:
+            stop.set()
+            for segment in segments:
+                if segment.pipeline is not None:
+                    segment.pipeline.stop()
+            for segment in segments:
+                if segment.thread is not None:
+                    segment.thread.join()
+            if first is not None:
+                first.close()
+            self.received = sum(s.pos - s.start for s in segments) - self.resumed_at
+            self._save_segments(segments)
+
+        if self.error is not None or not all(s.done for s in segments):
+            if not self.target.resumable:
+                self.target.remove_segments(self.part, segments)
+                self.target.remove(self.part)
+            if self.error is None and self.cancelled.is_set():
+                raise Cancelled()
+            raise self.error or IOError('download of %s stopped' % self.ident)
+        self.target.join_segments(self.part, segments, self.chunk_size)
+        size = self.target.size(self.part)
+        if size != self.size:
+            raise IOError('size mismatch %s != %s' % (size, self.size))
+        self.target.rename(self.part, self.path)
+        self.target.remove(self.state_path)
+        return size
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# Module: link_cache
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import errno
+import io
+import json
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+try:
+    from urlparse import urlparse, parse_qsl
+except ImportError:
+    from urllib.parse import urlparse, parse_qsl
+
+LINK_CACHE = 'link_cache'
+# Query parameters Webshare style CDNs use for link expiry (unix time)
+EXPIRY_PARAMS = ('expires', 'expire', 'exp')
+# Do not hand out links this close to their expiry
+EXPIRY_MARGIN = 60
+# Changes of the file are read-modify-write, one at a time in a process
+# and, through a lock file next to it, across the plugin and the service
+_lock = threading.Lock()
+LOCK_WAIT = 2.0
+# a lock file this old was left behind by a writer that died
+LOCK_STALE = 10
+
+
+@contextmanager
+def _locked(path):
+    lock = path + '.lock'
+    with _lock:
+        owned = False
+        deadline = time.time() + LOCK_WAIT
+        while True:
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                owned = True
+                break
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    break
+            try:
+                if time.time() - os.path.getmtime(lock) > LOCK_STALE:
+                    os.remove(lock)
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                # the cache is only a shortcut, write anyway
+                break
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if owned:
+                try:
+                    os.remove(lock)
+                except OSError:
+                    pass
+
+
+def link_expiry(link):
+    """Return expiry time encoded in a link or None when it has none."""
+    try:
+        query = dict(parse_qsl(urlparse(link).query))
+    except Exception:
+        return None
+    now = time.time()
+    for key in EXPIRY_PARAMS:
+        try:
+            value = int(query[key])
+        except (KeyError, ValueError):
+            continue
+        # ignore values which are obviously not a timestamp
+        if now < value < now + 30 * 24 * 3600:
+            return value
+    return None
+
+
+class LinkCache:
+    """File_link results cached per ident and download type in the profile.
+
+    Entries expire when the link says so, otherwise after ttl seconds.
+    The cache is a small JSON file shared by the plugin and its service.
+    Writers hold a lock file while they read, change and replace it through
+    their own temporary file, so readers never see a half written one and
+    no writer drops the entries of another.
+    """
+
+    def __init__(self, profile, ttl=3600):
+        self.path = os.path.join(profile, LINK_CACHE)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(ident, dtype):
+        return ident + ':' + dtype
+
+    def _load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as file:
+                return json.loads(file.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _store(self, entries):
+        now = time.time()
+        entries = {k: v for k, v in entries.items() if v.get('expires', 0) > now}
+        tmp = self.path + '.%d.%d.tmp' % (os.getpid(), threading.current_thread().ident)
+        try:
+            with io.open(tmp, 'w', encoding='utf8') as file:
+                file.write(json.dumps(entries))
+            os.replace(tmp, self.path)
+        except Exception:
+            traceback.print_exc()
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def get(self, ident, dtype='video_stream'):
+        """Return a cached link which is still valid or None."""
+        if self.ttl <= 0:
+            return None
+        entry = self._load().get(self._key(ident, dtype))
+        if entry and entry.get('expires', 0) - EXPIRY_MARGIN > time.time():
+            self.hits += 1
+            return entry['link']
+        self.misses += 1
+        return None
+
+    def put(self, ident, dtype, link):
+        """Remember a freshly resolved link."""
+        if self.ttl <= 0 or not link:
+            return
+        expires = link_expiry(link) or time.time() + self.ttl
+        with _locked(self.path):
+            entries = self._load()
+            entries[self._key(ident, dtype)] = {'link': link, 'expires': int(expires)}
+            self._store(entries)
+
+    def forget_link(self, link):
+        """Forget a link that turned out dead, whatever ident it was cached for."""
+        with _locked(self.path):
+            entries = self._load()
+            keys = [k for k, v in entries.items() if v.get('link') == link]
+            for key in keys:
+                del entries[key]
+            if keys:
+                self._store(entries)
+
+    def invalidate(self, ident, dtype=None):
+        """Forget links of an ident, for all download types unless one is given."""
+        with _locked(self.path):
+            entries = self._load()
+            if dtype is not None:
+                keys = [self._key(ident, dtype)]
+            else:
+                keys = [k for k in entries if k.rsplit(':', 1)[0] == ident]
+            changed = False
+            for key in keys:
+                if entries.pop(key, None) is not None:
+                    changed = True
+            if changed:
+                self._store(entries)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Module: listing
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import xbmcgui
+import xbmcplugin
+
+
+class Listing:
+    """Directory items collected in Python and handed to Kodi at once.
+
+    Every xbmcplugin call crosses into Kodi, so instead of one
+    addDirectoryItem per entry the items are submitted with a single
+    addDirectoryItems when the listing is finished, together with the
+    content type and sort methods.
+    """
+
+    def __init__(self, handle, content=None, sort_methods=()):
+        self.handle = handle
+        self.content = content
+        self.sort_methods = sort_methods
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, url, listitem, folder=False):
+        self.items.append((url, listitem, folder))
+        return listitem
+
+    def item(self, label, url, folder=True, icon=None):
+        """Add a plain entry, returns its ListItem for further settings."""
+        # offscreen items are not bound to the GUI and are cheaper to build
+        listitem = xbmcgui.ListItem(label=label, offscreen=True)
+        if icon:
+            listitem.setArt({'icon': icon})
+        return self.add(url, listitem, folder)
+
+    def finish(self, succeeded=True, updateListing=False, cacheToDisc=True):
+        if self.items:
+            xbmcplugin.addDirectoryItems(self.handle, self.items, len(self.items))
+        if self.content:
+            xbmcplugin.setContent(self.handle, self.content)
+        for method in self.sort_methods:
+            xbmcplugin.addSortMethod(self.handle, method)
+        xbmcplugin.endOfDirectory(self.handle, succeeded=succeeded, updateListing=updateListing,
+                                  cacheToDisc=cacheToDisc)
@@ -8,4 +8,4 @@ import sys
 import yawsp
 
 if __name__ == '__main__':
-    yawsp.router(sys.argv[2][1:])
+    yawsp.main(sys.argv)
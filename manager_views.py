@@ -0,0 +1,839 @@
+# -*- coding: utf-8 -*-
+# Module: manager_views
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+"""Views of the series and movie managers and their Trakt listings.
+
+Imported by the router only when one of their actions runs.
+"""
+
+import os
+import time
+import traceback
+
+import xbmc
+import xbmcgui
+import xbmcplugin
+
+import movie_manager
+import series_manager
+import yawsp
+from listing import Listing
+from yawsp import (_addon, _profile, api, ask, download_folder, download_path, existing_size, get_url,
+                   getinfo, metrics, popinfo, revalidate, safe_name, session)
+
+TRAKT_META_TTL = 30 * 24 * 3600  # metadata of saved titles rarely changes
+TRAKT_MISS_TTL = 24 * 3600  # retry titles Trakt did not know a day later
+TRAKT_WORKERS = 4
+DOWNLOAD_WORKERS = 4
+
+_trakt = None
+
+
+def series_menu(params):
+    """Handle Series functionality"""
+    updateListing = False
+    # Initialize SeriesManager
+    sm = series_manager.SeriesManager(_addon, _profile)
+
+    if 'remove' in params:
+        sm.remove_series(params['remove'])
+        updateListing = True
+
+    listing = series_manager.create_series_menu(sm, yawsp._handle, end=False)
+    listing.finish(updateListing=updateListing)
+
+
+def series_search(params):
+    """Search for a TV series and organize it into seasons and episodes"""
+    token = revalidate()
+
+    # Determine series name
+    series_name = params.get('series_name')
+    if not series_name:
+        series_name = ask(None)
+    if not series_name:
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+        return
+
+    # Initialize SeriesManager
+    sm = series_manager.SeriesManager(_addon, _profile)
+
+    # If series already exists locally, open it without refreshing
+    if sm.load_series_data(series_name):
+        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
+        return
+
+    # Show progress dialog
+    progress = xbmcgui.DialogProgress()
+    progress.create('YaWSP', f'Vyhledavam serial {series_name}...')
+
+    try:
+        # Search for the series
+        series_data = sm.search_series(series_name, api, token)
+
+        if not series_data or not series_data['seasons']:
+            progress.close()
+            popinfo('Nenalezeny zadne epizody tohoto serialu', icon=xbmcgui.NOTIFICATION_WARNING)
+            xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+            return
+
+        # Success
+        progress.close()
+        popinfo(f'Nalezeno {sum(len(season) for season in series_data["seasons"].values())} epizod v {len(series_data["seasons"])} sezonach')
+
+        # Redirect to series detail
+        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
+
+    except Exception as e:
+        progress.close()
+        traceback.print_exc()
+        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+
+
+def series_detail(params):
+    """Show seasons for a series"""
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + " \\ " + params['series_name'])
+
+    series_name = params['series_name']
+    sm = series_manager.SeriesManager(_addon, _profile)
+    series_data = sm.load_series_data(series_name)
+    if not series_data:
+        xbmcgui.Dialog().notification('YaWSP', _addon.getLocalizedString(30319), xbmcgui.NOTIFICATION_WARNING)
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+        return
+
+    listing = Listing(yawsp._handle)
+
+    # Add refresh option
+    listing.item('Aktualizovat serial', get_url(action='series_refresh', series_name=series_name), True, icon='DefaultAddonsSearch.png')
+
+    listing.item(_addon.getLocalizedString(30316), get_url(action='series_download', series_name=series_name), False, icon='DefaultNetwork.png')
+
+    meta = _trakt_series_meta(sm, series_name, series_data)
+    poster = meta.get('poster')
+    plot = meta.get('plot') or ''
+    rating = meta.get('rating')
+
+    for season_num in sorted(series_data['seasons'].keys(), key=int):
+        season_name = f'Rada {season_num}'
+        listitem = xbmcgui.ListItem(label=season_name, offscreen=True)
+        art = {'icon': 'DefaultFolder.png'}
+        if poster:
+            art['thumb'] = poster
+        listitem.setArt(art)
+        info = {'title': f'{series_name} - {season_name}'}
+        if plot:
+            info['plot'] = plot
+        if rating is not None:
+            info['rating'] = rating
+        listitem.setInfo('video', info)
+        listitem.addContextMenuItems([(_addon.getLocalizedString(30315), 'RunPlugin(' + get_url(action='series_download', series_name=series_name, season=season_num) + ')')])
+        listing.add(get_url(action='series_season', series_name=series_name, season=season_num), listitem, True)
+
+    listing.finish()
+
+
+def series_season(params):
+    """Show episodes for a season"""
+    series_name = params['series_name']
+    season = params['season']
+
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + " \\ " + series_name + " \\ " + f"Rada {season}")
+
+    sm = series_manager.SeriesManager(_addon, _profile)
+    season_str = str(season)
+    series_data = sm.load_series_data(series_name)
+    if not series_data or season_str not in series_data['seasons']:
+        xbmcgui.Dialog().notification('YaWSP', 'Data sezony nenalezena', xbmcgui.NOTIFICATION_WARNING)
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+        return
+
+    listing = Listing(yawsp._handle, 'episodes')
+
+    listing.item(_addon.getLocalizedString(30315), get_url(action='series_download', series_name=series_name, season=season), False, icon='DefaultNetwork.png')
+
+    meta = _trakt_series_meta(sm, series_name, series_data)
+    episode_details = meta.get('episodes', {}).get(season_str, {})
+
+    season_data = series_data['seasons'][season_str]
+    for episode_num in sorted(season_data.keys(), key=int):
+        episode = season_data[episode_num]
+        info_data = episode_details.get(str(episode_num), {})
+        label = f"Epizoda {episode_num} - {episode['name']}"
+
+        listitem = xbmcgui.ListItem(label=label, offscreen=True)
+        art = {'icon': 'DefaultVideo.png'}
+        thumb = info_data.get('thumb')
+        if thumb:
+            art['thumb'] = thumb
+        listitem.setArt(art)
+        listitem.setProperty('IsPlayable', 'true')
+
+        info = {'title': label}
+        overview = info_data.get('plot')
+        if overview:
+            info['plot'] = overview
+        rating = info_data.get('rating')
+        if rating is not None:
+            info['rating'] = rating
+        listitem.setInfo('video', info)
+
+        url = get_url(
+            action='play',
+            ident=episode['ident'],
+            name=episode['name'],
+            series=series_name,
+            season=season,
+            episode=episode_num
+        )
+        listing.add(url, listitem, False)
+
+    listing.finish()
+
+
+def series_download(params):
+    """Queue all episodes of a season or of the whole series for download"""
+    from concurrent.futures import ThreadPoolExecutor
+    import unidecode
+    import download_manager
+    series_name = params['series_name']
+    where = download_folder()
+    if not where:
+        return
+    sm = series_manager.SeriesManager(_addon, _profile)
+    series_data = sm.load_series_data(series_name)
+    if not series_data:
+        xbmcgui.Dialog().notification('YaWSP', _addon.getLocalizedString(30319), xbmcgui.NOTIFICATION_WARNING)
+        return
+    if 'season' in params:
+        seasons = [str(params['season'])]
+    else:
+        seasons = sorted(series_data['seasons'].keys(), key=int)
+    normalize = 'true' == _addon.getSetting('dnormalize')
+    series_folder = safe_name(unidecode.unidecode(series_name) if normalize else series_name)
+
+    # files already downloaded with the expected size cost no API call
+    items = []
+    present = 0
+    for season in seasons:
+        folder = series_folder + '/' + 'Season %02d' % int(season)
+        episodes = series_data['seasons'].get(season, {})
+        for episode_num in sorted(episodes.keys(), key=int):
+            episode = episodes[episode_num]
+            name = safe_name(unidecode.unidecode(episode['name']) if normalize else episode['name'])
+            size = existing_size(download_path(where, folder, name))
+            if size is not None and str(size) == str(episode.get('size')):
+                present += 1
+                continue
+            items.append({'ident': episode['ident'], 'name': name, 'folder': folder, 'size': episode.get('size')})
+
+    if items:
+        token = revalidate()
+
+        def check(item):
+            # file_info tells whether the file still exists and its size, the
+            # link is resolved by make_download when the job starts
+            info = getinfo(item['ident'], token, quiet=True)
+            if info is None:
+                return None
+            size = info.find('size')
+            if size is not None and size.text:
+                item['size'] = int(size.text)
+            return item
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            resolved = [item for item in pool.map(check, items) if item is not None]
+        if resolved:
+            download_manager.send(_profile, {'cmd': 'add', 'items': resolved}, wait=0)
+        missing = len(items) - len(resolved)
+    else:
+        resolved = []
+        missing = 0
+    message = _addon.getLocalizedString(30317) % (len(resolved), present)
+    if missing:
+        message += _addon.getLocalizedString(30318) % missing
+    xbmcgui.Dialog().notification('YaWSP', message, xbmcgui.NOTIFICATION_INFO)
+
+
+def series_refresh(params):
+    """Refresh series data"""
+    token = revalidate()
+    series_name = params['series_name']
+
+    # Initialize SeriesManager and perform search
+    sm = series_manager.SeriesManager(_addon, _profile)
+
+    # Show progress dialog
+    progress = xbmcgui.DialogProgress()
+    progress.create('YaWSP', f'Aktualizuji data pro serial {series_name}...')
+
+    try:
+        # Search for the series
+        series_data = sm.search_series(series_name, api, token)
+
+        if not series_data or not series_data['seasons']:
+            progress.close()
+            popinfo('Nenalezeny zadne epizody tohoto serialu', icon=xbmcgui.NOTIFICATION_WARNING)
+            xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+            return
+
+        # Success
+        progress.close()
+        popinfo(f'Aktualizovano: {sum(len(season) for season in series_data["seasons"].values())} epizod v {len(series_data["seasons"])} sezonach')
+
+        # Redirect to series detail to refresh the view
+        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
+
+    except Exception as e:
+        progress.close()
+        traceback.print_exc()
+        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+
+
+def _trakt_request(endpoint, params=None, failed=([], {}), quiet=False):
+    """Helper to call Trakt API. Returns JSON data and response headers, failed when the call fails.
+
+    A failure is shown unless quiet is set, callers running many requests
+    at once report it themselves.
+    """
+    global _trakt
+    import trakt_client
+    client_id = _addon.getSetting('trakt_client_id')
+    if not client_id:
+        if not quiet:
+            popinfo(_addon.getLocalizedString(30403), icon=xbmcgui.NOTIFICATION_WARNING)
+        return failed
+
+    if _trakt is None or _trakt.client_id != client_id:
+        _trakt = trakt_client.TraktClient(session(), client_id, on_request=_trakt_timed)
+
+    try:
+        return _trakt.get(endpoint, params)
+    except trakt_client.TraktError as e:
+        xbmc.log(f'YaWSP Trakt: {endpoint} failed: {str(e)} {_trakt.metrics()}', level=xbmc.LOGERROR)
+        if not quiet:
+            popinfo(_addon.getLocalizedString(30404 if e.status is not None else 30405),
+                    icon=xbmcgui.NOTIFICATION_WARNING)
+    except Exception:
+        traceback.print_exc()
+        if not quiet:
+            popinfo(_addon.getLocalizedString(30405), icon=xbmcgui.NOTIFICATION_WARNING)
+    return failed
+
+
+def _trakt_timed(endpoint, seconds, status, nbytes, retries):
+    """Record a Trakt call, titles in the path are folded so endpoints stay few."""
+    parts = endpoint.split('/')
+    if len(parts) > 1 and parts[0] in ('shows', 'movies') and parts[1] not in ('trending', 'popular'):
+        parts[1] = ':slug'
+    metrics().record('trakt/' + '/'.join(parts), seconds, status is not None and 200 <= status < 300,
+                     status or 'no response', nbytes, retries)
+
+
+def _trakt_watchers(kind, items):
+    """Fetch watcher counts for listed shows or movies concurrently.
+
+    Failed requests count as no watchers, one notification tells about them.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    slugs = []
+    for item in items:
+        ids = item.get('ids', {})
+        slugs.append(ids.get('slug') or ids.get('trakt'))
+
+    def fetch(slug):
+        if not slug:
+            return 0
+        stats, _ = _trakt_request(f'{kind}/{slug}/stats', failed=(None, None), quiet=True)
+        return stats.get('watchers', 0) if isinstance(stats, dict) else stats
+
+    with ThreadPoolExecutor(max_workers=TRAKT_WORKERS) as pool:
+        watchers = list(pool.map(fetch, slugs))
+    if None in watchers:
+        popinfo(_addon.getLocalizedString(30405), icon=xbmcgui.NOTIFICATION_WARNING)
+    return [count or 0 for count in watchers]
+
+
+def _trakt_search(media_type, query):
+    """Search Trakt for a show or movie and return its slug.
+
+    None when Trakt does not know the title, False when the search failed.
+    """
+    data, _ = _trakt_request(f'search/{media_type}', {'query': query, 'limit': 1}, failed=(False, None))
+    if data is False:
+        return False
+    if data:
+        item = data[0].get(media_type) or data[0].get('show') or data[0].get('movie')
+        if isinstance(item, dict):
+            ids = item.get('ids', {})
+            return ids.get('slug') or ids.get('trakt')
+    return None
+
+
+def _trakt_image(data, kind):
+    """Return absolute URL of the first Trakt image of given kind."""
+    img = data.get('images', {}).get(kind)
+    url = img[0] if isinstance(img, list) and img else None
+    if url and not url.startswith('http'):
+        url = 'https://' + url
+    return url
+
+
+def _trakt_meta_fresh(meta):
+    """Check whether metadata stored with a library entry can be used as is."""
+    fresh = False
+    if meta and 'updated' in meta:
+        ttl = TRAKT_META_TTL if meta.get('slug') else TRAKT_MISS_TTL
+        fresh = time.time() - meta['updated'] < ttl
+    metrics().cache('trakt metadata', fresh)
+    return fresh
+
+
+def _trakt_series_meta(sm, series_name, series_data):
+    """Return Trakt metadata stored with a series, fetching it only when missing or stale.
+
+    Show info and all seasons with episodes are fetched at once and saved
+    into the series record, so opening a saved series makes no network calls.
+    Refreshing the series drops the stored metadata. When Trakt fails,
+    nothing is stored and the old metadata is used until the next try.
+    """
+    stored = series_data.get('trakt')
+    if _trakt_meta_fresh(stored):
+        return stored
+
+    slug = _trakt_search('show', series_name)
+    if slug is False:
+        return stored or {}
+    meta = {'slug': slug, 'updated': int(time.time()), 'episodes': {}}
+    if slug:
+        info, _ = _trakt_request(f'shows/{slug}', {'extended': 'full,images'}, failed=(None, None))
+        seasons, _ = _trakt_request(f'shows/{slug}/seasons',
+                                    {'extended': 'episodes,full,images'}, failed=(None, None))
+        if info is None or seasons is None:
+            return stored or meta
+        if isinstance(info, dict):
+            meta['poster'] = _trakt_image(info, 'poster')
+            meta['plot'] = info.get('overview') or ''
+            meta['rating'] = info.get('rating')
+        if isinstance(seasons, list):
+            for season in seasons:
+                episodes = {}
+                for ep in season.get('episodes') or []:
+                    episodes[str(ep.get('number'))] = {
+                        'plot': ep.get('overview') or '',
+                        'rating': ep.get('rating'),
+                        'thumb': _trakt_image(ep, 'screenshot')
+                    }
+                meta['episodes'][str(season.get('number'))] = episodes
+    sm.store_trakt_meta(series_name, series_data, meta)
+    return meta
+
+
+def _trakt_movie_meta(mm, movie_name, movie_data):
+    """Return Trakt metadata stored with a movie, fetching it only when missing or stale."""
+    stored = movie_data.get('trakt')
+    if _trakt_meta_fresh(stored):
+        return stored
+
+    slug = _trakt_search('movie', movie_name)
+    if slug is False:
+        return stored or {}
+    meta = {'slug': slug, 'updated': int(time.time())}
+    if slug:
+        info, _ = _trakt_request(f'movies/{slug}', {'extended': 'full,images'}, failed=(None, None))
+        if info is None:
+            return stored or meta
+        if isinstance(info, dict):
+            meta['poster'] = _trakt_image(info, 'poster')
+            meta['plot'] = info.get('overview') or ''
+            meta['rating'] = info.get('rating')
+    mm.store_trakt_meta(movie_name, movie_data, meta)
+    return meta
+
+
+def series_trending(params):
+    """List trending series from Trakt with paging."""
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + ' \\ ' +
+                                 _addon.getLocalizedString(30401))
+
+    listing = Listing(yawsp._handle, 'tvshows')
+    page = int(params.get('page', '1'))
+    limit = 20
+
+    data, headers = _trakt_request('shows/trending',
+                                   {'limit': limit, 'page': page,
+                                    'extended': 'full,images'})
+
+    if page > 1:
+        listing.item(_addon.getLocalizedString(30206), get_url(action='series_trending', page=page - 1), True, icon='DefaultTVShows.png')
+
+    for item in data:
+        show = item.get('show', {})
+        title = show.get('title')
+        if not title:
+            continue
+        watchers = item.get('watchers', 0)
+        label = f"{title} ({watchers} users)"
+        listitem = xbmcgui.ListItem(label=label, offscreen=True)
+        poster = show.get('images', {}).get('poster')
+        thumb = poster[0] if isinstance(poster, list) and poster else None
+        if thumb and not thumb.startswith('http'):
+            thumb = 'https://' + thumb
+        art = {'icon': 'DefaultTVShows.png'}
+        if thumb:
+            art['thumb'] = thumb
+        listitem.setArt(art)
+        info = {'title': title}
+        overview = show.get('overview')
+        if overview:
+            info['plot'] = overview
+        rating = show.get('rating')
+        if rating is not None:
+            info['rating'] = rating
+        listitem.setInfo('video', info)
+        listing.add(get_url(action='series_search', series_name=title), listitem, True)
+
+    page_count = int(headers.get('X-Pagination-Page-Count', page))
+    if page < page_count:
+        listing.item(_addon.getLocalizedString(30207), get_url(action='series_trending', page=page + 1), True, icon='DefaultTVShows.png')
+
+    listing.finish()
+
+
+def series_popular(params):
+    """List popular series from Trakt with paging."""
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + ' \\ ' +
+                                 _addon.getLocalizedString(30402))
+
+    listing = Listing(yawsp._handle, 'tvshows')
+    page = int(params.get('page', '1'))
+    limit = 20
+
+    data, headers = _trakt_request('shows/popular',
+                                   {'limit': limit, 'page': page,
+                                    'extended': 'full,images'})
+
+    if page > 1:
+        listing.item(_addon.getLocalizedString(30206), get_url(action='series_popular', page=page - 1), True, icon='DefaultTVShows.png')
+
+    watchers_list = _trakt_watchers('shows', data)
+    for show, watchers in zip(data, watchers_list):
+        title = show.get('title')
+        if not title:
+            continue
+        label = f"{title} ({watchers} users)"
+        listitem = xbmcgui.ListItem(label=label, offscreen=True)
+        poster = show.get('images', {}).get('poster')
+        thumb = poster[0] if isinstance(poster, list) and poster else None
+        if thumb and not thumb.startswith('http'):
+            thumb = 'https://' + thumb
+        art = {'icon': 'DefaultTVShows.png'}
+        if thumb:
+            art['thumb'] = thumb
+        listitem.setArt(art)
+        info = {'title': title}
+        overview = show.get('overview')
+        if overview:
+            info['plot'] = overview
+        rating = show.get('rating')
+        if rating is not None:
+            info['rating'] = rating
+        listitem.setInfo('video', info)
+        listing.add(get_url(action='series_search', series_name=title), listitem, True)
+
+    page_count = int(headers.get('X-Pagination-Page-Count', page))
+    if page < page_count:
+        listing.item(_addon.getLocalizedString(30207), get_url(action='series_popular', page=page + 1), True, icon='DefaultTVShows.png')
+
+    listing.finish()
+
+
+def movie_menu(params):
+    """Handle Movies functionality"""
+    updateListing = False
+    # Initialize MovieManager
+    mm = movie_manager.MovieManager(_addon, _profile)
+
+    if 'remove' in params:
+        mm.remove_item(params['remove'])
+        updateListing = True
+
+    # Create movie menu similar to series menu
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + " \\ Movies")
+    listing = Listing(yawsp._handle)
+
+    # Add "Search for new movie" option
+    listing.item("Hledat novy film", get_url(action='movie_search'), True, icon='DefaultAddSource.png')
+
+    # Trending from Trakt
+    listing.item("Trending movies", get_url(action='movie_trending'), True, icon='DefaultRecentlyAddedMovies.png')
+
+    # Popular from Trakt
+    listing.item("Popular movies", get_url(action='movie_popular'), True, icon='DefaultMovies.png')
+
+    # List existing movies
+    try:
+        movie_list = []
+        for filename in os.listdir(mm.db_path):
+            if filename.endswith('.json'):
+                movie_name = os.path.splitext(filename)[0]
+                proper_name = movie_name.replace('_', ' ')
+                file_path = os.path.join(mm.db_path, filename)
+                mtime = 0
+                try:
+                    mtime = os.path.getmtime(file_path)
+                except Exception as e:
+                    xbmc.log(f'YaWSP Movie: Error accessing {filename}: {str(e)}', level=xbmc.LOGERROR)
+                movie_list.append({
+                    'name': proper_name,
+                    'filename': filename,
+                    'safe_name': movie_name,
+                    'mtime': mtime
+                })
+
+        movie_list.sort(key=lambda m: m.get('mtime', 0), reverse=True)
+    except Exception as e:
+        xbmc.log(f'YaWSP Movie: Error listing movies: {str(e)}', level=xbmc.LOGERROR)
+        movie_list = []
+
+    for movie in movie_list:
+        listitem = xbmcgui.ListItem(label=movie['name'], offscreen=True)
+        listitem.setArt({'icon': 'DefaultVideo.png'})
+        commands = []
+        commands.append((_addon.getLocalizedString(30213),
+                         'Container.Update(' + get_url(action='movie', remove=movie['name']) + ')'))
+        listitem.addContextMenuItems(commands)
+        listing.add(get_url(action='movie_detail', movie_name=movie['name']), listitem, True)
+
+    listing.finish(updateListing=updateListing)
+
+
+def movie_search(params):
+    """Search for a movie"""
+    token = revalidate()
+
+    # Determine movie name
+    movie_name = params.get('movie_name')
+    if not movie_name:
+        movie_name = ask(None)
+    if not movie_name:
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+        return
+
+    # Initialize MovieManager
+    mm = movie_manager.MovieManager(_addon, _profile)
+
+    # If movie already exists locally, play it without refreshing
+    if mm.load_movie_data(movie_name):
+        xbmc.executebuiltin(f'Container.Update({get_url(action="movie_detail", movie_name=movie_name)})')
+        return
+
+    # Show progress dialog
+    progress = xbmcgui.DialogProgress()
+    progress.create('YaWSP', f'Vyhledavam film {movie_name}...')
+
+    try:
+        # Search for the movie
+        movie_data = mm.search_movie(movie_name, api, token)
+
+        if not movie_data or not movie_data['file']:
+            progress.close()
+            popinfo('Nenalezen zadny film', icon=xbmcgui.NOTIFICATION_WARNING)
+            xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+            return
+
+        # Success
+        progress.close()
+        popinfo(f'Nalezen film: {movie_data["file"]["name"]}')
+
+        # Redirect to movie detail
+        xbmc.executebuiltin(f'Container.Update({get_url(action="movie_detail", movie_name=movie_name)})')
+
+    except Exception as e:
+        progress.close()
+        traceback.print_exc()
+        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+
+
+def movie_detail(params):
+    """Show movie detail and play option"""
+    movie_name = params['movie_name']
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + " \\ " + movie_name)
+
+    # Initialize MovieManager
+    mm = movie_manager.MovieManager(_addon, _profile)
+
+    movie_data = mm.load_movie_data(movie_name)
+    if not movie_data:
+        xbmcgui.Dialog().notification('YaWSP', 'Data filmu nenalezena', xbmcgui.NOTIFICATION_WARNING)
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+        return
+
+    listing = Listing(yawsp._handle, 'movies')
+
+    # Add "Refresh movie" option
+    listing.item("Aktualizovat film", get_url(action='movie_refresh', movie_name=movie_name), True, icon='DefaultAddonsSearch.png')
+
+    # Show movie file if available
+    if movie_data['file']:
+        movie_file = movie_data['file']
+        movie_title = f"{movie_name} - {movie_file['name']}"
+        info = _trakt_movie_meta(mm, movie_name, movie_data)
+        poster = info.get('poster')
+        plot = info.get('plot') or ''
+        rating = info.get('rating')
+
+        listitem = xbmcgui.ListItem(label=movie_title, offscreen=True)
+        art = {'icon': 'DefaultVideo.png'}
+        if poster:
+            art['thumb'] = poster
+        listitem.setArt(art)
+        listitem.setProperty('IsPlayable', 'true')
+        meta = {'title': movie_title}
+        if plot:
+            meta['plot'] = plot
+        if rating is not None:
+            meta['rating'] = rating
+        listitem.setInfo('video', meta)
+
+        url = get_url(action='play', ident=movie_file['ident'], name=movie_file['name'], movie=movie_name)
+        listing.add(url, listitem, False)
+
+    listing.finish()
+
+
+def movie_refresh(params):
+    """Refresh movie data"""
+    token = revalidate()
+    movie_name = params['movie_name']
+
+    # Initialize MovieManager and perform search
+    mm = movie_manager.MovieManager(_addon, _profile)
+
+    # Show progress dialog
+    progress = xbmcgui.DialogProgress()
+    progress.create('YaWSP', f'Aktualizuji data pro film {movie_name}...')
+
+    try:
+        # Search for the movie
+        movie_data = mm.search_movie(movie_name, api, token)
+
+        if not movie_data or not movie_data['file']:
+            progress.close()
+            popinfo('Nenalezen zadny film', icon=xbmcgui.NOTIFICATION_WARNING)
+            xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+            return
+
+        # Success
+        progress.close()
+        popinfo(f'Aktualizovano: {movie_data["file"]["name"]}')
+
+        # Redirect to movie detail to refresh the view
+        xbmc.executebuiltin(f'Container.Update({get_url(action="movie_detail", movie_name=movie_name)})')
+
+    except Exception as e:
+        progress.close()
+        traceback.print_exc()
+        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
+        xbmcplugin.endOfDirectory(yawsp._handle, succeeded=False)
+
+
+def movie_trending(params):
+    """List trending movies from Trakt with paging."""
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + ' \\ Trending movies')
+
+    listing = Listing(yawsp._handle, 'movies')
+    page = int(params.get('page', '1'))
+    limit = 20
+
+    data, headers = _trakt_request('movies/trending',
+                                   {'limit': limit, 'page': page,
+                                    'extended': 'full,images'})
+
+    if page > 1:
+        listing.item(_addon.getLocalizedString(30206), get_url(action='movie_trending', page=page - 1), True, icon='DefaultMovies.png')
+
+    for item in data:
+        movie = item.get('movie', {})
+        title = movie.get('title')
+        if not title:
+            continue
+        watchers = item.get('watchers', 0)
+        label = f"{title} ({watchers} users)"
+        listitem = xbmcgui.ListItem(label=label, offscreen=True)
+        poster = movie.get('images', {}).get('poster')
+        thumb = poster[0] if isinstance(poster, list) and poster else None
+        if thumb and not thumb.startswith('http'):
+            thumb = 'https://' + thumb
+        art = {'icon': 'DefaultMovies.png'}
+        if thumb:
+            art['thumb'] = thumb
+        listitem.setArt(art)
+        info = {'title': title}
+        overview = movie.get('overview')
+        if overview:
+            info['plot'] = overview
+        rating = movie.get('rating')
+        if rating is not None:
+            info['rating'] = rating
+        listitem.setInfo('video', info)
+        listing.add(get_url(action='movie_search', movie_name=title), listitem, True)
+
+    page_count = int(headers.get('X-Pagination-Page-Count', page))
+    if page < page_count:
+        listing.item(_addon.getLocalizedString(30207), get_url(action='movie_trending', page=page + 1), True, icon='DefaultMovies.png')
+
+    listing.finish()
+
+
+def movie_popular(params):
+    """List popular movies from Trakt with paging."""
+    xbmcplugin.setPluginCategory(yawsp._handle, _addon.getAddonInfo('name') + ' \\ Popular movies')
+
+    listing = Listing(yawsp._handle, 'movies')
+    page = int(params.get('page', '1'))
+    limit = 20
+
+    data, headers = _trakt_request('movies/popular',
+                                   {'limit': limit, 'page': page,
+                                    'extended': 'full,images'})
+
+    if page > 1:
+        listing.item(_addon.getLocalizedString(30206), get_url(action='movie_popular', page=page - 1), True, icon='DefaultMovies.png')
+
+    watchers_list = _trakt_watchers('movies', data)
+    for movie, watchers in zip(data, watchers_list):
+        title = movie.get('title')
+        if not title:
+            continue
+        label = f"{title} ({watchers} users)"
+        listitem = xbmcgui.ListItem(label=label, offscreen=True)
+        poster = movie.get('images', {}).get('poster')
+        thumb = poster[0] if isinstance(poster, list) and poster else None
+        if thumb and not thumb.startswith('http'):
+            thumb = 'https://' + thumb
+        art = {'icon': 'DefaultMovies.png'}
+        if thumb:
+            art['thumb'] = thumb
+        listitem.setArt(art)
+        info = {'title': title}
+        overview = movie.get('overview')
+        if overview:
+            info['plot'] = overview
+        rating = movie.get('rating')
+        if rating is not None:
+            info['rating'] = rating
+        listitem.setInfo('video', info)
+        listing.add(get_url(action='movie_search', movie_name=title), listitem, True)
+
+    page_count = int(headers.get('X-Pagination-Page-Count', page))
+    if page < page_count:
+        listing.item(_addon.getLocalizedString(30207), get_url(action='movie_popular', page=page + 1), True, icon='DefaultMovies.png')
+
+    listing.finish()
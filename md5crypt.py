@@ -43,13 +43,28 @@ ITOA64 = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
 
 import hashlib
 
+_md5 = hashlib.md5
+
+# which of the 1000 rounds add the salt and which add pw a second time,
+# the pattern repeats every 42 rounds (2 * 3 * 7)
+_ROUNDS = [(i & 1, bool(i % 3), bool(i % 7)) for i in range(42)]
+
+# byte triples of the digest encoded into the result, 4 characters each
+_TRIPLES = ((0, 6, 12), (1, 7, 13), (2, 8, 14), (3, 9, 15), (4, 10, 5))
+
+
+def _bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode("utf-8")
+
+
 def to64 (v, n):
-    ret = ''
-    while (n - 1 >= 0):
-        n = n - 1
-        ret = ret + ITOA64[v & 0x3f]
+    ret = []
+    for _ in range(n):
+        ret.append(ITOA64[v & 0x3f])
         v = v >> 6
-    return ret
+    return ''.join(ret)
 
 
 def apache_md5_crypt (pw, salt):
@@ -58,136 +73,60 @@ def apache_md5_crypt (pw, salt):
 
 
 def unix_md5_crypt(pw, salt, magic=None):
+    """crypt() compatible MD5 hash, pw and salt are bytes or str."""
 
     if magic == None:
         magic = MAGIC
 
-    # Take care of the magic string if present
-    if salt[:len(magic)] == magic:
-        salt = salt[len(magic):]
+    pw = _bytes(pw)
+    salt = _bytes(salt)
+    bmagic = _bytes(magic)
 
+    # Take care of the magic string if present
+    if salt.startswith(bmagic):
+        salt = salt[len(bmagic):]
 
     # salt can have up to 8 characters:
-    import string
-    
-    try:
-        salt = string.split(salt, '$', 1)[0]
-    except AttributeError:
-        salt = salt.decode("utf-8").split('$', 1)[0].encode("utf-8")
-    
-    salt = salt[:8]
-    
-    try:
-        ctx = pw + magic + salt
-    except TypeError:
-        ctx = pw + magic.encode("utf-8") + salt
-
-    final = hashlib.md5(pw + salt + pw).digest()
-
-    for pl in range(len(pw),0,-16):
-        if pl > 16:
-            ctx = ctx + final[:16]
-        else:
-            ctx = ctx + final[:pl]
+    salt = salt.split(b'$', 1)[0][:8]
+
+    ctx = bytearray(pw + bmagic + salt)
 
+    final = _md5(pw + salt + pw).digest()
+
+    for pl in range(len(pw), 0, -16):
+        ctx += final[:min(pl, 16)]
 
     # Now the 'weird' xform (??)
 
     i = len(pw)
     while i:
         if i & 1:
-            try:
-                ctx = ctx + chr(0)  #if ($i & 1) { $ctx->add(pack("C", 0)); }
-            except TypeError:
-                ctx = ctx + chr(0).encode("utf-8")
+            ctx.append(0)
         else:
-            try:
-                ctx = ctx + pw[0]
-            except TypeError:
-                ctx = ctx + chr(pw[0]).encode("utf-8")
+            ctx.append(pw[0])
         i = i >> 1
 
-    final = hashlib.md5(ctx).digest()
+    final = _md5(ctx).digest()
 
     # The following is supposed to make
     # things run slower.
 
-    # my question: WTF???
-
-    for i in range(1000):
-        ctx1 = ''.encode("utf-8")
-
-        if i & 1:
-            ctx1 = ctx1 + pw
-        else:
-            ctx1 = ctx1 + final[:16]
-
-        if i % 3:
-            ctx1 = ctx1 + salt
-
-        if i % 7:
-            ctx1 = ctx1 + pw
-
-        if i & 1:
-            ctx1 = ctx1 + final[:16]
-        else:
-            ctx1 = ctx1 + pw
-
-
-        final = hashlib.md5(ctx1).digest()
+    # every round hashes head + final + tail, both are known up front
+    pattern = []
+    for odd, add_salt, add_pw in _ROUNDS:
+        middle = (salt if add_salt else b'') + (pw if add_pw else b'')
+        pattern.append((pw + middle, b'') if odd else (b'', middle + pw))
+    rounds = (pattern * (1000 // 42 + 1))[:1000]
 
+    for head, tail in rounds:
+        final = _md5(head + final + tail).digest()
 
     # Final xform
-    
-    passwd = ''
-
-    try:
-        passwd = passwd + to64((int(ord(final[0])) << 16)
-                               |(int(ord(final[6])) << 8)
-                               |(int(ord(final[12]))),4)
-
-        passwd = passwd + to64((int(ord(final[1])) << 16)
-                               |(int(ord(final[7])) << 8)
-                               |(int(ord(final[13]))), 4)
-
-        passwd = passwd + to64((int(ord(final[2])) << 16)
-                               |(int(ord(final[8])) << 8)
-                               |(int(ord(final[14]))), 4)
-
-        passwd = passwd + to64((int(ord(final[3])) << 16)
-                               |(int(ord(final[9])) << 8)
-                               |(int(ord(final[15]))), 4)
-
-        passwd = passwd + to64((int(ord(final[4])) << 16)
-                               |(int(ord(final[10])) << 8)
-                               |(int(ord(final[5]))), 4)
-
-        passwd = passwd + to64((int(ord(final[11]))), 2)
-
-        return magic + salt + '$' + passwd
-    except TypeError:
-        passwd = passwd + to64((int(final[0]) << 16)
-                               |(int(final[6]) << 8)
-                               |(int(final[12])),4)
-
-        passwd = passwd + to64((int(final[1]) << 16)
-                               |(int(final[7]) << 8)
-                               |(int(final[13])), 4)
-
-        passwd = passwd + to64((int(final[2]) << 16)
-                               |(int(final[8]) << 8)
-                               |(int(final[14])), 4)
-
-        passwd = passwd + to64((int(final[3]) << 16)
-                               |(int(final[9]) << 8)
-                               |(int(final[15])), 4)
 
-        passwd = passwd + to64((int(final[4]) << 16)
-                               |(int(final[10]) << 8)
-                               |(int(final[5])), 4)
+    passwd = [to64((final[a] << 16) | (final[b] << 8) | final[c], 4) for a, b, c in _TRIPLES]
+    passwd.append(to64(final[11], 2))
 
-        passwd = passwd + to64((int(final[11])), 2)
-        return magic + salt.decode("utf-8") + '$' + passwd
+    return magic + salt.decode("utf-8") + '$' + ''.join(passwd)
 
 ## assign a wrapper function:
 md5crypt = unix_md5_crypt
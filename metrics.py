@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Module: metrics
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import json
+import math
+import os
+import threading
+import time
+import traceback
+
+METRICS = 'metrics'
+EXPORT = 'diagnostics.txt'
+# The log is cut to half this size, newest lines kept, once it grows past it
+MAX_BYTES = 256 * 1024
+SLOWEST = 10
+
+
+def percentile(values, share):
+    """Nearest rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[max(0, int(math.ceil(share * len(values))) - 1)]
+
+
+def sizeof(nbytes):
+    for unit in ('B', 'KB', 'MB'):
+        if nbytes < 1024:
+            return '%d %s' % (nbytes, unit) if unit == 'B' else '%.1f %s' % (nbytes, unit)
+        nbytes /= 1024.0
+    return '%.1f GB' % nbytes
+
+
+class Metrics:
+    """Rolling log of timed calls and cache lookups in the profile.
+
+    record() and cache() only collect in memory, from any thread. flush()
+    appends what was collected to a JSON lines file shared by the plugin
+    and its service, so a plugin call pays for one small write. Once the
+    file grows past max_bytes it is cut to the newest half of that.
+    """
+
+    def __init__(self, profile, max_bytes=MAX_BYTES, clock=time.time):
+        self.profile = profile
+        self.path = os.path.join(profile, METRICS)
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok, status='', nbytes=0, retries=0):
+        """One finished call of an endpoint (api/search, trakt/shows/trending, download)."""
+        entry = {'t': round(self.clock(), 3), 'e': endpoint, 'ms': round(seconds * 1000, 1), 'ok': bool(ok),
+                 's': str(status), 'b': int(nbytes or 0), 'r': int(retries or 0)}
+        with self.lock:
+            self.pending.append(entry)
+
+    def cache(self, name, hit):
+        """One lookup of a cache, hit or miss."""
+        with self.lock:
+            self.pending.append({'t': round(self.clock(), 3), 'c': name, 'h': bool(hit)})
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+        try:
+            if not os.path.exists(self.profile):
+                os.makedirs(self.profile)
+            with io.open(self.path, 'a', encoding='utf8') as file:
+                file.write(''.join(json.dumps(entry) + '\n' for entry in pending))
+            if os.path.getsize(self.path) > self.max_bytes:
+                self._trim()
+        except Exception:
+            traceback.print_exc()
+
+    def _trim(self):
+        with io.open(self.path, 'r', encoding='utf8') as file:
+            lines = file.readlines()
+        tmp = self.path + '.tmp'
+        kept, size = len(lines), 0
+        while kept and size + len(lines[kept - 1]) <= self.max_bytes // 2:
+            kept -= 1
+            size += len(lines[kept])
+        with io.open(tmp, 'w', encoding='utf8') as file:
+            file.write(''.join(lines[kept:]))
+        os.replace(tmp, self.path)
+
+    def entries(self):
+        """Everything in the log and not yet flushed, oldest first."""
+        entries = []
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # a line cut short by a concurrent trim
+                        continue
+        except (IOError, OSError):
+            pass
+        with self.lock:
+            return entries + list(self.pending)
+
+    def clear(self):
+        with self.lock:
+            self.pending = []
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def summary(self, slowest=SLOWEST):
+        """Per endpoint and per cache figures, and the slowest calls."""
+        calls, caches = {}, {}
+        timed = []
+        for entry in self.entries():
+            if 'c' in entry:
+                counts = caches.setdefault(entry['c'], [0, 0])
+                counts[0 if entry['h'] else 1] += 1
+            elif 'e' in entry:
+                calls.setdefault(entry['e'], []).append(entry)
+                timed.append(entry)
+        endpoints = []
+        for endpoint, entries in sorted(calls.items()):
+            times = [entry['ms'] for entry in entries]
+            endpoints.append({
+                'endpoint': endpoint, 'calls': len(entries),
+                'failed': sum(1 for entry in entries if not entry['ok']),
+                'retries': sum(entry['r'] for entry in entries),
+                'bytes': sum(entry['b'] for entry in entries),
+                'p50': percentile(times, 0.5), 'p95': percentile(times, 0.95), 'max': max(times),
+            })
+        rates = [{'cache': name, 'hits': hits, 'misses': misses, 'rate': hits / float(hits + misses)}
+                 for name, (hits, misses) in sorted(caches.items())]
+        timed.sort(key=lambda entry: entry['ms'], reverse=True)
+        return endpoints, rates, timed[:slowest]
+
+    def report(self):
+        """The summary as plain text."""
+        endpoints, rates, slowest = self.summary()
+        lines = ['YaWSP diagnostics, ' + time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.clock())), '']
+        lines.append('%-32s %6s %6s %7s %9s %9s %9s %10s' % ('endpoint', 'calls', 'failed', 'retries',
+                                                             'p50 ms', 'p95 ms', 'max ms', 'bytes'))
+        for row in endpoints:
+            lines.append('%-32s %6d %6d %7d %9.1f %9.1f %9.1f %10s' % (
+                row['endpoint'], row['calls'], row['failed'], row['retries'], row['p50'], row['p95'],
+                row['max'], sizeof(row['bytes'])))
+        lines += ['', '%-32s %6s %6s %9s' % ('cache', 'hits', 'misses', 'hit rate')]
+        for row in rates:
+            lines.append('%-32s %6d %6d %8.0f%%' % (row['cache'], row['hits'], row['misses'], row['rate'] * 100))
+        lines += ['', 'slowest recent calls']
+        for entry in slowest:
+            lines.append('%s  %-32s %9.1f ms  %-12s %10s %s' % (
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['t'])), entry['e'], entry['ms'],
+                entry['s'], sizeof(entry['b']), ('%d retries' % entry['r']) if entry['r'] else ''))
+        return '\n'.join(line.rstrip() for line in lines) + '\n'
+
+    def export(self, path=None):
+        """Write the report to a text file, the profile's diagnostics.txt by default."""
+        path = path or os.path.join(self.profile, EXPORT)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, 'w', encoding='utf8') as file:
+            file.write(self.report())
+        return path
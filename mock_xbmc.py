@@ -21,6 +21,12 @@ class MockXBMC:
     def translatePath(path):
         return path
 
+    PLAYLIST_VIDEO = 1
+
+    @staticmethod
+    def executebuiltin(function):
+        pass
+
     class PlayList:
         VIDEO = 1
 
@@ -38,6 +44,20 @@ class MockXBMC:
             print(f"[MOCK PLAYER] play called with {len(getattr(playlist, 'items', []))} items starting at {startpos}")
 
 # Mock xbmcaddon module
+_STRINGS = {}
+
+
+def _strings():
+    if not _STRINGS:
+        import io, os, re
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'language',
+                            'resource.language.en_gb', 'strings.po')
+        with io.open(path, encoding='utf-8') as f:
+            for id, text in re.findall(r'msgctxt "#(\d+)"\nmsgid "(.*)"', f.read()):
+                _STRINGS[int(id)] = text
+    return _STRINGS
+
+
 class MockAddon:
     def __init__(self, id=None):
         self.id = id
@@ -48,6 +68,10 @@ class MockAddon:
     
     def setSetting(self, key, value):
         self.settings[key] = value
+
+    def getLocalizedString(self, id):
+        # the English source strings, so formatted messages can be formatted
+        return _strings().get(id, "String %d" % id)
     
     def getAddonInfo(self, key):
         if key == 'name':
@@ -66,14 +90,17 @@ class MockXBMCAddon:
 
 # Mock xbmcgui module
 class MockListItem:
-    def __init__(self, label="", label2="", iconImage="", thumbnailImage="", path=""):
+    def __init__(self, label="", label2="", iconImage="", thumbnailImage="", path="", offscreen=False):
         self.label = label
         self.label2 = label2
         self.iconImage = iconImage
         self.thumbnailImage = thumbnailImage
         self.path = path
+        self.offscreen = offscreen
         self.info = {}
         self.art = {}
+        self.properties = {}
+        self.context_menu = []
     
     def setInfo(self, type, infoLabels):
         self.info[type] = infoLabels
@@ -81,30 +108,87 @@ class MockListItem:
     def setArt(self, art):
         self.art.update(art)
 
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def addContextMenuItems(self, items, replaceItems=False):
+        self.context_menu.extend(items)
+
 class MockXBMCGui:
     NOTIFICATION_INFO = 0
     NOTIFICATION_WARNING = 1
     NOTIFICATION_ERROR = 2
     
     @staticmethod
-    def ListItem(label="", label2="", iconImage="", thumbnailImage="", path=""):
-        return MockListItem(label, label2, iconImage, thumbnailImage, path)
+    def ListItem(label="", label2="", iconImage="", thumbnailImage="", path="", offscreen=False):
+        return MockListItem(label, label2, iconImage, thumbnailImage, path, offscreen)
     
     @staticmethod
     def Dialog():
         return MockDialog()
 
+    @staticmethod
+    def DialogProgress():
+        return MockDialogProgress()
+
+    @staticmethod
+    def Window(id):
+        return MockWindow(id)
+
 class MockDialog:
     def notification(self, heading, message, icon=0, time=5000, sound=True):
         print(f"[NOTIFICATION] {heading}: {message}")
 
+    def textviewer(self, heading, text):
+        pass
+
+    def select(self, heading, options):
+        return -1
+
+class MockDialogProgress:
+    def create(self, heading, message=""):
+        pass
+
+    def update(self, percent, message=""):
+        pass
+
+    def iscanceled(self):
+        return False
+
+    def close(self):
+        pass
+
+class MockWindow:
+    properties = {}
+
+    def __init__(self, id):
+        self.id = id
+
+    def getProperty(self, key):
+        return self.properties.get((self.id, key), "")
+
+    def setProperty(self, key, value):
+        self.properties[(self.id, key)] = value
+
+    def clearProperty(self, key):
+        self.properties.pop((self.id, key), None)
+
 # Mock xbmcplugin module
 class MockXBMCPlugin:
+    SORT_METHOD_NONE = 0
     SORT_METHOD_LABEL = 1
     
     @staticmethod
     def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
         return True
+
+    @staticmethod
+    def addDirectoryItems(handle, items, totalItems=0):
+        return True
+
+    @staticmethod
+    def setContent(handle, content):
+        pass
     
     @staticmethod
     def addSortMethod(handle, sortMethod):
@@ -118,6 +202,10 @@ class MockXBMCPlugin:
     def setPluginCategory(handle, category):
         pass
 
+    @staticmethod
+    def setResolvedUrl(handle, succeeded, listitem):
+        pass
+
 # Mock xbmcvfs module
 class MockXBMCVfs:
     @staticmethod
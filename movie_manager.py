@@ -21,7 +21,7 @@ try:
 except ImportError:
     from xbmcvfs import translatePath
 
-from series_manager import _normalize, BaseManager
+from series_manager import _normalize, BaseManager, ALTERNATIVES
 
 
 class MovieManager(BaseManager):
@@ -42,13 +42,16 @@ class MovieManager(BaseManager):
                 if result not in all_results and self._is_movie_match(result.get('name', ''), movie_name):
                     all_results.append(result)
 
+        # Stable sort keeps the first seen file when scores are equal
+        all_results.sort(key=lambda item: self._calculate_file_score(item['name'], item.get('size', '0')),
+                         reverse=True)
         best_file = None
-        best_score = -1
-        for item in all_results:
-            score = self._calculate_file_score(item['name'], item.get('size', '0'))
-            if score > best_score:
-                best_file = item
-                best_score = score
+        if all_results:
+            best_file = dict(all_results[0])
+            best_file['alternatives'] = [
+                {'name': item['name'], 'ident': item['ident'], 'size': item.get('size', '0')}
+                for item in all_results[1:1 + ALTERNATIVES]
+            ]
 
         movie_data = {
             'name': movie_name,
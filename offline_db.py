@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+# Module: offline_db
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import json
+import os
+import posixpath
+import re
+import sqlite3
+import time
+import traceback
+import zipfile
+
+import unidecode
+
+import downloader
+
+ARCHIVE = 'db.zip'
+FOLDER = 'db'
+INDEX = 'db.sqlite'
+SCHEMA = 4
+# Most search results listed at once
+SEARCH_LIMIT = 200
+
+_TABLES = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE categories (name TEXT PRIMARY KEY, items INTEGER, crc INTEGER);
+CREATE TABLE items (
+    seq INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    sort TEXT NOT NULL,
+    plot TEXT,
+    streams TEXT
+);
+CREATE INDEX items_sort ON items (category, sort, seq);
+CREATE UNIQUE INDEX items_key ON items (category, id);
+CREATE TABLE terms (
+    term TEXT NOT NULL,
+    item INTEGER NOT NULL,
+    title INTEGER NOT NULL,
+    PRIMARY KEY (term, item)
+) WITHOUT ROWID;
+"""
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def terms(text):
+    """Search terms of a text: lowercase ASCII words, accents removed."""
+    if not text:
+        return []
+    return _WORD_RE.findall(unidecode.unidecode(text).lower())
+
+
+def sort_key(title):
+    """Titles are listed in the order of this key, lowercase ASCII."""
+    return unidecode.unidecode(title or '').lower().strip()
+
+
+def download_archive(session, link, path, chunk_size=downloader.CHUNK_SIZE):
+    """Stream the backup archive into path and check it before it is used.
+
+    The archive is written to a .part file first, its length is compared
+    with the response and every member is CRC checked, so a broken
+    download never replaces a good archive.
+    """
+    tmp = path + downloader.PART
+    response = session.get(link, stream=True, timeout=downloader.TIMEOUT)
+    try:
+        response.raise_for_status()
+        expected = response.headers.get('content-length')
+        version = _version(response.headers)
+        with io.open(tmp, 'wb') as out:
+            written = downloader.copy(response.iter_content(chunk_size=chunk_size), out)
+    finally:
+        response.close()
+    try:
+        if expected is not None and written != int(expected):
+            raise IOError('archive truncated: %d of %s bytes' % (written, expected))
+        with zipfile.ZipFile(tmp) as zf:
+            bad = zf.testzip()
+        if bad is not None:
+            raise IOError('archive member %s is corrupt' % bad)
+    except (IOError, OSError, zipfile.BadZipfile):
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    # index the new archive right away, browsing never parses JSON
+    build_index(DbArchive(path), os.path.join(os.path.dirname(path), INDEX), version)
+
+
+def _version(headers):
+    """What identifies one upload of the archive on the server."""
+    return headers.get('etag') or headers.get('last-modified')
+
+
+def _data(fdata):
+    try:
+        return json.loads(fdata, "utf-8")['data']
+    except TypeError:
+        return json.loads(fdata)['data']
+
+
+class DbArchive:
+    """Database files read straight from the backup zip, one member at a time."""
+
+    def __init__(self, path):
+        self.path = path
+        self._members = None
+
+    def _index(self):
+        if self._members is None:
+            with zipfile.ZipFile(self.path) as zf:
+                self._members = _members(zf)
+        return self._members
+
+    def names(self):
+        return sorted(self._index())
+
+    def crc(self, name):
+        return self._index()[name].CRC
+
+    def load(self, name):
+        member = self._index().get(name)
+        if member is None:
+            return {}
+        with zipfile.ZipFile(self.path) as zf:
+            with zf.open(member) as file:
+                return _data(file.read().decode('utf8'))
+
+
+class DbFolder:
+    """Database files extracted by older versions."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def names(self):
+        return sorted(f for f in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, f)))
+
+    def crc(self, name):
+        return None
+
+    def load(self, name):
+        with io.open(os.path.join(self.path, name), 'r', encoding='utf8') as file:
+            return _data(file.read())
+
+
+def _members(zf):
+    """Database file name -> ZipInfo of the archive members."""
+    return dict((posixpath.basename(info.filename), info)
+                for info in zf.infolist() if not info.filename.endswith('/'))
+
+
+class RemoteFile:
+    """Seekable read-only view of a file on a web server, read by Range requests.
+
+    Lets zipfile read the central directory and single members of a remote
+    archive without downloading all of it. The first request fetches the
+    tail of the file, which is where the central directory is.
+    """
+
+    BLOCK = 64 * 1024
+
+    def __init__(self, session, link, timeout=downloader.TIMEOUT):
+        self.session = session
+        self.link = link
+        self.timeout = timeout
+        self.pos = 0
+        self.requests = 0
+        self.received = 0
+        response, data = self._get('bytes=-%d' % self.BLOCK)
+        try:
+            self.size = int(response.headers['content-range'].rsplit('/', 1)[1])
+        except (KeyError, ValueError):
+            raise IOError('no length in Content-Range')
+        self.version = _version(response.headers)
+        self._start = self.size - len(data)
+        self._data = data
+
+    def _get(self, ranges):
+        response = self.session.get(self.link, headers={'Range': ranges}, stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # never download the whole archive by accident
+                raise IOError('server ignores Range requests')
+            data = response.content
+        finally:
+            response.close()
+        self.requests += 1
+        self.received += len(data)
+        return response, data
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = min(n, self.size - self.pos)
+        if n <= 0:
+            return b''
+        start = self.pos - self._start
+        cached = self._start + len(self._data)
+        if start < 0 or start + n > len(self._data):
+            end = min(self.size, self.pos + max(n, self.BLOCK))
+            if 0 <= start <= len(self._data):
+                # continues what was read last, fetch only the rest
+                response, data = self._get('bytes=%d-%d' % (cached, end - 1))
+                self._data = self._data[start:] + data
+            else:
+                response, self._data = self._get('bytes=%d-%d' % (self.pos, end - 1))
+            self._start = self.pos
+            start = 0
+        self.pos += n
+        return self._data[start:start + n]
+
+    def close(self):
+        pass
+
+
+def open_source(profile):
+    """The downloaded database files, None when there are none yet."""
+    archive = os.path.join(profile, ARCHIVE)
+    if os.path.exists(archive):
+        return DbArchive(archive)
+    folder = os.path.join(profile, FOLDER)
+    if os.path.exists(folder):
+        return DbFolder(folder)
+    return None
+
+
+def _insert_category(conn, source, name):
+    try:
+        data = source.load(name)
+    except Exception:
+        traceback.print_exc()
+        return
+    count = 0
+    postings = []
+    for item in data:
+        if 'id' not in item:
+            continue
+        seq = conn.execute('INSERT OR REPLACE INTO items (category, id, title, sort, plot, streams) '
+                           'VALUES (?, ?, ?, ?, ?, ?)',
+                           (name, str(item['id']), item.get('title'), sort_key(item.get('title')),
+                            item.get('plot'), json.dumps(item.get('streams', [])))).lastrowid
+        words = dict.fromkeys(terms(item.get('plot')), 0)
+        words.update(dict.fromkeys(terms(item.get('title')), 1))
+        postings.extend((word, seq, title) for word, title in words.items())
+        count += 1
+    conn.executemany('INSERT OR REPLACE INTO terms VALUES (?, ?, ?)', postings)
+    conn.execute('INSERT INTO categories VALUES (?, ?, ?)', (name, count, source.crc(name)))
+
+
+def _set_meta(conn, key, value):
+    conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, None if value is None else str(value)))
+
+
+def build_index(source, path, version=None):
+    """Convert all database files into an SQLite index at path.
+
+    Besides the items the index holds an inverted list of the words of
+    every title and plot, so searching never scans the items.
+    The index is written next to path and moved in place when complete,
+    so readers see either the old or the new index, never a partial one.
+    """
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(_TABLES)
+        for name in source.names():
+            _insert_category(conn, source, name)
+        _set_meta(conn, 'schema', SCHEMA)
+        _set_meta(conn, 'version', version)
+        _set_meta(conn, 'checked', int(time.time()))
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+
+class OfflineDb:
+    """Indexed read access to the offline database."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+
+    def close(self):
+        self.conn.close()
+
+    def meta(self, key):
+        try:
+            row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.conn:
+            _set_meta(self.conn, key, value)
+
+    def schema(self):
+        value = self.meta('schema')
+        return int(value) if value else None
+
+    def crcs(self):
+        """Category -> CRC of the archive member it was indexed from."""
+        return dict(self.conn.execute('SELECT name, crc FROM categories'))
+
+    def replace(self, source, changed, removed, version):
+        """Index the changed categories again and drop the removed ones.
+
+        One transaction, readers see the old or the new database.
+        """
+        gone = list(changed) + list(removed)
+        marks = ','.join('?' * len(gone))
+        with self.conn:
+            if gone:
+                self.conn.execute('DELETE FROM terms WHERE item IN (SELECT seq FROM items WHERE category IN (%s))'
+                                  % marks, gone)
+                self.conn.execute('DELETE FROM items WHERE category IN (%s)' % marks, gone)
+                self.conn.execute('DELETE FROM categories WHERE name IN (%s)' % marks, gone)
+            for name in changed:
+                _insert_category(self.conn, source, name)
+            _set_meta(self.conn, 'version', version)
+            _set_meta(self.conn, 'checked', int(time.time()))
+
+    def categories(self):
+        return [row[0] for row in self.conn.execute('SELECT name FROM categories ORDER BY name')]
+
+    def count(self, category):
+        row = self.conn.execute('SELECT items FROM categories WHERE name = ?', (category,)).fetchone()
+        return row[0] if row else 0
+
+    def items(self, category, offset=0, limit=-1):
+        """(id, title, plot) of a category by title, limit items from offset.
+
+        The (category, sort, seq) index yields a page without reading the
+        items before it.
+        """
+        return self.conn.execute('SELECT id, title, plot FROM items WHERE category = ? '
+                                 'ORDER BY sort, seq LIMIT ? OFFSET ?', (category, limit, offset)).fetchall()
+
+    def letters(self, category):
+        """First characters of the sort keys in a category, in order."""
+        found = []
+        start = ''
+        while True:
+            # one index seek per letter instead of reading the category
+            row = self.conn.execute('SELECT sort FROM items WHERE category = ? AND sort >= ? '
+                                    'ORDER BY sort LIMIT 1', (category, start)).fetchone()
+            if row is None:
+                return found
+            letter = row[0][:1]
+            if letter:
+                found.append(letter)
+                start = chr(ord(letter) + 1)
+            else:
+                start = '\x00'
+
+    def position(self, category, letter):
+        """Offset of the first item whose title starts at letter or later."""
+        return self.conn.execute('SELECT count(*) FROM items WHERE category = ? AND sort < ?',
+                                 (category, letter)).fetchone()[0]
+
+    def item(self, category, key):
+        row = self.conn.execute('SELECT id, title, plot, streams FROM items WHERE category = ? AND id = ?',
+                                (category, key)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'title': row[1], 'plot': row[2], 'streams': json.loads(row[3])}
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """(category, id, title, plot) of items containing every word of query.
+
+        Each word matches as a prefix. Items with more of the words in the
+        title come first, otherwise archive order is kept.
+        """
+        words = sorted(set(terms(query)))
+        if not words:
+            return []
+        # one row per item and word, 1 when the word is in the title;
+        # terms are [a-z0-9], so word + '{' bounds every term with the prefix
+        hits = ' UNION ALL '.join(['SELECT item, max(title) AS title FROM terms '
+                                   'WHERE term >= ? AND term < ? GROUP BY item'] * len(words))
+        args = []
+        for word in words:
+            args.extend((word, word + '{'))
+        args.extend((len(words), limit))
+        return self.conn.execute(
+            'SELECT category, id, items.title, plot FROM ('
+            'SELECT item, sum(title) AS score FROM (%s) GROUP BY item HAVING count(*) = ? '
+            'ORDER BY score DESC, item LIMIT ?) AS best '
+            'JOIN items ON items.seq = best.item ORDER BY score DESC, item' % hits, args).fetchall()
+
+
+def open_db(profile):
+    """Open the indexed database, building the index from the files once.
+
+    An index of an older schema is rebuilt.
+
+    Returns None when nothing has been downloaded yet.
+    """
+    path = os.path.join(profile, INDEX)
+    if os.path.exists(path):
+        db = OfflineDb(path)
+        if db.schema() == SCHEMA:
+            return db
+        # written by an older version, convert again
+        db.close()
+    source = open_source(profile)
+    if source is None:
+        return None
+    build_index(source, path)
+    return OfflineDb(path)
+
+
+def _rebuild_archive(remote, path):
+    """Write the remote archive to path.part, members the local archive has are copied."""
+    tmp = path + downloader.PART
+    try:
+        with zipfile.ZipFile(path) as local, zipfile.ZipFile(tmp, 'w') as out:
+            have = dict((info.filename, info) for info in local.infolist())
+            for info in remote.infolist():
+                mine = have.get(info.filename)
+                same = mine is not None and mine.CRC == info.CRC and mine.file_size == info.file_size
+                member = zipfile.ZipInfo(info.filename, info.date_time)
+                member.compress_type = info.compress_type
+                # reading checks the CRC, a damaged member fails the update
+                out.writestr(member, (local if same else remote).read(info.filename))
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return tmp
+
+
+def update(session, link, profile):
+    """Bring the offline database up to date with the archive at link.
+
+    Only the central directory of the remote archive is read to compare
+    member CRCs with the indexed categories. Changed members are fetched
+    with Range requests, unchanged ones are copied from the local archive,
+    and only the changed categories are indexed again. Returns the names
+    of the changed and removed categories, [] when nothing changed.
+    """
+    archive = os.path.join(profile, ARCHIVE)
+    db = open_db(profile)
+    if db is None or not os.path.exists(archive):
+        # nothing to compare with, e.g. a folder left by an old version
+        if db is not None:
+            db.close()
+        download_archive(session, link, archive)
+        return DbArchive(archive).names()
+    try:
+        remote = RemoteFile(session, link)
+        if remote.version is not None and remote.version == db.meta('version'):
+            db.set_meta('checked', int(time.time()))
+            return []
+        with zipfile.ZipFile(remote) as zf:
+            members = _members(zf)
+            indexed = db.crcs()
+            changed = sorted(name for name, info in members.items() if indexed.get(name) != info.CRC)
+            removed = sorted(set(indexed) - set(members))
+            if changed or removed:
+                # the archive first: if the index update is lost, the next
+                # check finds the members changed again and copies them locally
+                os.replace(_rebuild_archive(zf, archive), archive)
+        db.replace(DbArchive(archive), changed, removed, remote.version)
+        return changed + removed
+    finally:
+        db.close()
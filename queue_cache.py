@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Module: queue_cache
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import io
+import json
+import os
+import time
+import traceback
+
+QUEUE_CACHE = 'queue_cache'
+
+
+class QueueCache:
+    """Local mirror of the Webshare queue in the profile.
+
+    Queueing and dequeueing change the mirror at once, the queue view is
+    rendered from it and the queue is fetched again only after ttl seconds,
+    on an explicit refresh or when the mirror cannot be trusted (another
+    account, a failed API call, a file queued without its name).
+    """
+
+    def __init__(self, profile, ttl=600, user=''):
+        self.path = os.path.join(profile, QUEUE_CACHE)
+        self.ttl = ttl
+        self.user = user
+
+    def _load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf8') as file:
+                mirror = json.loads(file.read())
+        except (IOError, OSError, ValueError):
+            return None
+        if mirror.get('user') != self.user:
+            return None
+        return mirror
+
+    def _store(self, mirror):
+        tmp = self.path + '.tmp'
+        try:
+            with io.open(tmp, 'w', encoding='utf8') as file:
+                file.write(json.dumps(mirror))
+            os.replace(tmp, self.path)
+        except Exception:
+            traceback.print_exc()
+
+    def files(self):
+        """Return the mirrored queue or None when it has to be fetched."""
+        if self.ttl <= 0:
+            return None
+        mirror = self._load()
+        if mirror is None or mirror['fetched'] + self.ttl < time.time():
+            return None
+        return mirror['files']
+
+    def replace(self, files):
+        """Remember the queue as the server returned it."""
+        self._store({'user': self.user, 'fetched': time.time(), 'files': files})
+
+    def add(self, file):
+        """A file was queued, file is a dict with at least its ident."""
+        mirror = self._load()
+        if mirror is None:
+            return
+        if 'name' not in file:
+            # cannot be listed, fetch the queue next time
+            self.invalidate()
+            return
+        files = [f for f in mirror['files'] if f['ident'] != file['ident']]
+        files.append(file)
+        mirror['files'] = files
+        self._store(mirror)
+
+    def remove(self, ident):
+        """A file was dequeued."""
+        mirror = self._load()
+        if mirror is None:
+            return
+        mirror['files'] = [f for f in mirror['files'] if f['ident'] != ident]
+        self._store(mirror)
+
+    def invalidate(self):
+        """Forget the mirror, the next queue view fetches the queue."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
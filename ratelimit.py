@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Module: ratelimit
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Callers reserve tokens and sleep for their own share of the deficit, so
+    waiting callers are served in arrival order. The bucket also counts how
+    many callers are waiting and how long they waited in total.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._stamp = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.waited = 0.0
+        self.acquired = 0
+
+    def set_rate(self, rate, capacity=None):
+        """Change the refill rate, a rate of 0 or less disables limiting."""
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = float(rate)
+            if capacity is not None:
+                self.capacity = float(capacity)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def pause_until(self, deadline):
+        """Hold all callers until the given clock value."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, deadline)
+
+    def pause_for(self, seconds):
+        """Hold all callers for the given number of seconds."""
+        self.pause_until(self._clock() + max(0.0, seconds))
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self, tokens=1):
+        """Take tokens and return how long the caller has to wait for them."""
+        with self._lock:
+            now = self._clock()
+            delay = max(0.0, self._blocked_until - now)
+            if self.rate > 0:
+                self._refill(now)
+                self._tokens -= tokens
+                if self._tokens < 0:
+                    delay = max(delay, -self._tokens / self.rate)
+            self.acquired += 1
+            return delay
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available, return the time spent waiting."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            with self._lock:
+                self.waiting += 1
+            try:
+                self._sleep(delay)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+                    self.waited += delay
+        return delay
@@ -45,6 +45,9 @@ _SEASON_MATCH_RE = re.compile(r'season\s*(\d+)')
 _EPISODE_EXTRACT_RE = re.compile(r'(\d+)')
 _WHITESPACE_RE = re.compile(r'\s+')
 
+# Number of alternative files remembered for every episode
+ALTERNATIVES = 3
+
 # Cache for compiled word boundary patterns to avoid recompiling same patterns
 _WORD_BOUNDARY_CACHE = {}
 
@@ -120,6 +123,10 @@ def _calculate_series_match_score(filename, series_name):
 class BaseManager:
     """Base manager providing common utilities for Series and Movies."""
 
+    # Page size and total results fetched per search query
+    SEARCH_LIMIT = 100
+    SEARCH_MAX_RESULTS = 300
+
     def __init__(self, profile, db_subdir):
         """Initialize with profile path and database subdirectory."""
         self.profile = profile
@@ -193,10 +200,10 @@ class BaseManager:
     def _perform_search(self, search_query, api_function, token):
         """Perform the actual search using the provided API function with pagination."""
         results = []
-        limit = 100
-        max_results = 300  # Limit total results to avoid excessive API calls
+        limit = self.SEARCH_LIMIT
 
-        for offset in range(0, max_results, limit):
+        # Limit total results to avoid excessive API calls
+        for offset in range(0, self.SEARCH_MAX_RESULTS, limit):
             response = api_function('search', {
                 'what': search_query,
                 'category': 'video',
@@ -307,6 +314,15 @@ class BaseManager:
                      level=xbmc.LOGERROR)
             return None
 
+    def store(self, name, data):
+        """Save media data updated by the caller."""
+        self._save_data(name, data)
+
+    def store_trakt_meta(self, name, data, meta):
+        """Attach Trakt metadata to stored media data and save it."""
+        data['trakt'] = meta
+        self._save_data(name, data)
+
     def remove_item(self, name):
         """Remove a media item from the database."""
         safe_name = self._safe_filename(name)
@@ -322,6 +338,10 @@ class BaseManager:
 
 
 class SeriesManager(BaseManager):
+    # Seasons searched for explicitly and matches kept after ranking
+    SEARCH_SEASONS = range(1, 6)
+    MAX_MATCHES = 200
+
     def __init__(self, addon, profile):
         self.addon = addon
         super().__init__(profile, 'series_db')
@@ -337,7 +357,7 @@ class SeriesManager(BaseManager):
 
         search_queries = self._build_search_queries(
             series_name,
-            seasons=range(1, 6)
+            seasons=self.SEARCH_SEASONS
         )
 
         all_results = []
@@ -360,42 +380,32 @@ class SeriesManager(BaseManager):
         # Sort results by match score (highest first) to prioritize exact matches
         all_results.sort(key=lambda x: x.get('_match_score', 0), reverse=True)
         
-        # Limit results to reduce noise - keep top 200 highest scoring matches
-        if len(all_results) > 200:
-            all_results = all_results[:200]
+        # Limit results to reduce noise - keep the highest scoring matches
+        if len(all_results) > self.MAX_MATCHES:
+            all_results = all_results[:self.MAX_MATCHES]
 
         # Process results and organize into seasons with quality/language preference
+        candidates = {}
         for item in all_results:
             season_num, episode_num = self._detect_episode_info(item['name'], series_name)
             if season_num is not None:
                 # Convert to strings for JSON compatibility
-                season_num_str = str(season_num)
-                episode_num_str = str(episode_num)
-
-                if season_num_str not in series_data['seasons']:
-                    series_data['seasons'][season_num_str] = {}
-
-                # Check if we already have this episode
-                current_episode = series_data['seasons'][season_num_str].get(episode_num_str)
-                
-                if current_episode is None:
-                    # First file for this episode
-                    series_data['seasons'][season_num_str][episode_num_str] = {
+                key = (str(season_num), str(episode_num))
+                files = candidates.setdefault(key, [])
+                if all(f['ident'] != item['ident'] for f in files):
+                    files.append({
                         'name': item['name'],
                         'ident': item['ident'],
                         'size': item.get('size', '0')
-                    }
-                else:
-                    # Compare with existing file and keep the better one
-                    new_score = self._calculate_file_score(item['name'], item.get('size', '0'))
-                    current_score = self._calculate_file_score(current_episode['name'], current_episode['size'])
-                    
-                    if new_score > current_score:
-                        series_data['seasons'][season_num_str][episode_num_str] = {
-                            'name': item['name'],
-                            'ident': item['ident'],
-                            'size': item.get('size', '0')
-                        }
+                    })
+
+        for (season_num_str, episode_num_str), files in candidates.items():
+            # Stable sort keeps the first seen file when scores are equal
+            files.sort(key=lambda f: self._calculate_file_score(f['name'], f['size']), reverse=True)
+            episode = dict(files[0])
+            # Keep a few runner-ups to fall back to when the best file is dead
+            episode['alternatives'] = files[1:1 + ALTERNATIVES]
+            series_data['seasons'].setdefault(season_num_str, {})[episode_num_str] = episode
 
         # Save the series data
         self._save_series_data(series_name, series_data)
@@ -467,6 +477,36 @@ class SeriesManager(BaseManager):
         """Load series data from the database"""
         return self.load_data(series_name)
 
+    def next_episode(self, series_data, season, episode):
+        """Return (episode number, episode data) following the given one in its season."""
+        season_data = series_data.get('seasons', {}).get(str(season), {})
+        for ep_num in sorted(season_data.keys(), key=int):
+            if int(ep_num) > int(episode):
+                return ep_num, season_data[ep_num]
+        return None, None
+
+    def promote_alternative(self, series_name, season, episode, ident):
+        """Make an alternative file the primary one for an episode.
+
+        The previous primary file is dropped, callers promote an alternative
+        only after the primary file turned out to be unusable.
+        """
+        series_data = self.load_series_data(series_name)
+        if not series_data:
+            return None
+        current = series_data.get('seasons', {}).get(str(season), {}).get(str(episode))
+        if not current:
+            return None
+        alternatives = current.get('alternatives', [])
+        chosen = next((a for a in alternatives if a['ident'] == ident), None)
+        if chosen is None:
+            return None
+        promoted = dict(chosen)
+        promoted['alternatives'] = [a for a in alternatives if a['ident'] != ident]
+        series_data['seasons'][str(season)][str(episode)] = promoted
+        self._save_series_data(series_name, series_data)
+        return promoted
+
     def get_all_series(self):
         """Get a list of all saved series"""
         series_list = []
@@ -508,37 +548,35 @@ def get_url(**kwargs):
 
 
 def create_series_menu(series_manager, handle, end=True):
-    """Create the series selection menu"""
-    import xbmcplugin
+    """Create the series selection menu, returns the unfinished listing if not end"""
+    from listing import Listing
+    listing = Listing(handle)
 
     # Add "Search for new series" option
-    listitem = xbmcgui.ListItem(label="Hledat novy serial")
-    listitem.setArt({'icon': 'DefaultAddSource.png'})
-    xbmcplugin.addDirectoryItem(handle, get_url(action='series_search'), listitem, True)
+    listing.item("Hledat novy serial", get_url(action='series_search'), icon='DefaultAddSource.png')
 
     # Trending from Trakt
-    listitem = xbmcgui.ListItem(label=series_manager.addon.getLocalizedString(30401))
-    listitem.setArt({'icon': 'DefaultRecentlyAddedEpisodes.png'})
-    xbmcplugin.addDirectoryItem(handle, get_url(action='series_trending'), listitem, True)
+    listing.item(series_manager.addon.getLocalizedString(30401), get_url(action='series_trending'),
+                 icon='DefaultRecentlyAddedEpisodes.png')
 
     # Popular from Trakt
-    listitem = xbmcgui.ListItem(label=series_manager.addon.getLocalizedString(30402))
-    listitem.setArt({'icon': 'DefaultTVShows.png'})
-    xbmcplugin.addDirectoryItem(handle, get_url(action='series_popular'), listitem, True)
+    listing.item(series_manager.addon.getLocalizedString(30402), get_url(action='series_popular'),
+                 icon='DefaultTVShows.png')
 
     # List existing series
+    remove_label = series_manager.addon.getLocalizedString(30213)
     series_list = series_manager.get_all_series()
     for series in series_list:
-        listitem = xbmcgui.ListItem(label=series['name'])
-        listitem.setArt({'icon': 'DefaultFolder.png'})
+        listitem = listing.item(series['name'], get_url(action='series_detail', series_name=series['name']),
+                                icon='DefaultFolder.png')
         commands = []
-        commands.append((series_manager.addon.getLocalizedString(30213),
+        commands.append((remove_label,
                          'Container.Update(' + get_url(action='series', remove=series['name']) + ')'))
         listitem.addContextMenuItems(commands)
-        xbmcplugin.addDirectoryItem(handle, get_url(action='series_detail', series_name=series['name']), listitem, True)
 
     if end:
-        xbmcplugin.endOfDirectory(handle)
+        listing.finish()
+    return listing
 
 
 def create_seasons_menu(series_manager, handle, series_name):
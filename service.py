@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+# Module: service
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import json
+import time
+import traceback
+import xbmc
+import xbmcgui
+
+import yawsp
+import series_manager
+import movie_manager
+import stream_proxy
+import bandwidth
+import download_manager
+import downloader
+
+# Size of the ranged GET used to check a link and measure throughput
+PROBE_BYTES = 1024 * 1024
+
+
+def verify_link(link):
+    """Check a stream link with a small ranged GET, feeding the throughput estimate."""
+    try:
+        result = bandwidth.probe(yawsp.session(), link, PROBE_BYTES)
+    except Exception:
+        traceback.print_exc()
+        return False
+    if result is None:
+        return False
+    bandwidth.ThroughputEstimator(yawsp._profile).record(*result)
+    return True
+
+
+class PlaybackMonitor(xbmc.Player):
+    """Prepares the next episode while the current one is still playing.
+
+    Once playback passes the configured point, the link of the next episode
+    is resolved into the shared link cache and checked. A dead file is
+    replaced by the first working alternative, so the queued playlist item
+    starts without waiting for the API. Durations of the stored files are
+    learned here too, choose_file in the plugin only reads them.
+    """
+
+    def __init__(self):
+        xbmc.Player.__init__(self)
+        self.current = None
+        self.prepared = False
+        self.learned = False
+
+    def onAVStarted(self):
+        self.prepared = False
+        self.learned = False
+        self.current = None
+        try:
+            playing = xbmcgui.Window(10000).getProperty(yawsp.PLAYING_PROPERTY)
+            if playing and self.isPlayingVideo() and self.getPlayingFile().startswith('http'):
+                self.current = json.loads(playing)
+        except Exception:
+            traceback.print_exc()
+
+    def onPlayBackError(self):
+        # do not hand the broken link out again, a dead link fails before
+        # onAVStarted so the file comes from what play() announced
+        current = self.current
+        if not current:
+            try:
+                current = json.loads(xbmcgui.Window(10000).getProperty(yawsp.PLAYING_PROPERTY) or 'null')
+            except ValueError:
+                current = None
+        if current:
+            yawsp.linkcache().invalidate(current['ident'])
+        self.onPlayBackStopped()
+
+    def onPlayBackStopped(self):
+        self.current = None
+        xbmcgui.Window(10000).clearProperty(yawsp.PLAYING_PROPERTY)
+
+    def onPlayBackEnded(self):
+        self.onPlayBackStopped()
+
+    def tick(self):
+        if self.current and not self.learned:
+            self.learned = True
+            try:
+                self.learn_durations(self.current)
+            except Exception:
+                traceback.print_exc()
+        if self.prepared or not self.current or 'series' not in self.current:
+            return
+        if 'true' != yawsp._addon.getSetting('nextprep'):
+            return
+        try:
+            at = int(yawsp._addon.getSetting('nextat'))
+        except ValueError:
+            at = 90
+        try:
+            total = self.getTotalTime()
+            if not self.isPlayingVideo() or total <= 0 or self.getTime() * 100 < total * at:
+                return
+        except RuntimeError:
+            # not playing anymore
+            return
+        self.prepared = True
+        try:
+            self.prepare_next(self.current)
+        except Exception:
+            traceback.print_exc()
+
+    def learn_durations(self, current):
+        """Store durations of the playing episode's or movie's files for the next play."""
+        token = yawsp._addon.getSetting('token')
+        if not token:
+            return
+        if 'series' in current:
+            sm = series_manager.SeriesManager(yawsp._addon, yawsp._profile)
+            data = sm.load_series_data(current['series']) or {}
+            entry = data.get('seasons', {}).get(str(current['season']), {}).get(str(current['episode']))
+            if entry:
+                yawsp.store_durations(entry, token, lambda: sm.store(current['series'], data))
+        elif 'movie' in current:
+            mm = movie_manager.MovieManager(yawsp._addon, yawsp._profile)
+            data = mm.load_movie_data(current['movie']) or {}
+            if data.get('file'):
+                yawsp.store_durations(data['file'], token, lambda: mm.store(current['movie'], data))
+
+    def prepare_next(self, current):
+        sm = series_manager.SeriesManager(yawsp._addon, yawsp._profile)
+        series_data = sm.load_series_data(current['series'])
+        if not series_data:
+            return
+        ep_num, episode = sm.next_episode(series_data, current['season'], current['episode'])
+        if episode is None:
+            return
+        token = yawsp._addon.getSetting('token') or yawsp.revalidate()
+        yawsp.store_durations(episode, token, lambda: sm.store(current['series'], series_data))
+        chosen = yawsp.choose_file(episode)
+        candidates = [episode] + episode.get('alternatives', [])
+        candidates.sort(key=lambda c: c['ident'] != chosen['ident'])
+        primary_dead = False
+        for candidate in candidates:
+            link = yawsp.getlink(candidate['ident'], token, quiet=True)
+            if link and verify_link(link):
+                if primary_dead:
+                    sm.promote_alternative(current['series'], current['season'], ep_num, candidate['ident'])
+                # play() takes this file instead of choosing again
+                xbmcgui.Window(10000).setProperty(yawsp.PREPARED_PROPERTY, json.dumps({
+                    'series': current['series'], 'season': str(current['season']), 'episode': str(ep_num),
+                    'ident': candidate['ident']}))
+                xbmc.log(f'YaWSP service: prepared {current["series"]} {current["season"]}x{ep_num}',
+                         level=xbmc.LOGINFO)
+                return
+            yawsp.linkcache().invalidate(candidate['ident'])
+            if candidate is episode:
+                primary_dead = True
+        xbmc.log(f'YaWSP service: no working file for {current["series"]} {current["season"]}x{ep_num}',
+                 level=xbmc.LOGWARNING)
+
+
+def proxy_link(key):
+    """Take the link play() registered for the proxy under key, once."""
+    window = xbmcgui.Window(10000)
+    registered = window.getProperty(yawsp.PROXY_LINK_PROPERTY % key)
+    if not registered:
+        return None
+    window.clearProperty(yawsp.PROXY_LINK_PROPERTY % key)
+    link, headers = json.loads(registered)
+    return link, headers
+
+
+def start_proxy():
+    """Start the streaming proxy when enabled and announce its port to the plugin."""
+    if 'true' != yawsp._addon.getSetting('proxy'):
+        return None
+    try:
+        buffer_size = int(yawsp._addon.getSetting('proxybuffer')) * stream_proxy.MB
+    except ValueError:
+        buffer_size = stream_proxy.BUFFER_SIZE
+    try:
+        spill_size = int(yawsp._addon.getSetting('proxyspill')) * stream_proxy.MB
+    except ValueError:
+        spill_size = 0
+    try:
+        proxy = stream_proxy.StreamProxy(yawsp.session(), buffer_size=buffer_size,
+                                         on_error=yawsp.linkcache().forget_link, lookup=proxy_link,
+                                         spill_dir=yawsp._profile, spill_size=spill_size)
+        port = proxy.start()
+    except Exception:
+        traceback.print_exc()
+        return None
+    xbmcgui.Window(10000).setProperty(yawsp.PROXY_PROPERTY, str(port))
+    xbmc.log(f'YaWSP service: streaming proxy listening on port {port}', level=xbmc.LOGINFO)
+    return proxy
+
+
+def download_finished(job, download):
+    yawsp.metrics().record('download', job['seconds'], job['state'] == download_manager.DONE, job['state'],
+                           download.received, download.retried)
+    # no throughput sample: downloads run capped, paused or over several
+    # connections, which says little about one playback stream
+    if job['state'] == download_manager.DONE:
+        yawsp.popinfo(yawsp._addon.getLocalizedString(30303) + job['name'], sound=True)
+    else:
+        yawsp.popinfo(yawsp._addon.getLocalizedString(30304) + job['name'],
+                      icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
+
+
+def configure_downloads(manager, player):
+    """Apply download settings, with the lower speed cap while a video plays."""
+    def setting(key, default):
+        try:
+            return int(yawsp._addon.getSetting(key))
+        except ValueError:
+            return default
+    limit = setting('dlimit', 0)
+    if player.isPlayingVideo():
+        playing = setting('dplaylimit', 0)
+        if playing and (not limit or playing < limit):
+            limit = playing
+    manager.configure(setting('dconcurrent', 1), limit * downloader.MB)
+
+
+def notify_downloads(manager, last):
+    """Show progress of running downloads every few seconds, return time of the last popup."""
+    if 'true' != yawsp._addon.getSetting('dnotify'):
+        return last
+    try:
+        every = max(5, int(yawsp._DIGITS_ONLY_RE.sub('', yawsp._addon.getSetting('dnevery'))))
+    except ValueError:
+        every = downloader.PROGRESS_INTERVAL
+    now = time.time()
+    if now - last < every:
+        return last
+    for job in manager.jobs:
+        if job['state'] != download_manager.RUNNING:
+            continue
+        speed = downloader.sizeof(job.get('rate') or 0) + '/s'
+        if job.get('size'):
+            yawsp.popinfo('%d%% (%s) - %s' % (job['done'] * 100 // job['size'], speed, job['name']))
+        else:
+            yawsp.popinfo('%s (%s) - %s' % (downloader.sizeof(job['done']), speed, job['name']))
+        last = now
+    return last
+
+
+def run():
+    monitor = xbmc.Monitor()
+    player = PlaybackMonitor()
+    proxy = start_proxy()
+    downloads = download_manager.DownloadManager(yawsp._profile, yawsp.make_download, download_finished)
+    notified = 0
+    try:
+        while not monitor.abortRequested():
+            if monitor.waitForAbort(1):
+                break
+            player.tick()
+            try:
+                configure_downloads(downloads, player)
+                downloads.tick()
+                notified = notify_downloads(downloads, notified)
+                yawsp.metrics().flush()
+            except Exception:
+                traceback.print_exc()
+    finally:
+        downloads.stop()
+        yawsp.metrics().flush()
+        xbmcgui.Window(10000).clearProperty(yawsp.PROXY_PROPERTY)
+        if proxy:
+            proxy.stop()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+# Module: stream_proxy
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import binascii
+import os
+import re
+import sys
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import requests
+
+MB = 1024 * 1024
+HEAD_SIZE = 4 * MB  # container headers live at the start
+TAIL_SIZE = 2 * MB  # ... or at the end (mp4 moov, mkv cues)
+CHUNK_SIZE = 256 * 1024
+BUFFER_SIZE = 32 * MB
+# a request this far past the buffered bytes waits for the reader instead of reconnecting
+SEEK_REACH = 4 * MB
+MAX_FILES = 4
+
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+_KEY_RE = re.compile(r'^/stream/([0-9a-f]{32})$')
+
+
+def new_key():
+    """Opaque key a link is registered with, the only thing in a proxy URL."""
+    return binascii.hexlify(os.urandom(16)).decode('ascii')
+
+
+def local_url(port, key):
+    """Return proxy URL serving the link registered with key."""
+    return 'http://127.0.0.1:%d/stream/%s' % (port, key)
+
+
+class RemoteFile:
+    """Upstream file with cached head and tail."""
+
+    def __init__(self, session, url, headers, head_size=HEAD_SIZE, tail_size=TAIL_SIZE):
+        self.session = session
+        self.url = url
+        self.headers = headers
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.size = None
+        self.head = b''
+        self.tail = None
+        self.ranges = True
+        self.window = None
+        self.lock = threading.Lock()
+
+    def get(self, start, end=None, stream=True):
+        headers = dict(self.headers)
+        headers['Range'] = 'bytes=%d-%s' % (start, '' if end is None else end)
+        response = self.session.get(self.url, headers=headers, stream=stream, timeout=30)
+        response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _read(response, length):
+        data = []
+        received = 0
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            data.append(chunk)
+            received += len(chunk)
+            if received >= length:
+                break
+        return b''.join(data)[:length]
+
+    def open(self):
+        """Learn the file size and fetch the head of the file, once."""
+        with self.lock:
+            if self.size is not None:
+                return
+            response = self.get(0, self.head_size - 1)
+            try:
+                if response.status_code == 206:
+                    self.size = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+                else:
+                    # server ignores ranges, we have to read from the start
+                    self.ranges = False
+                    self.size = int(response.headers['Content-Length'])
+                self.head = self._read(response, self.head_size)
+            finally:
+                response.close()
+
+    @property
+    def tail_start(self):
+        if not self.ranges or self.size - self.tail_size <= len(self.head):
+            return self.size
+        return self.size - self.tail_size
+
+    def tail_bytes(self):
+        """Return the cached tail of the file, fetching it on first use."""
+        with self.lock:
+            if self.tail is None:
+                response = self.get(self.tail_start)
+                try:
+                    self.tail = self._read(response, self.size - self.tail_start)
+                finally:
+                    response.close()
+            return self.tail
+
+    def close(self):
+        if self.window is not None:
+            self.window.close()
+            self.window = None
+
+
+class Ring:
+    """Fixed size store of a file range, indexed by file offset modulo its capacity.
+
+    Kept in memory, or in a temporary file of spill_dir.
+    """
+
+    def __init__(self, capacity, spill_dir=None):
+        self.capacity = capacity
+        self.memory = None
+        self.file = None
+        if spill_dir is None:
+            self.memory = bytearray(capacity)
+        else:
+            self.file = tempfile.TemporaryFile(dir=spill_dir)
+
+    def write(self, offset, data):
+        view = memoryview(data)
+        while len(view):
+            at = offset % self.capacity
+            piece = view[:self.capacity - at]
+            if self.file is None:
+                self.memory[at:at + len(piece)] = piece
+            else:
+                self.file.seek(at)
+                self.file.write(piece)
+            offset += len(piece)
+            view = view[len(piece):]
+
+    def read(self, offset, length):
+        """Return up to length bytes at offset, never across the end of the store."""
+        at = offset % self.capacity
+        length = min(length, self.capacity - at)
+        if self.file is None:
+            return bytes(self.memory[at:at + length])
+        self.file.seek(at)
+        return self.file.read(length)
+
+    def close(self):
+        self.memory = None
+        if self.file is not None:
+            self.file.close()
+
+
+class StreamWindow(threading.Thread):
+    """One forward reading upstream connection of a file, kept across requests.
+
+    The thread streams the file from the current position into the memory
+    ring, shared by the windows of a proxy one after another, and with
+    spilling enabled also into a larger ring on disk. A request
+    which starts inside the window of buffered bytes, or at most SEEK_REACH
+    past it, is served from there; only a seek outside of it reconnects
+    upstream. Reading stops three quarters of the window ahead of the last
+    position served, the rest keeps played bytes for short seeks back.
+    """
+
+    def __init__(self, remote, start, limit, memory, spill_dir=None, spill_size=0, chunk_size=CHUNK_SIZE):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.remote = remote
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.memory = memory
+        self.disk = Ring(spill_size, spill_dir) if spill_dir and spill_size > memory.capacity else None
+        self.capacity = self.disk.capacity if self.disk else memory.capacity
+        self.ahead = self.capacity * 3 // 4
+        self.start_pos = self.end = self.pos = start
+        self.generation = 0
+        self.response = None
+        self.error = None
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def first(self):
+        """Lowest offset still buffered."""
+        return max(self.start_pos, self.end - self.capacity)
+
+    def read(self, pos, length):
+        """Return up to length bytes at pos, waiting for the reader when they are near."""
+        with self.cond:
+            self.pos = pos
+            self.cond.notify_all()
+            waited = False
+            while True:
+                if self.closed:
+                    raise IOError('stream closed')
+                if self.first() <= pos < self.end:
+                    length = min(length, self.end - pos)
+                    if self.disk is not None and pos < self.end - self.memory.capacity:
+                        return self.disk.read(pos, length)
+                    return self.memory.read(pos, length)
+                if self.error is not None:
+                    if waited:
+                        raise self.error
+                    # the request after a failure tries again
+                    self._seek(pos)
+                elif pos < self.first() or pos > self.end + SEEK_REACH:
+                    self._seek(pos)
+                waited = True
+                self.cond.wait(1)
+
+    def _seek(self, pos):
+        self.start_pos = self.end = self.pos = pos
+        self.error = None
+        self.generation += 1
+        if self.response is not None:
+            # wakes the reader up if it waits for upstream data
+            self.response.close()
+        self.cond.notify_all()
+
+    def _idle(self):
+        return self.error is not None or self.end >= self.limit or self.end - self.pos >= self.ahead
+
+    def _open(self, start):
+        if self.remote.ranges:
+            response = self.remote.get(start, self.limit - 1)
+            return response, response.iter_content(chunk_size=self.chunk_size)
+        response = self.remote.get(0)
+        return response, self._skip(response.iter_content(chunk_size=self.chunk_size), start)
+
+    @staticmethod
+    def _skip(chunks, skip):
+        for chunk in chunks:
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk = chunk[skip:]
+                skip = 0
+            yield chunk
+
+    def run(self):
+        generation = None
+        chunks = None
+        failures = 0
+        while True:
+            with self.cond:
+                while not self.closed and generation == self.generation and self._idle():
+                    self.cond.wait()
+                if self.closed:
+                    break
+                if generation != self.generation:
+                    self._drop()
+                    chunks = None
+                    failures = 0
+                    generation = self.generation
+                    if self._idle():
+                        continue
+                start = self.end
+            try:
+                if chunks is None:
+                    response, chunks = self._open(start)
+                    with self.cond:
+                        if generation != self.generation:
+                            response.close()
+                            continue
+                        self.response = response
+                chunk = next(chunks, b'')
+                if not chunk:
+                    raise IOError('upstream closed at %d' % start)
+            except Exception as e:
+                with self.cond:
+                    if generation != self.generation:
+                        continue
+                    self._drop()
+                    chunks = None
+                    failures += 1
+                    # a dead link fails right away, a dropped connection is reopened
+                    if isinstance(e, requests.HTTPError) or failures >= 3:
+                        self.error = e
+                        self.cond.notify_all()
+                continue
+            with self.cond:
+                if generation != self.generation:
+                    continue
+                failures = 0
+                chunk = chunk[:self.limit - self.end]
+                self.memory.write(self.end, chunk)
+                if self.disk is not None:
+                    self.disk.write(self.end, chunk)
+                self.end += len(chunk)
+                self.cond.notify_all()
+        with self.cond:
+            self._drop()
+            if self.disk is not None:
+                self.disk.close()
+
+    def _drop(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def close(self):
+        with self.cond:
+            # the memory ring goes to the next window, nothing is written after this
+            self.closed = True
+            self.generation += 1
+            self._drop()
+            self.cond.notify_all()
+
+
+class ProxyServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # players drop connections on every seek, that is not an error
+        if not isinstance(sys.exc_info()[1], (IOError, OSError)):
+            HTTPServer.handle_error(self, request, client_address)
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.serve(False)
+
+    def do_GET(self):
+        self.serve(True)
+
+    def serve(self, body):
+        proxy = self.server.proxy
+        match = _KEY_RE.match(self.path.split('?')[0])
+        registered = proxy.link(match.group(1)) if match else None
+        if registered is None:
+            # only links the plugin registered, this is no open relay
+            self.send_error(404)
+            return
+        remote = proxy.remote(*registered)
+        try:
+            remote.open()
+        except Exception as e:
+            traceback.print_exc()
+            proxy.failed(remote, e)
+            self.send_error(502)
+            return
+
+        size = remote.size
+        start, end = 0, size - 1
+        match = _RANGE_RE.match(self.headers.get('Range', ''))
+        partial = match is not None and (match.group(1) or match.group(2))
+        if partial:
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(int(match.group(2)), size - 1)
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        self.send_response(206 if partial else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if partial:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, size))
+        self.end_headers()
+        if body:
+            try:
+                proxy.copy(remote, start, end, self.wfile)
+            except requests.HTTPError as e:
+                # the link died while playing
+                traceback.print_exc()
+                proxy.failed(remote, e)
+                self.close_connection = True
+            except (IOError, OSError):
+                # player closed the connection, usually a seek
+                self.close_connection = True
+            except Exception:
+                traceback.print_exc()
+                self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StreamProxy:
+    """Localhost HTTP proxy with read-ahead and head/tail caching.
+
+    The player talks to the proxy, which keeps one forward reading upstream
+    connection for the file being played and serves requests from its
+    window of buffered bytes (see StreamWindow). Head and tail of every
+    file are kept in memory so start and container index lookups do not
+    wait for the remote server.
+
+    Only links registered with register() are served, by their key.
+    lookup(key) may return (link, headers) for keys registered elsewhere,
+    the plugin runs in another process than the proxy.
+
+    on_error(link) is called when the upstream answers with an HTTP error,
+    an expired link most likely, so it is not handed out again.
+    """
+
+    def __init__(self, session=None, port=0, buffer_size=BUFFER_SIZE, head_size=HEAD_SIZE,
+                 tail_size=TAIL_SIZE, on_error=None, lookup=None, spill_dir=None, spill_size=0):
+        self.session = session or requests.Session()
+        self.requested_port = port
+        self.buffer_size = buffer_size
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.on_error = on_error
+        self.lookup = lookup
+        self.spill_dir = spill_dir
+        self.spill_size = spill_size
+        self.server = None
+        self.memory = None
+        self.links = OrderedDict()
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server.server_address[1] if self.server else None
+
+    def start(self):
+        self.server = ProxyServer(('127.0.0.1', self.requested_port), ProxyHandler)
+        self.server.proxy = self
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.port
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        with self.lock:
+            for remote in self.files.values():
+                remote.close()
+            self.files.clear()
+
+    def register(self, link, headers=None):
+        """Allow link to be served, return the key of its proxy URL."""
+        key = new_key()
+        with self.lock:
+            self._keep(key, (link, dict(headers or {})))
+        return key
+
+    def url(self, link, headers=None):
+        return local_url(self.port, self.register(link, headers))
+
+    def link(self, key):
+        """(link, headers) registered with key, None for an unknown key."""
+        with self.lock:
+            if key in self.links:
+                return self.links[key]
+        registered = None
+        if self.lookup is not None:
+            try:
+                registered = self.lookup(key)
+            except Exception:
+                traceback.print_exc()
+        if registered is not None:
+            with self.lock:
+                self._keep(key, registered)
+        return registered
+
+    def _keep(self, key, registered):
+        self.links[key] = registered
+        while len(self.links) > MAX_FILES * 4:
+            self.links.popitem(last=False)
+
+    def remote(self, url, headers):
+        with self.lock:
+            remote = self.files.pop(url, None)
+            if remote is None:
+                remote = RemoteFile(self.session, url, headers, self.head_size, self.tail_size)
+            self.files[url] = remote
+            while len(self.files) > MAX_FILES:
+                self.files.popitem(last=False)[1].close()
+            return remote
+
+    def window(self, remote, pos):
+        """The upstream window of a file, opened at pos on first use.
+
+        Only the file played last keeps its window, a player reads one file
+        at a time and the windows share one memory ring.
+        """
+        with self.lock:
+            if remote.window is None:
+                for other in self.files.values():
+                    if other is not remote:
+                        other.close()
+                if self.memory is None:
+                    self.memory = Ring(self.buffer_size)
+                remote.window = StreamWindow(remote, pos, remote.tail_start, self.memory,
+                                             self.spill_dir, self.spill_size)
+                remote.window.start()
+            return remote.window
+
+    def failed(self, remote, error):
+        """Forget a file whose upstream answered with an HTTP error and report its link."""
+        if not isinstance(error, requests.HTTPError):
+            return
+        with self.lock:
+            if self.files.get(remote.url) is remote:
+                del self.files[remote.url]
+        remote.close()
+        if self.on_error is not None:
+            try:
+                self.on_error(remote.url)
+            except Exception:
+                traceback.print_exc()
+
+    def copy(self, remote, start, end, out):
+        pos = start
+        if pos < len(remote.head):
+            piece = remote.head[pos:end + 1]
+            out.write(piece)
+            pos += len(piece)
+        tail_start = remote.tail_start
+        stop = min(end + 1, tail_start)
+        if pos < stop:
+            window = self.window(remote, pos)
+            while pos < stop:
+                piece = window.read(pos, min(stop - pos, CHUNK_SIZE))
+                out.write(piece)
+                pos += len(piece)
+        if pos <= end:
+            tail = remote.tail_bytes()
+            out.write(tail[pos - tail_start:end - tail_start + 1])
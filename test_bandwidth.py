@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+import mock_xbmc
+
+import yawsp
+from bandwidth import ThroughputEstimator, pick_streamable
+from link_cache import LinkCache
+
+MB = 1024 * 1024
+
+
+def test_estimator_rolls_measurements(tmp_path):
+    """Estimate is absent until measured and follows new samples"""
+    estimator = ThroughputEstimator(str(tmp_path), alpha=0.5)
+    assert estimator.estimate() is None
+    estimator.record(10 * 1024, 1)  # too small to count
+    assert estimator.estimate() is None
+    estimator.record(10 * MB, 1)
+    assert estimator.estimate() == 10 * MB
+    estimator.record(20 * MB, 1)
+    assert ThroughputEstimator(str(tmp_path)).estimate() == 15 * MB
+
+
+def test_pick_streamable():
+    """Best scored file that fits the throughput wins, judged by its own duration"""
+    candidates = [
+        {'ident': '4k', 'size': str(20 * 1024 * MB), 'duration': 3600.0},     # ~5.7 MB/s
+        {'ident': '1080p', 'size': str(6 * 1024 * MB), 'duration': 3600.0},   # ~1.7 MB/s
+        {'ident': '720p', 'size': str(2 * 1024 * MB), 'duration': 3600.0},    # ~0.6 MB/s
+    ]
+    asked = []
+
+    def duration(candidate):
+        asked.append(candidate['ident'])
+        return candidate.get('duration')
+    # no measurement or a single file, filename score decides without a probe
+    assert pick_streamable(candidates, None, duration)['ident'] == '4k'
+    assert pick_streamable(candidates[:1], 0.2 * MB, duration)['ident'] == '4k'
+    assert asked == []
+    assert pick_streamable(candidates, 10 * MB, lambda candidate: None)['ident'] == '4k'
+    # fast line streams the best file, later files are not probed
+    assert pick_streamable(candidates, 10 * MB, duration)['ident'] == '4k'
+    assert asked == ['4k']
+    # slower line gets the best file it can sustain
+    assert pick_streamable(candidates, 3 * MB, duration)['ident'] == '1080p'
+    # nothing fits, use the smallest one
+    assert pick_streamable(candidates, 0.2 * MB, duration)['ident'] == '720p'
+    # a shorter cut of the same size has the higher bitrate
+    candidates[2]['duration'] = 600.0   # ~3.4 MB/s
+    assert pick_streamable(candidates, 0.2 * MB, duration)['ident'] == '1080p'
+
+
+def test_choose_file_reads_stored_durations(tmp_path, monkeypatch):
+    """Files without a stored duration are skipped and nothing is asked from the API"""
+    monkeypatch.setattr(yawsp, '_profile', str(tmp_path))
+    monkeypatch.setattr(yawsp, 'api', lambda *args: pytest.fail('choose_file called the API'))
+    ThroughputEstimator(str(tmp_path)).record(3 * MB, 1)
+    entry = {'ident': '4k', 'size': str(20 * 1024 * MB), 'duration': 3600.0, 'alternatives': [
+        {'ident': 'unknown', 'size': str(2 * 1024 * MB)},
+        {'ident': '1080p', 'size': str(6 * 1024 * MB), 'duration': 3600.0}]}
+    assert yawsp.choose_file(entry)['ident'] == '1080p'
+    assert yawsp.choose_file({'ident': 'only', 'size': '1'})['ident'] == 'only'
+
+
+def test_play_takes_the_file_the_service_prepared(tmp_path, monkeypatch):
+    """A queued episode plays the file the service chose and resolved"""
+    resolved = []
+    monkeypatch.setattr(mock_xbmc.MockWindow, 'properties', {})
+    monkeypatch.setattr(mock_xbmc.MockXBMCPlugin, 'setResolvedUrl',
+                        staticmethod(lambda handle, ok, item: resolved.append(item.path)))
+    monkeypatch.setattr(yawsp, '_links', LinkCache(str(tmp_path), ttl=600))
+    monkeypatch.setattr(yawsp, 'api', lambda *args: pytest.fail('play called the API'))
+    monkeypatch.setitem(yawsp._addon.settings, 'token', 'token')
+    yawsp._links.put('alt', 'video_stream', 'https://vip.example/alt')
+    window = mock_xbmc.MockXBMCGui.Window(10000)
+    window.setProperty(yawsp.PREPARED_PROPERTY, json.dumps(
+        {'series': 'Dark', 'season': '1', 'episode': '2', 'ident': 'alt'}))
+    yawsp.play({'ident': 'primary', 'name': 'Dark 1x02', 'series': 'Dark', 'season': '1', 'episode': '2',
+                'queued': '1'})
+    assert [path.split('|')[0] for path in resolved] == ['https://vip.example/alt']
+    assert json.loads(window.getProperty(yawsp.PLAYING_PROPERTY))['ident'] == 'alt'
+    assert window.getProperty(yawsp.PREPARED_PROPERTY) == ''
+
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import download_manager
+import downloader
+from download_manager import DownloadManager, QUEUED, RUNNING, PAUSED, DONE
+
+
+class FakeDownload:
+    """Runs until finished or cancelled by the test."""
+
+    def __init__(self, job, throttle):
+        self.job = job
+        self.throttle = throttle
+        self.finish = threading.Event()
+        self.cancelled = threading.Event()
+        self.discarded = False
+        self.received = 0
+
+    def run(self, progress=None, interval=None):
+        while not self.finish.is_set():
+            if self.cancelled.is_set():
+                raise downloader.Cancelled()
+            time.sleep(0.01)
+        return 100
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def discard(self):
+        self.discarded = True
+
+
+def wait_for(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_queue_runs_in_order_within_limit(tmp_path):
+    """Jobs start in queue order, at most `concurrent` at a time"""
+    profile = str(tmp_path)
+    started = {}
+
+    def factory(job, throttle):
+        started[job['name']] = FakeDownload(job, throttle)
+        return started[job['name']]
+    manager = DownloadManager(profile, factory)
+    manager.configure(1, 0)
+    for name in ('a', 'b', 'c'):
+        manager.add(name, name)
+    manager.apply({'cmd': 'down', 'id': manager.jobs[0]['id']})  # b a c
+    manager.tick()
+    assert list(started) == ['b']
+    assert [j['state'] for j in manager.jobs] == [RUNNING, QUEUED, QUEUED]
+
+    manager.apply({'cmd': 'pause', 'id': manager.jobs[0]['id']})
+    wait_for(lambda: not manager.active[manager.jobs[0]['id']][0].is_alive())
+    manager.tick()
+    assert manager.jobs[0]['state'] == PAUSED
+    assert list(started) == ['b', 'a']
+
+    started['a'].finish.set()
+    wait_for(lambda: manager.jobs[1]['state'] == DONE)
+    manager.tick()
+    assert list(started) == ['b', 'a', 'c']
+
+    # queue survives a restart, a running job is queued again
+    again = DownloadManager(profile, factory)
+    assert [(j['name'], j['state']) for j in again.jobs] == [('b', PAUSED), ('a', DONE), ('c', QUEUED)]
+    started['c'].finish.set()
+    manager.stop()
+
+
+def test_spooled_commands(tmp_path):
+    """Plugin commands are applied by the service in order"""
+    profile = str(tmp_path)
+    manager = DownloadManager(profile, FakeDownload)
+    manager.configure(2, 0)
+    sender = threading.Thread(target=download_manager.send,
+                              args=(profile, {'cmd': 'add', 'ident': 'x1', 'name': 'one'}))
+    sender.start()
+    wait_for(manager.commands)
+    sender.join()
+    job = manager.jobs[0]
+    assert job['ident'] == 'x1' and job['state'] == QUEUED
+    assert download_manager.send(profile, {'cmd': 'remove', 'id': job['id']}, wait=0) is False
+    manager.tick()
+    assert manager.jobs == [] and download_manager.load_jobs(profile) == []
+
+
+def test_batch_add_skips_queued_files(tmp_path):
+    """A season queued twice does not download its episodes twice"""
+    profile = str(tmp_path)
+    manager = DownloadManager(profile, FakeDownload)
+    batch = {'cmd': 'add', 'items': [
+        {'ident': 'e1', 'name': 'S01E01.mkv', 'folder': 'Show/Season 01', 'size': 10},
+        {'ident': 'e2', 'name': 'S01E02.mkv', 'folder': 'Show/Season 01', 'size': 20}]}
+    manager.apply(batch)
+    manager.jobs[0]['state'] = DONE
+    manager.apply(batch)
+    assert [(j['ident'], j['state']) for j in manager.jobs] == [('e1', DONE), ('e2', QUEUED), ('e1', QUEUED)]
+    assert manager.jobs[1]['folder'] == 'Show/Season 01' and manager.jobs[1]['size'] == 20
+
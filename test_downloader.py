@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import pytest
+import requests
+
+import downloader
+
+
+class SlowFile(io.BytesIO):
+    def write(self, data):
+        time.sleep(0.01)
+        return io.BytesIO.write(self, data)
+
+
+def test_copy_keeps_order_and_reports_progress():
+    """Everything arrives in order and progress is reported over time"""
+    chunks = [bytes([i]) * 1000 for i in range(50)]
+    out = SlowFile()
+    reports = []
+    written = downloader.copy(iter(chunks), out, queue_chunks=2,
+                              progress=lambda done, secs: reports.append(done), interval=0.1)
+    assert written == 50 * 1000
+    assert out.getvalue() == b''.join(chunks)
+    assert reports and reports == sorted(reports)
+
+
+def test_copy_raises_reader_and_writer_errors():
+    """A failing network or target stops the pipeline with its error"""
+    def broken():
+        yield b'x' * 100
+        raise IOError('connection reset')
+
+    with pytest.raises(IOError, match='connection reset'):
+        downloader.copy(broken(), io.BytesIO())
+
+    class Full(io.BytesIO):
+        def write(self, data):
+            raise OSError('disk full')
+
+    endless = iter(lambda: b'x' * 100, None)
+    with pytest.raises(OSError, match='disk full'):
+        downloader.copy(endless, Full())
+
+
+class FlakyServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serves ranges of server.data, the first server.drops responses break halfway."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        data = self.server.data
+        self.server.ranges.append(self.headers.get('Range'))
+        start, end = 0, len(data)
+        if self.headers.get('Range'):
+            first, last = self.headers['Range'].split('=')[1].split('-')
+            start = int(first)
+            end = int(last) + 1 if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start))
+        self.end_headers()
+        if self.server.drops:
+            self.server.drops -= 1
+            end = start + (end - start) // 2
+        self.wfile.write(data[start:end])
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FlakyServer(('127.0.0.1', 0), FlakyHandler)
+    server.ranges = []
+    server.url = 'http://127.0.0.1:%d/file' % server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_download_resumes_with_range(server, tmp_path):
+    """Broken transfers continue from the last byte on a fresh link"""
+    server.data = os.urandom(300 * 1024)
+    server.drops = 2
+    fresh = []
+    path = str(tmp_path / 'file.mkv')
+
+    def resolve(is_fresh):
+        fresh.append(is_fresh)
+        return server.url
+
+    dl = downloader.Download(requests.Session(), resolve, path, 'abc', chunk_size=16 * 1024,
+                             sleep=lambda s: None)
+    assert dl.run() == len(server.data)
+    with open(path, 'rb') as file:
+        assert file.read() == server.data
+    assert not os.path.exists(path + downloader.PART)
+    assert not os.path.exists(path + downloader.PART + downloader.STATE)
+    assert fresh == [False, True, True]
+    assert server.ranges[0] is None
+    # the incomplete last chunk is dropped, resuming starts at or before the break
+    assert 0 < int(server.ranges[1][6:-1]) <= len(server.data) // 2
+
+    # a part left by an earlier run is continued
+    os.remove(path)
+    half = len(server.data) // 2
+    with open(path + downloader.PART, 'wb') as file:
+        file.write(server.data[:half])
+    downloader.LocalTarget().save_state(path + downloader.PART + downloader.STATE,
+                                        {'ident': 'abc', 'size': len(server.data)})
+    dl = downloader.Download(requests.Session(), resolve, path, 'abc')
+    assert dl.run() == len(server.data)
+    assert dl.resumed_at == half and dl.received == len(server.data) - half
+    with open(path, 'rb') as file:
+        assert file.read() == server.data
+
+
+def test_segmented_download_splits_and_resumes(server, tmp_path):
+    """Segments cover the file exactly, also when continued from saved state"""
+    server.data = os.urandom(2 * 1024 * 1024)
+    server.drops = 1
+    path = str(tmp_path / 'file.mkv')
+    dl = downloader.Download(requests.Session(), lambda fresh: server.url, path, 'abc',
+                             connections=4, min_segment=64 * 1024, adapt_interval=0.05,
+                             sleep=lambda s: None)
+    assert dl.run() == len(server.data)
+    with open(path, 'rb') as file:
+        assert file.read() == server.data
+    assert server.ranges[0] == 'bytes=0-'
+    assert not os.path.exists(path + downloader.PART + downloader.STATE)
+
+    # an interrupted segmented download continues every segment
+    os.remove(path)
+    size = len(server.data)
+    segments = [[0, size // 2 - 1, size // 4], [size // 2, size - 1, size - 100]]
+    with open(path + downloader.PART, 'wb') as file:
+        file.write(server.data[:size // 4])
+        file.write(b'\0' * (size // 4))
+        file.write(server.data[size // 2:size - 100])
+        file.write(b'\0' * 100)
+    downloader.LocalTarget().save_state(path + downloader.PART + downloader.STATE,
+                                        {'ident': 'abc', 'size': size, 'segments': segments})
+    server.ranges = []
+    dl = downloader.Download(requests.Session(), lambda fresh: server.url, path, 'abc', connections=1)
+    assert dl.run() == size
+    assert dl.received == size // 4 + 100
+    with open(path, 'rb') as file:
+        assert file.read() == server.data
+    assert set(server.ranges) == {'bytes=%d-%d' % (size // 4, size // 2 - 1),
+                                  'bytes=%d-%d' % (size - 100, size - 1)}
+
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import mock_xbmc
+
+import yawsp
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+
+def history_xml(count):
+    files = []
+    for i in range(count):
+        # every file was downloaded twice
+        for download in (2 * i, 2 * i + 1):
+            files.append('<file><download_id>%d</download_id><ident>f%d</ident><name>File %d.mkv</name>'
+                         '<size>1024</size><ended_at>now</ended_at></file>' % (download, i, i))
+    return '<response><status>OK</status>%s</response>' % ''.join(files)
+
+
+def test_history_single_fetch(monkeypatch):
+    """History is fetched once, a removal clears every download of the file"""
+    calls = []
+    shown = []
+
+    def api(fnct, data):
+        calls.append((fnct, data))
+        if fnct == 'history':
+            return Response(history_xml(5))
+        return Response('<response><status>OK</status></response>')
+
+    monkeypatch.setattr(mock_xbmc.MockXBMCPlugin, 'addDirectoryItems', staticmethod(
+        lambda handle, items, total: shown.append([url for url, item, folder in items])))
+    monkeypatch.setattr(yawsp, 'api', api)
+    monkeypatch.setattr(yawsp, 'revalidate', lambda: 'token')
+    monkeypatch.setattr(yawsp, 'popinfo', lambda *args, **kwargs: None)
+    monkeypatch.setitem(yawsp._addon.settings, 'slimit', '2')
+
+    model = yawsp.history_model(yawsp.ET.fromstring(history_xml(3)))
+    assert list(model) == ['f0', 'f1', 'f2'] and model['f1']['ids'] == ['2', '3']
+    assert 'download_id' not in model['f1'] and model['f1']['name'] == 'File 1.mkv'
+
+    yawsp.history({'remove': 'f4', 'offset': '4'})
+    assert [c[0] for c in calls] == ['history', 'clear_history']
+    assert calls[1][1]['ids[]'] == ['8', '9']
+    # the page became empty, the last remaining page is shown
+    assert [u for u in shown[0] if 'action=play' in u] == [
+        yawsp.get_url(action='play', ident='f2', name='File 2.mkv'),
+        yawsp.get_url(action='play', ident='f3', name='File 3.mkv')]
+    assert yawsp.get_url(action='history', offset=0) in shown[0]
+    assert not any('offset=4' in u for u in shown[0])
+
+    del calls[:], shown[:]
+    yawsp.history({})
+    assert [c[0] for c in calls] == ['history']
+    assert len(shown[0]) == 3 and shown[0][-1] == yawsp.get_url(action='history', offset=2)
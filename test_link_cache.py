@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+import requests
+
+import mock_xbmc
+
+import service
+import stream_proxy
+import yawsp
+from link_cache import LinkCache, link_expiry
+from tools.mock_webshare import WebshareStub
+
+
+@pytest.fixture
+def stub():
+    stub = WebshareStub().start()
+    yield stub
+    stub.stop()
+
+
+def test_cache_roundtrip_and_invalidate(tmp_path):
+    """Links are kept per ident and download type until invalidated"""
+    profile = str(tmp_path)
+    cache = LinkCache(profile, ttl=600)
+    cache.put('abc', 'video_stream', 'https://vip.example/stream')
+    cache.put('abc', 'file_download', 'https://vip.example/download')
+
+    other = LinkCache(profile, ttl=600)  # shared through the profile
+    assert other.get('abc', 'video_stream') == 'https://vip.example/stream'
+    assert other.get('abc', 'file_download') == 'https://vip.example/download'
+    assert other.get('xyz', 'video_stream') is None
+    assert other.hits == 2 and other.misses == 1
+
+    other.invalidate('abc', 'file_download')
+    assert cache.get('abc', 'file_download') is None
+    assert cache.get('abc', 'video_stream') is not None
+    cache.invalidate('abc')
+    assert cache.get('abc', 'video_stream') is None
+
+
+def test_expiry_learned_from_link(tmp_path):
+    """Expiry in the link wins over the configured lifetime"""
+    profile = str(tmp_path)
+    soon = int(time.time()) + 30
+    link = 'https://vip.example/f?uid=1&expires=%d' % soon
+    assert link_expiry(link) == soon
+    assert link_expiry('https://vip.example/f?e=12') is None
+    # a single letter parameter is not taken for an expiry
+    assert link_expiry('https://vip.example/f?e=%d' % soon) is None
+
+    cache = LinkCache(profile, ttl=3600)
+    cache.put('abc', 'video_stream', link)
+    # inside the safety margin already, must not be handed out
+    assert cache.get('abc', 'video_stream') is None
+
+    disabled = LinkCache(profile, ttl=0)
+    disabled.put('def', 'video_stream', 'https://vip.example/g')
+    assert disabled.get('def', 'video_stream') is None
+
+
+def test_concurrent_puts_keep_every_link(tmp_path):
+    """Writers in several threads neither fail nor drop each other's entries"""
+    profile = str(tmp_path)
+    cache = LinkCache(profile, ttl=600)
+
+    def put(start):
+        for i in range(start, start + 25):
+            cache.put('id%03d' % i, 'file_download', 'https://vip.example/%d' % i)
+    threads = [threading.Thread(target=put, args=(n * 25,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(cache.get('id%03d' % i, 'file_download') for i in range(100))
+    assert os.listdir(profile) == ['link_cache']
+
+
+def put_from_process(profile, start):
+    cache = LinkCache(profile, ttl=600)
+    for i in range(start, start + 25):
+        cache.put('id%03d' % i, 'file_download', 'https://vip.example/%d' % i)
+
+
+def test_processes_keep_each_others_links(tmp_path):
+    """The plugin and the service writing at once do not drop each other's entries"""
+    processes = [multiprocessing.Process(target=put_from_process, args=(str(tmp_path), n * 25)) for n in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    cache = LinkCache(str(tmp_path), ttl=600)
+    assert all(cache.get('id%03d' % i, 'file_download') for i in range(100))
+    assert os.listdir(str(tmp_path)) == ['link_cache']
+
+
+def test_playback_error_before_start_drops_link(tmp_path, monkeypatch):
+    """A link failing before onAVStarted is still removed from the cache"""
+    monkeypatch.setattr(yawsp, '_links', LinkCache(str(tmp_path), ttl=600))
+    monkeypatch.setattr(mock_xbmc.MockWindow, 'properties', {})
+    window = mock_xbmc.MockXBMCGui.Window(10000)
+    yawsp._links.put('dead', 'video_stream', 'https://vip.example/dead')
+    window.setProperty(yawsp.PLAYING_PROPERTY, json.dumps({'ident': 'dead'}))
+    service.PlaybackMonitor().onPlayBackError()
+    assert yawsp._links.get('dead') is None
+    assert window.getProperty(yawsp.PLAYING_PROPERTY) == ''
+
+
+def test_proxy_drops_link_on_upstream_error(stub, tmp_path):
+    """A link the upstream refuses through the stream proxy leaves the cache"""
+    stub.blobs['live'] = b'x' * 1000
+    cache = LinkCache(str(tmp_path), ttl=600)
+    proxy = stream_proxy.StreamProxy(requests.Session(), on_error=cache.forget_link)
+    proxy.start()
+    try:
+        cache.put('live', 'video_stream', stub.base + 'file/live')
+        cache.put('dead', 'video_stream', stub.base + 'file/dead')
+        assert requests.get(proxy.url(stub.base + 'file/live')).content == b'x' * 1000
+        assert requests.get(proxy.url(stub.base + 'file/dead')).status_code == 502
+        assert cache.get('dead') is None and cache.get('live') == stub.base + 'file/live'
+    finally:
+        proxy.stop()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import mock_xbmc
+import xbmcplugin
+
+from listing import Listing
+
+
+def test_items_submitted_at_once(monkeypatch):
+    """All items go to Kodi in one call, followed by content, sorting and the end"""
+    calls = []
+    for name in ('addDirectoryItem', 'addDirectoryItems', 'setContent', 'addSortMethod', 'endOfDirectory'):
+        monkeypatch.setattr(mock_xbmc.MockXBMCPlugin, name,
+                            staticmethod(lambda *args, _name=name, **kwargs: calls.append((_name, args, kwargs))))
+    listing = Listing(7, 'videos', (xbmcplugin.SORT_METHOD_LABEL,))
+    folder = listing.item('Folder', 'plugin://x/?a=1', icon='DefaultFolder.png')
+    listing.add('plugin://x/?a=2', mock_xbmc.MockListItem('File'))
+    assert len(listing) == 2 and folder.offscreen and folder.art == {'icon': 'DefaultFolder.png'}
+    assert calls == []
+    listing.finish(updateListing=True)
+    assert [c[0] for c in calls] == ['addDirectoryItems', 'setContent', 'addSortMethod', 'endOfDirectory']
+    handle, items, total = calls[0][1]
+    assert handle == 7 and total == 2
+    assert [(url, isfolder) for url, item, isfolder in items] == [('plugin://x/?a=1', True), ('plugin://x/?a=2', False)]
+    assert calls[3][2]['updateListing'] is True
+
+    # an empty listing still ends the directory
+    del calls[:]
+    Listing(7).finish(succeeded=False)
+    assert [c[0] for c in calls] == ['endOfDirectory'] and calls[0][2]['succeeded'] is False
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+
+import mock_xbmc
+
+import md5crypt
+import yawsp
+
+
+def test_known_hashes():
+    """Results match crypt(3) for bytes and str input"""
+    assert md5crypt.md5crypt(b'cat', b'hat') == '$1$hat$MeF2VXsGSCLmZs2pWYDI90'
+    assert md5crypt.md5crypt('cat', 'hat') == '$1$hat$MeF2VXsGSCLmZs2pWYDI90'
+    assert md5crypt.md5crypt(b'correct horse battery staple', b'Ab3dEf9h') == '$1$Ab3dEf9h$tPbZvafbiqUx8mxacyhlY.'
+    assert md5crypt.md5crypt(u'žluťoučký kůň'.encode('utf-8'), b'saltsalt') == '$1$saltsalt$vi2Uw.93X/LMDzJy0L61w1'
+    # magic prefix and anything after the salt are ignored, long passwords are fine
+    assert md5crypt.md5crypt(b'x' * 40, b'$1$abc$def') == '$1$abc$b/oSMeDNO7QqHD3W/TXaY0'
+    assert md5crypt.apache_md5_crypt(b'cat', b'hat') == '$apr1$hat$O56jScPAvPbjlT59RClbn.'
+
+
+def test_credentials_cached(tmp_path, monkeypatch):
+    """The derived login values are computed once per user, password and salt"""
+    original = md5crypt.md5crypt
+    calls = []
+
+    def counted(pw, salt, magic=None):
+        calls.append(salt)
+        return original(pw, salt, magic)
+    monkeypatch.setattr(yawsp, '_profile', str(tmp_path / 'addon'))
+    monkeypatch.setattr(md5crypt, 'md5crypt', counted)
+    first = yawsp.credentials('joe', 'secret', 'Ab3dEf9h')
+    assert first == yawsp.credentials('joe', 'secret', 'Ab3dEf9h') and len(calls) == 1
+    path = os.path.join(yawsp._profile, yawsp.CREDENTIALS)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert 'secret' not in open(path).read()
+
+    assert yawsp.credentials('joe', 'secret', 'Zz9yYx8w') != first
+    assert yawsp.credentials('joe', 'other', 'Zz9yYx8w') != first
+    assert len(calls) == 3
+    monkeypatch.setattr(md5crypt, 'md5crypt', original)
+    assert yawsp.credentials('joe', 'secret', 'Ab3dEf9h') == first
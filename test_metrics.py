@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import mock_xbmc
+
+import metrics
+import yawsp
+from tools.mock_webshare import WebshareStub
+
+
+@pytest.fixture
+def stub():
+    stub = WebshareStub([{'ident': 'f1', 'name': 'Some.Video.mkv', 'size': '1000'}], users={'joe': 'secret'}).start()
+    yield stub
+    stub.stop()
+
+
+def test_rolling_log_and_report(tmp_path):
+    """Figures survive flushes, the log keeps its newer half and exports as text"""
+    profile = str(tmp_path)
+    log = metrics.Metrics(os.path.join(profile, 'addon'), max_bytes=4096)
+    for ms in range(1, 101):
+        log.record('api/search', ms / 1000.0, ms != 100, 'OK' if ms != 100 else 'HTTP 503', 1000, ms == 99)
+    log.cache('link cache', True)
+    log.cache('link cache', False)
+    log.cache('link cache', True)
+    log.record('download', 12.5, True, 'done', 10 * 1024 * 1024, 2)
+    endpoints, caches, slowest = log.summary()
+    assert [row['endpoint'] for row in endpoints] == ['api/search', 'download']
+    search = endpoints[0]
+    assert (search['calls'], search['failed'], search['retries'], search['p50'], search['p95']) == (100, 1, 1, 50, 95)
+    assert caches == [{'cache': 'link cache', 'hits': 2, 'misses': 1, 'rate': 2 / 3.0}]
+    assert [entry['ms'] for entry in slowest[:3]] == [12500, 100, 99]
+
+    log.flush()
+    assert not log.pending and os.path.getsize(log.path) <= 4096
+    kept = log.entries()
+    assert 0 < len(kept) < 104 and kept[-1]['e'] == 'download'
+
+    path = log.export()
+    report = open(path).read()
+    assert path == os.path.join(profile, 'addon', metrics.EXPORT)
+    assert 'download' in report and 'slowest recent calls' in report and '10.0 MB' in report
+    log.clear()
+    assert log.entries() == []
+
+
+def test_api_calls_and_caches_recorded(stub, tmp_path, monkeypatch):
+    """A plugin call logs its API calls and cache lookups once it is done"""
+    profile = str(tmp_path)
+    monkeypatch.setattr(yawsp, 'API', stub.url)
+    monkeypatch.setattr(yawsp, '_profile', profile)
+    monkeypatch.setattr(yawsp, '_links', None)
+    monkeypatch.setattr(yawsp, '_metrics', None)
+    monkeypatch.setattr(mock_xbmc.MockXBMCPlugin, 'addDirectoryItems', staticmethod(lambda handle, items, total: None))
+    for key, value in dict(wsuser='joe', wspass='secret', token='', lcttl='60').items():
+        monkeypatch.setitem(yawsp._addon.settings, key, value)
+
+    stub.fail('file_info')
+    yawsp.router('action=info&ident=f1')
+    assert yawsp.getlink('f1', yawsp.revalidate()) == yawsp.getlink('f1', yawsp.revalidate())
+    yawsp._metrics.flush()
+
+    log = metrics.Metrics(profile)
+    calls = [(entry['e'], entry['ok'], entry['s']) for entry in log.entries() if 'e' in entry]
+    assert calls[:5] == [('api/salt', True, 'OK'), ('api/login', True, 'OK'), ('api/user_data', True, 'OK'),
+                         ('api/file_info', False, 'FAILED'), ('api/file_info', True, 'OK')]
+    assert calls.count(('api/file_link', True, 'OK')) == 1
+    endpoints, caches, slowest = log.summary()
+    assert [(row['cache'], row['hits'], row['misses']) for row in caches] == [
+        ('credentials', 0, 1), ('link cache', 1, 1)]
+
+    yawsp.router('action=diagnostics&export=1')
+    assert 'api/file_info' in open(os.path.join(profile, metrics.EXPORT)).read()
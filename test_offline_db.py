@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import threading
+import zipfile
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+import requests
+
+import offline_db
+
+
+def make_archive(series=None, extra=None):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('db/', '')
+        zf.writestr('db/movies.json', json.dumps({'data': [{'id': '1', 'title': 'Pelíšky', 'streams': []}]}))
+        zf.writestr('db/series.json', json.dumps({'data': series or []}))
+        if extra:
+            zf.writestr('db/' + extra, json.dumps({'data': []}))
+    return buf.getvalue()
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.body
+        self.server.ranges.append(self.headers.get('Range'))
+        ranges = self.headers.get('Range')
+        if ranges:
+            start, end = ranges.split('=')[1].split('-')
+            if not start:
+                start, end = max(0, len(body) - int(end)), len(body) - 1
+            start, end = int(start), min(int(end), len(body) - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(body)))
+            body = body[start:end + 1]
+        else:
+            self.send_response(200)
+        self.send_header('ETag', '"%x"' % zlib.crc32(self.server.body))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(('127.0.0.1', 0), ArchiveHandler)
+    server.body = make_archive()
+    server.ranges = []
+    server.link = 'http://127.0.0.1:%d/db.zip' % server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_download_and_read_members(server, tmp_path):
+    """The archive is streamed, verified and read without extraction"""
+    link = server.link
+    profile = str(tmp_path)
+    path = os.path.join(profile, offline_db.ARCHIVE)
+    assert offline_db.open_db(profile) is None
+
+    # a corrupt archive never takes the place of the database
+    server.body = make_archive()[:-40]
+    with pytest.raises((IOError, zipfile.BadZipfile)):
+        offline_db.download_archive(requests.Session(), link, path)
+    assert os.listdir(profile) == []
+
+    server.body = make_archive()
+    offline_db.download_archive(requests.Session(), link, path)
+    files = offline_db.open_source(profile)
+    assert files.names() == ['movies.json', 'series.json']
+    assert files.load('movies.json')[0]['title'] == u'Pelíšky'
+    assert files.load('missing.json') == {}
+    assert not os.path.exists(os.path.join(profile, offline_db.FOLDER))
+
+    # the index was built at download time
+    assert os.path.exists(os.path.join(profile, offline_db.INDEX))
+    db = offline_db.open_db(profile)
+    assert db.categories() == ['movies.json', 'series.json']
+    assert db.items('movies.json') == [('1', u'Pelíšky', None)]
+    assert db.item('movies.json', '1')['streams'] == []
+    assert db.item('movies.json', '2') is None
+    db.close()
+
+
+def test_update_changed_members(server, tmp_path):
+    """Only changed members are fetched and indexed again"""
+    # big enough that the member data is not in the tail read with the central directory
+    movies = [{'id': str(i), 'title': 'Movie %d' % i, 'plot': os.urandom(200).hex()} for i in range(500)]
+    link = server.link
+    profile = str(tmp_path)
+    session = requests.Session()
+    assert offline_db.update(session, link, profile) == ['movies.json', 'series.json']
+    assert offline_db.update(session, link, profile) == []
+    assert server.ranges[-1] == 'bytes=-%d' % offline_db.RemoteFile.BLOCK
+
+    server.body = make_archive([{'id': 's1', 'title': u'Případ', 'streams': []}] + movies, 'kids.json')
+    del server.ranges[:]
+    assert offline_db.update(session, link, profile) == ['kids.json', 'series.json']
+    # the tail with the central directory, then header and data of the changed members only
+    assert len(server.ranges) <= 4 and None not in server.ranges
+    db = offline_db.open_db(profile)
+    assert db.categories() == ['kids.json', 'movies.json', 'series.json']
+    assert db.item('series.json', 's1')['title'] == u'Případ' and db.count('series.json') == 501
+    assert [r[1] for r in db.search('pripad')] == ['s1']
+    assert db.items('movies.json') == [('1', u'Pelíšky', None)]
+    db.close()
+    with open(os.path.join(profile, offline_db.ARCHIVE), 'rb') as file:
+        with zipfile.ZipFile(file) as zf:
+            assert zf.testzip() is None
+            assert sorted(zf.namelist()) == ['db/', 'db/kids.json', 'db/movies.json', 'db/series.json']
+
+    server.body = make_archive()
+    assert offline_db.update(session, link, profile) == ['series.json', 'kids.json']
+    db = offline_db.open_db(profile)
+    assert db.categories() == ['movies.json', 'series.json'] and db.search('pripad') == []
+    db.close()
+
+
+def test_legacy_folder_indexed_once(tmp_path):
+    """A database extracted by an older version is indexed on first open"""
+    profile = str(tmp_path)
+    folder = os.path.join(profile, offline_db.FOLDER)
+    os.makedirs(folder)
+    with io.open(os.path.join(folder, 'movies.json'), 'w', encoding='utf8') as file:
+        file.write(json.dumps({'data': [{'id': 2, 'title': 'B'}, {'id': 1, 'title': 'A'}]}))
+    db = offline_db.open_db(profile)
+    assert db.items('movies.json') == [('1', 'A', None), ('2', 'B', None)]
+    db.close()
+    assert sorted(os.listdir(profile)) == sorted([offline_db.FOLDER, offline_db.INDEX])
+
+
+def test_search(tmp_path):
+    """Words match as accent-free prefixes, all of them must be found"""
+    profile = str(tmp_path)
+    folder = os.path.join(profile, offline_db.FOLDER)
+    os.makedirs(folder)
+    movies = [{'id': 1, 'title': u'Pelíšky', 'plot': u'Rodiny v Praze roku 1967.'},
+              {'id': 2, 'title': u'Praha', 'plot': u'Dokument o městě.'},
+              {'id': 3, 'title': u'Pelíšky 2', 'plot': None}]
+    with io.open(os.path.join(folder, 'movies.json'), 'w', encoding='utf8') as file:
+        file.write(json.dumps({'data': movies}))
+    db = offline_db.open_db(profile)
+    assert [r[1] for r in db.search(u'PELIS')] == ['1', '3']
+    assert [r[1] for r in db.search(u'pelíšky praz')] == ['1']
+    # the title hit is ranked above the plot hit
+    assert [r[1] for r in db.search(u'pra')] == ['2', '1']
+    assert db.search(u'pelisky mesto') == [] and db.search(u'!?') == []
+    assert db.search(u'pel', limit=1) == [('movies.json', '1', u'Pelíšky', u'Rodiny v Praze roku 1967.')]
+
+    # an index without search terms is converted again
+    db.conn.execute('DROP TABLE terms')
+    db.conn.execute("UPDATE meta SET value = '1'")
+    db.conn.commit()
+    db.close()
+    db = offline_db.open_db(profile)
+    assert [r[1] for r in db.search(u'dokument')] == ['2']
+    db.close()
+
+
+def test_pages_and_letters(tmp_path):
+    """Pages follow the accent-free title order, letters jump into it"""
+    profile = str(tmp_path)
+    folder = os.path.join(profile, offline_db.FOLDER)
+    os.makedirs(folder)
+    titles = [u'Želary', u'Amélie', u'2001', u'Černí baroni', u'alien', u'Cesta', u'Zorro', None]
+    with io.open(os.path.join(folder, 'movies.json'), 'w', encoding='utf8') as file:
+        file.write(json.dumps({'data': [{'id': i, 'title': t} for i, t in enumerate(titles)]}))
+    db = offline_db.open_db(profile)
+    assert db.count('movies.json') == 8 and db.count('missing.json') == 0
+    ordered = [row[1] for row in db.items('movies.json')]
+    assert ordered == [None, u'2001', u'alien', u'Amélie', u'Černí baroni', u'Cesta', u'Želary', u'Zorro']
+    assert [row[1] for row in db.items('movies.json', 3, 3)] == ordered[3:6]
+    assert db.items('movies.json', 6, 3) == db.items('movies.json')[6:]
+    assert db.letters('movies.json') == ['2', 'a', 'c', 'z']
+    assert db.position('movies.json', 'c') == 4 and db.position('movies.json', 'z') == 6
+    db.close()
+
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+import mock_xbmc
+
+import yawsp
+from queue_cache import QueueCache
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+
+def test_mirror_changes_and_expiry(tmp_path):
+    """Changes go to the mirror, it is dropped when it cannot be trusted"""
+    profile = str(tmp_path)
+    cache = QueueCache(profile, ttl=600, user='joe')
+    assert cache.files() is None
+    cache.add({'ident': 'a', 'name': 'A'})  # nothing fetched yet, nothing to change
+    assert cache.files() is None
+
+    cache.replace([{'ident': 'a', 'name': 'A'}])
+    cache.add({'ident': 'b', 'name': 'B', 'size': '10'})
+    cache.add({'ident': 'a', 'name': 'A'})
+    assert [f['ident'] for f in QueueCache(profile, 600, 'joe').files()] == ['b', 'a']
+    cache.remove('b')
+    assert cache.files() == [{'ident': 'a', 'name': 'A'}]
+
+    assert QueueCache(profile, 600, 'ann').files() is None
+    assert QueueCache(profile, 0, 'joe').files() is None
+    assert QueueCache(profile, -1, 'joe').files() is None
+
+    # a file without a name cannot be listed
+    cache.add({'ident': 'c'})
+    assert cache.files() is None
+
+
+def test_queue_view_from_mirror(tmp_path, monkeypatch):
+    """The queue is fetched once, changes are sent after the listing is finished"""
+    calls = []
+    shown = []
+    release = threading.Event()
+    queue = ['<file><ident>a</ident><name>A.mkv</name><size>1</size></file>',
+             '<file><ident>b</ident><name>B.mkv</name><size>2</size></file>']
+
+    def api(fnct, data):
+        calls.append(fnct)
+        if fnct == 'queue':
+            return Response('<response><status>OK</status>%s</response>' % ''.join(queue))
+        release.wait(5)
+        return Response('<response><status>%s</status></response>' % ('OK' if data['ident'] != 'x' else 'FATAL'))
+
+    monkeypatch.setattr(mock_xbmc.MockXBMCPlugin, 'addDirectoryItems', staticmethod(
+        lambda handle, items, total: shown.append([url for url, item, folder in items])))
+    monkeypatch.setattr(yawsp, 'api', api)
+    monkeypatch.setattr(yawsp, 'revalidate', lambda: 'token')
+    monkeypatch.setattr(yawsp, 'popinfo', lambda *args, **kwargs: None)
+    monkeypatch.setattr(yawsp, '_profile', str(tmp_path))
+    monkeypatch.setattr(yawsp, '_queue', None)
+
+    yawsp.router('action=queue')
+    yawsp.router('action=queue')
+    assert calls == ['queue'] and len(shown[1]) == 2
+
+    # listed before the server answered
+    yawsp.queue({'dequeue': 'a'})
+    assert len(shown[2]) == 1 and yawsp._background
+    release.set()
+    yawsp.join_background()
+    assert calls == ['queue', 'dequeue_file']
+    yawsp.toqueue({'toqueue': 'c', 'name': 'C.mkv', 'size': '3'}, 'token')
+    yawsp.join_background()
+    yawsp.router('action=queue')
+    assert calls == ['queue', 'dequeue_file', 'queue_file']
+    assert [u.split('ident=')[1].split('&')[0] for u in shown[3]] == ['b', 'c']
+
+    # a failed call drops the mirror, the next view asks the server
+    yawsp.toqueue({'toqueue': 'x', 'name': 'X.mkv'}, 'token')
+    yawsp.join_background()
+    yawsp.router('action=queue')
+    assert calls[-2:] == ['queue_file', 'queue']
+
+    yawsp.router('action=queue&refresh=1')
+    assert calls[-1] == 'queue'
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib
+import subprocess
+import sys
+
+import mock_xbmc
+
+import yawsp
+
+
+def test_routes_resolve():
+    """Every action of the dispatch table names an existing handler"""
+    for action, (module, name) in yawsp.ROUTES.items():
+        handler = getattr(yawsp if module is None else importlib.import_module(module), name)
+        assert callable(handler), action
+
+
+def test_router_dispatch(monkeypatch):
+    """Actions go to their handler, anything else to the main menu"""
+    import manager_views
+    called = []
+    monkeypatch.setattr(yawsp, 'ROUTES', {'queue': ('manager_views', 'series_menu')})
+    monkeypatch.setattr(yawsp, 'menu', lambda params=None: called.append(('menu', params)))
+    monkeypatch.setattr(manager_views, 'series_menu', lambda params: called.append(('series', params)))
+    yawsp.router('action=queue&x=1')
+    yawsp.router('action=unknown')
+    yawsp.router('')
+    assert called == [('series', {'action': 'queue', 'x': '1'}), ('menu', {'action': 'unknown'}), ('menu', {})]
+
+
+def test_main_answers_the_plugin_call(monkeypatch):
+    """Importing sets nothing from argv, main() takes the URL and handle of the call"""
+    assert yawsp._handle == -1 and yawsp._url == 'plugin://%s/' % yawsp._addon.getAddonInfo('id')
+    called = []
+    monkeypatch.setattr(yawsp, 'ROUTES', {'queue': (None, 'queue')})
+    monkeypatch.setattr(yawsp, 'queue', lambda params: called.append((yawsp._handle, yawsp.get_url(a=1), params)))
+    monkeypatch.setattr(yawsp, '_url', yawsp._url)
+    monkeypatch.setattr(yawsp, '_handle', yawsp._handle)
+    yawsp.main(['plugin://plugin.video.yawsp/', '7', '?action=queue'])
+    assert called == [(7, 'plugin://plugin.video.yawsp/?a=1', {'action': 'queue'})]
+
+
+def test_cold_import_stays_light():
+    """A plugin call does not pay for modules its action does not use"""
+    child = ("import sys, mock_xbmc; import yawsp; "
+             "print(' '.join(sorted(sys.modules)))")
+    loaded = subprocess.run([sys.executable, '-c', child], stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True).stdout.split()
+    for heavy in ('requests', 'unidecode', 'uuid', 'series_manager', 'movie_manager', 'trakt_client',
+                  'offline_db', 'downloader', 'download_manager', 'stream_proxy', 'manager_views'):
+        assert heavy not in loaded, heavy
+
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from xml.etree import ElementTree as ET
+
+import mock_xbmc
+
+from tools import bench_search_quality as quality
+
+
+def files(prefix, count):
+    return [{'ident': '%s%03d' % (prefix, i), 'name': '%s.%03d.mkv' % (prefix, i), 'size': '1'} for i in range(count)]
+
+
+def idents(reply):
+    return [file.find('ident').text for file in ET.fromstring(reply.content).iter('file')]
+
+
+def test_replay_pages_and_recorder():
+    """Recorded responses are paged like the API, pages past the recording are reported"""
+    responses = {}
+    live = quality.Replay({'Dark': {'total': 250, 'files': files('dark', 250)}})
+    recorder = quality.Recorder(responses, live)
+    for offset in (0, 100, 0):
+        recorder('search', {'what': 'Dark', 'limit': 100, 'offset': offset})
+    assert responses['Dark']['total'] == 250 and len(responses['Dark']['files']) == 200
+
+    replay = quality.Replay(responses)
+    assert idents(replay('search', {'what': 'Dark', 'limit': 100, 'offset': 100}))[0] == 'dark100'
+    assert not replay.unrecorded
+    assert len(idents(replay('search', {'what': 'Dark', 'limit': 100, 'offset': 200}))) == 0
+    assert idents(replay('search', {'what': 'Dune', 'limit': 100, 'offset': 0})) == []
+    assert replay.unrecorded == {'Dark', 'Dune'} and replay.calls == 3
+
+
+def test_strategies_scored_against_truth():
+    """Requests follow the manager's search settings, mappings are checked per episode"""
+    catalogue = [{'ident': 'good1', 'name': 'Dark.S01E01.1080p.CZ.mkv', 'size': '1'},
+                 {'ident': 'good2', 'name': 'Dark.S01E02.720p.mkv', 'size': '1'},
+                 {'ident': 'okay2', 'name': 'Dark.S01E02.1080p.CZ.mkv', 'size': '1'},
+                 {'ident': 'fake3', 'name': 'Dark.Matter.S01E03.mkv', 'size': '1'}]
+    fixture = {'responses': {'Dark': {'total': 4, 'files': catalogue}},
+               'truth': {'series': {'Dark': {'S01E01': ['good1'], 'S01E02': ['good2', 'okay2'],
+                                             'S01E04': ['gone4']}}}}
+    rows = quality.evaluate(fixture, [('current', {}), ('one page', {'SEARCH_MAX_RESULTS': 100, 'SEARCH_SEASONS': ()})])
+    current, one = rows
+    # Dark and Dark s01..s05, the season queries were not recorded
+    assert current['requests'] == 6 and current['unrecorded'] == ['Dark s%02d' % s for s in range(1, 6)]
+    assert one['requests'] == 1 and 'unrecorded' not in one
+    for row in rows:
+        assert (row['correct'], row['best'], row['wrong'], row['missed']) == (2, 1, 1, 1)
+
@@ -29,11 +29,11 @@ class MockAddon:
     def __init__(self):
         pass
 
-# Mock the XBMC modules
-sys.modules['xbmc'] = MockXBMC()
-sys.modules['xbmcaddon'] = type('MockModule', (), {'Addon': MockAddon})()
-sys.modules['xbmcgui'] = type('MockModule', (), {})()
-sys.modules['xbmcvfs'] = type('MockModule', (), {'translatePath': lambda x: x})()
+# Mock the XBMC modules, unless other tests of the run mocked them already
+sys.modules.setdefault('xbmc', MockXBMC())
+sys.modules.setdefault('xbmcaddon', type('MockModule', (), {'Addon': MockAddon})())
+sys.modules.setdefault('xbmcgui', type('MockModule', (), {})())
+sys.modules.setdefault('xbmcvfs', type('MockModule', (), {'translatePath': lambda x: x})())
 
 # Now import the actual production code
 import series_manager
@@ -236,6 +236,41 @@ def test_quality_selection():
     print("\n✅ ALL QUALITY SELECTION TESTS PASSED!")
     return True
 
+def test_alternatives_and_promotion():
+    """Runner-up files are kept per episode and can replace a dead primary"""
+    print("\n=== Testing Episode Alternatives ===")
+    files = [
+        {'filename': 'Silo.S01E01.720p.WEBRip.mkv', 'ident': 'a', 'size': '1000000000'},
+        {'filename': 'Silo.S01E01.1080p.BluRay.CZ.mkv', 'ident': 'b', 'size': '4000000000'},
+        {'filename': 'Silo.S01E01.1080p.WEB-DL.mkv', 'ident': 'c', 'size': '3000000000'},
+        {'filename': 'Silo.S01E02.720p.mkv', 'ident': 'd', 'size': '1000000000'},
+    ]
+
+    def api_function(action, params):
+        return MockResponse(files if params.get('what') == 'Silo' else [])
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        sm = series_manager.SeriesManager(MockAddon(), temp_dir)
+        series_data = sm.search_series('Silo', api_function, 'token')
+        episode = series_data['seasons']['1']['1']
+        assert episode['ident'] == 'b', episode
+        assert [a['ident'] for a in episode['alternatives']] == ['c', 'a']
+        assert series_data['seasons']['1']['2']['alternatives'] == []
+
+        ep_num, nxt = sm.next_episode(series_data, 1, 1)
+        assert ep_num == '2' and nxt['ident'] == 'd'
+        assert sm.next_episode(series_data, 1, 2) == (None, None)
+
+        promoted = sm.promote_alternative('Silo', '1', '1', 'c')
+        assert promoted['ident'] == 'c'
+        stored = sm.load_series_data('Silo')['seasons']['1']['1']
+        assert stored['ident'] == 'c' and [a['ident'] for a in stored['alternatives']] == ['a']
+        print("   ✅ Alternatives kept and promoted correctly")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
 def main():
     print("=== Production SeriesManager Test ===")
     print("This test calls the actual production series_manager.py code")
@@ -243,6 +278,7 @@ def main():
     
     # Run quality selection tests first
     test_quality_selection()
+    test_alternatives_and_promotion()
     
     # Check if we have the API test data
     if not os.path.exists('search_test_results.json'):
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+import requests
+
+import stream_proxy
+from tools.mock_webshare import WebshareStub
+
+KB = 1024
+
+
+@pytest.fixture
+def stub():
+    stub = WebshareStub().start()
+    stub.blobs['movie'] = os.urandom(16 * stream_proxy.MB)
+    yield stub
+    stub.stop()
+
+
+def start_proxy(**kwargs):
+    proxy = stream_proxy.StreamProxy(requests.Session(), head_size=64 * KB, tail_size=64 * KB, **kwargs)
+    proxy.start()
+    return proxy
+
+
+def fetch(url, start, end):
+    return requests.get(url, headers={'Range': 'bytes=%d-%d' % (start, end)}).content
+
+
+def upstream_gets(stub):
+    return [data['range'] for fnct, data in stub.calls if fnct == 'GET']
+
+
+def test_only_registered_links_are_served(stub):
+    """Links are served by the key they were registered with, nothing else"""
+    link = stub.base + 'file/movie'
+    proxy = start_proxy(lookup=lambda key: (link, {}) if key == 'a' * 32 else None)
+    try:
+        base = 'http://127.0.0.1:%d' % proxy.port
+        assert requests.get(base + '/stream?u=' + link).status_code == 404
+        assert requests.get(stream_proxy.local_url(proxy.port, stream_proxy.new_key())).status_code == 404
+        assert fetch(proxy.url(link), 0, 99) == stub.blobs['movie'][:100]
+        # registered by the plugin in another process
+        assert fetch(stream_proxy.local_url(proxy.port, 'a' * 32), 0, 99) == stub.blobs['movie'][:100]
+    finally:
+        proxy.stop()
+
+
+def test_requests_inside_the_window_reuse_the_upstream(stub):
+    """Seeks inside the buffered window are served without a new upstream request"""
+    blob = stub.blobs['movie']
+    proxy = start_proxy(buffer_size=stream_proxy.MB)
+    try:
+        url = proxy.url(stub.base + 'file/movie')
+        assert fetch(url, 100 * KB, 200 * KB - 1) == blob[100 * KB:200 * KB]
+        assert upstream_gets(stub) == ['bytes=0-65535', 'bytes=102400-16711679']
+        # forward, then back, inside the window
+        assert fetch(url, 600 * KB, 700 * KB - 1) == blob[600 * KB:700 * KB]
+        assert fetch(url, 450 * KB, 550 * KB - 1) == blob[450 * KB:550 * KB]
+        assert len(upstream_gets(stub)) == 2
+        # far away, the window moves
+        assert fetch(url, 12000 * KB, 12100 * KB - 1) == blob[12000 * KB:12100 * KB]
+        assert upstream_gets(stub)[2:] == ['bytes=12288000-16711679']
+    finally:
+        proxy.stop()
+
+
+def test_window_spills_to_disk(stub, tmp_path):
+    """Bytes pushed out of the memory ring are still served from the disk ring"""
+    blob = stub.blobs['movie']
+    proxy = start_proxy(buffer_size=256 * KB, spill_dir=str(tmp_path), spill_size=2 * stream_proxy.MB)
+    try:
+        url = proxy.url(stub.base + 'file/movie')
+        assert fetch(url, 100 * KB, 1300 * KB - 1) == blob[100 * KB:1300 * KB]
+        assert fetch(url, 900 * KB, 1000 * KB - 1) == blob[900 * KB:1000 * KB]
+        assert len(upstream_gets(stub)) == 2
+    finally:
+        proxy.stop()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import pytest
+import requests
+
+import mock_xbmc
+
+import manager_views
+from ratelimit import TokenBucket
+from trakt_client import TraktClient, TraktError
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Replays scripted (status, headers) answers and records request times."""
+
+    def do_GET(self):
+        self.server.hits.append(time.monotonic())
+        if self.server.script:
+            status, headers = self.server.script.pop(0)
+        else:
+            status, headers = 200, {}
+        body = json.dumps({'path': self.path}).encode('utf-8')
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def start_stub():
+    """Starts stub servers answering with a script, shut down after the test."""
+    servers = []
+
+    def start(script=None):
+        server = StubServer(('127.0.0.1', 0), StubHandler)
+        server.script = list(script or [])
+        server.hits = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        servers.append(server)
+        return server, 'http://127.0.0.1:%d/' % server.server_address[1]
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_token_bucket_limits_rate(start_stub):
+    """Requests beyond the burst are spread according to the rate"""
+    server, url = start_stub()
+    client = TraktClient(requests.Session(), 'id', base_url=url, rate=20, burst=2)
+    started = time.monotonic()
+    for _ in range(6):
+        client.get('shows/trending')
+    elapsed = time.monotonic() - started
+    # 2 requests from the burst, 4 more at 20/s
+    assert elapsed >= 0.18, elapsed
+    assert client.metrics()['wait_time'] > 0
+
+
+def test_retry_after_is_honoured(start_stub):
+    """429 with Retry-After pauses the client before the retry"""
+    server, url = start_stub([(429, {'Retry-After': '1'})])
+    client = TraktClient(requests.Session(), 'id', base_url=url, rate=100, burst=10)
+    data, _ = client.get('shows/popular')
+    assert data['path'].startswith('/shows/popular')
+    assert len(server.hits) == 2
+    assert server.hits[1] - server.hits[0] >= 0.95
+    metrics = client.metrics()
+    assert metrics['throttled'] == 1 and metrics['retries'] == 1
+
+
+def test_ratelimit_header_pauses_bucket(start_stub):
+    """X-Ratelimit with no remaining calls holds further requests"""
+    until = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() + 2))
+    header = json.dumps({'name': 'UNAUTHED_API_GET_LIMIT', 'period': 300, 'limit': 1000,
+                         'remaining': 0, 'until': until})
+    server, url = start_stub([(200, {'X-Ratelimit': header})])
+    client = TraktClient(requests.Session(), 'id', base_url=url, rate=100, burst=10)
+    client.get('movies/trending')
+    client.get('movies/trending')
+    assert server.hits[1] - server.hits[0] >= 0.5
+
+
+def test_server_errors_are_retried_with_backoff(start_stub):
+    """5xx answers are retried, other client errors are not"""
+    server, url = start_stub([(502, {}), (503, {}), (404, {})])
+    client = TraktClient(requests.Session(), 'id', base_url=url, rate=100, burst=10,
+                         backoff=0.05)
+    with pytest.raises(TraktError) as error:
+        client.get('shows/missing')
+    assert error.value.status == 404
+    assert len(server.hits) == 3
+    metrics = client.metrics()
+    assert metrics['retries'] == 2 and metrics['failures'] == 1
+
+
+def test_queue_depth_under_concurrency(start_stub):
+    """Concurrent callers queue on the bucket and are counted"""
+    server, url = start_stub()
+    client = TraktClient(requests.Session(), 'id', base_url=url, rate=10, burst=1)
+    depths = []
+    threads = [threading.Thread(target=client.get, args=('shows/trending',)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    depths.append(client.metrics()['queue_depth'])
+    for thread in threads:
+        thread.join()
+    assert max(depths) >= 2, depths
+    assert client.metrics()['queue_depth'] == 0
+    assert len(server.hits) == 5
+
+
+def test_token_bucket_unlimited():
+    """A rate of zero never blocks"""
+    bucket = TokenBucket(0)
+    assert bucket.acquire(10 ** 9) == 0
+
+
+def test_failed_metadata_is_not_stored(monkeypatch):
+    """A Trakt failure keeps what is stored, only an empty search is cached as a miss"""
+    answers = {}
+    stored = []
+
+    def request(endpoint, params=None, failed=([], {})):
+        answer = answers.get(endpoint, 'fail')
+        return failed if answer == 'fail' else (answer, {})
+
+    class Manager:
+        def store_trakt_meta(self, name, data, meta):
+            data['trakt'] = meta
+            stored.append(meta)
+    monkeypatch.setattr(manager_views, '_trakt_request', request)
+    old = {'slug': 'dark', 'updated': 0, 'plot': 'old plot', 'episodes': {}}
+    # search fails, info fails, seasons fail
+    assert manager_views._trakt_series_meta(Manager(), 'Dark', {'trakt': old}) is old
+    answers['search/show'] = [{'show': {'ids': {'slug': 'dark'}}}]
+    assert manager_views._trakt_series_meta(Manager(), 'Dark', {'trakt': old}) is old
+    answers['shows/dark'] = {'overview': 'new plot'}
+    assert manager_views._trakt_series_meta(Manager(), 'Dark', {'trakt': old}) is old
+    answers['search/movie'] = [{'movie': {'ids': {'slug': 'dark'}}}]
+    assert manager_views._trakt_movie_meta(Manager(), 'Dark', {}).get('slug') == 'dark' and not stored
+
+    answers['shows/dark/seasons'] = [{'number': 1, 'episodes': [{'number': 1, 'overview': 'e1'}]}]
+    meta = manager_views._trakt_series_meta(Manager(), 'Dark', {'trakt': old})
+    assert meta['plot'] == 'new plot' and meta['episodes']['1']['1']['plot'] == 'e1' and stored == [meta]
+
+    answers['search/movie'] = []
+    meta = manager_views._trakt_movie_meta(Manager(), 'Nothing', {})
+    assert meta['slug'] is None and stored[-1] is meta
+
+
+def test_failed_watchers_notify_once(monkeypatch):
+    """Failed stats requests of a listing end in one notification, not one per item"""
+    notes = []
+
+    class Client:
+        client_id = 'id'
+
+        def get(self, endpoint, params=None):
+            if endpoint == 'shows/ok/stats':
+                return {'watchers': 7}, {}
+            raise TraktError('rate limited', 429)
+
+        def metrics(self):
+            return ''
+    monkeypatch.setattr(manager_views, '_trakt', Client())
+    monkeypatch.setattr(manager_views, 'popinfo', lambda message, **kwargs: notes.append(message))
+    monkeypatch.setitem(manager_views._addon.settings, 'trakt_client_id', 'id')
+    items = [{'ids': {'slug': slug}} for slug in ('a', 'ok', 'b', 'c')] + [{'ids': {}}]
+    assert manager_views._trakt_watchers('shows', items) == [0, 7, 0, 0, 0]
+    assert notes == [manager_views._addon.getLocalizedString(30405)]
+
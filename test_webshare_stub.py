@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import mock_xbmc
+
+import yawsp
+from tools.mock_webshare import WebshareStub
+
+FILES = [{'ident': 'f%02d' % i, 'name': 'Some.Video.%02d.mkv' % i, 'size': str(i * 1000)} for i in range(30)]
+
+
+class Session:
+    """Stub server, a fresh profile and the plugin pointed at both."""
+
+    def __init__(self, stub, profile):
+        self.stub = stub
+        self.profile = profile
+        self.shown = []
+        self.notes = []
+
+    def played(self, listing):
+        return [url.split('ident=')[1].split('&')[0] for url in listing if 'action=play' in url]
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    stub = WebshareStub(FILES, users={'joe': 'secret'}).start()
+    session = Session(stub, str(tmp_path))
+    monkeypatch.setattr(yawsp, 'API', stub.url)
+    monkeypatch.setattr(yawsp, '_profile', session.profile)
+    monkeypatch.setattr(yawsp, '_queue', None)
+    monkeypatch.setattr(yawsp, '_links', None)
+    monkeypatch.setattr(yawsp, 'popinfo',
+                        lambda message, *args, **kwargs: session.notes.append((message, kwargs.get('icon'))))
+    monkeypatch.setattr(mock_xbmc.MockXBMCPlugin, 'addDirectoryItems', staticmethod(
+        lambda handle, items, total: session.shown.append([url for url, item, folder in items])))
+    settings = dict(wsuser='joe', wspass='secret', token='', slimit='10', scategory='0',
+                    ssort='0', shistory='20', qcttl='10', lcttl='60')
+    for key, value in settings.items():
+        monkeypatch.setitem(yawsp._addon.settings, key, value)
+    yield session
+    stub.stop()
+
+
+def test_login_and_search_pages(session):
+    """Login derives what the server expects, results are paged by total"""
+    yawsp.router('action=search&what=video&offset=10')
+    assert [fnct for fnct, data in session.stub.calls] == ['salt', 'login', 'user_data', 'search']
+    assert session.played(session.shown[-1]) == ['f%02d' % i for i in range(10, 20)]
+    # previous and next page around the results
+    assert 'offset=0' in session.shown[-1][0] and 'offset=20' in session.shown[-1][-1]
+    assert os.path.exists(os.path.join(session.profile, yawsp.CREDENTIALS))
+
+    # an expired token logs in again, without md5crypt
+    session.stub.expire_tokens()
+    yawsp.router('action=search&what=video&offset=20')
+    assert [fnct for fnct, data in session.stub.calls[4:]] == ['user_data', 'salt', 'login', 'user_data', 'search']
+    assert session.played(session.shown[-1]) == ['f%02d' % i for i in range(20, 30)]
+
+
+def test_queue_and_history_round_trip(session):
+    """Queue changes reach the server, history removal clears every download"""
+    session.stub.queue.extend(['f01', 'f02'])
+    session.stub.downloaded('f03')
+    session.stub.downloaded('f04')
+    session.stub.downloaded('f03')
+    yawsp.router('action=search&what=video&toqueue=f05&name=Some.Video.05.mkv&size=5000')
+    yawsp.router('action=queue')
+    assert session.stub.queue == ['f01', 'f02', 'f05'] and session.played(session.shown[-1]) == ['f01', 'f02', 'f05']
+    yawsp.router('action=queue&dequeue=f01')
+    assert session.stub.queue == ['f02', 'f05'] and session.played(session.shown[-1]) == ['f02', 'f05']
+
+    yawsp.router('action=history&remove=f03')
+    assert [entry['ident'] for entry in session.stub.history] == ['f04']
+    assert session.played(session.shown[-1]) == ['f04']
+
+
+def test_injected_failures(session):
+    """A failed call is reported and leaves no stale state behind"""
+    yawsp.router('action=queue')
+    session.stub.fail('queue_file')
+    yawsp.router('action=search&what=video&toqueue=f07&name=Some.Video.07.mkv')
+    assert session.notes[-1][1] == mock_xbmc.MockXBMCGui.NOTIFICATION_WARNING
+    assert yawsp.queuecache().files() is None
+
+    session.stub.fail('file_info', times=2)
+    yawsp.router('action=info&ident=f01')
+    assert [fnct for fnct, data in session.stub.calls[-2:]] == ['file_info', 'file_info']
+    assert session.notes[-1][1] == mock_xbmc.MockXBMCGui.NOTIFICATION_WARNING
+
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks and test helpers, not part of the addon zip."""
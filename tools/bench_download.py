@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Download throughput and memory, old loop vs. the pipelined downloader.
+
+A local HTTP server serves a random file. The target simulates a network
+share: every write() call costs a fixed latency plus a per-megabyte time,
+like xbmcvfs.File on SMB. Peak Python memory is measured with tracemalloc.
+Run from the repository root: python -m tools.bench_download [size_mb] [write_latency_ms]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import requests
+
+import downloader
+from downloader import MB
+
+WRITE_MB_SECONDS = 0.004  # target sustains ~250 MB/s once a write is issued
+
+
+class OriginServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        data = self.server.data
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        view = memoryview(data)
+        try:
+            for pos in range(0, len(data), 256 * 1024):
+                self.wfile.write(view[pos:pos + 256 * 1024])
+        except (IOError, OSError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ShareFile:
+    """Local file with network share like cost per write call."""
+
+    def __init__(self, path, latency):
+        self.file = open(path, 'wb')
+        self.latency = latency
+
+    def write(self, data):
+        time.sleep(self.latency + len(data) * WRITE_MB_SECONDS / MB)
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+def old_whole(session, url, out):
+    response = session.get(url, stream=True)
+    out.write(response.content)
+    return len(response.content)
+
+
+def old_loop(session, url, out):
+    response = session.get(url, stream=True)
+    written = 0
+    for data in response.iter_content(chunk_size=4096):
+        out.write(data)
+        written += len(data)
+    return written
+
+
+def pipeline(chunk_size):
+    def run(session, url, out):
+        response = session.get(url, stream=True)
+        try:
+            return downloader.copy(response.iter_content(chunk_size=chunk_size), out)
+        finally:
+            response.close()
+    return run
+
+
+def measure(fn, url, path, latency):
+    session = requests.Session()
+    out = ShareFile(path, latency)
+    tracemalloc.start()
+    started = time.perf_counter()
+    written = fn(session, url, out)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    out.close()
+    return written, seconds, peak
+
+
+def main():
+    size = int(sys.argv[1]) * MB if len(sys.argv) > 1 else 128 * MB
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.002
+    origin = OriginServer(('127.0.0.1', 0), OriginHandler)
+    origin.data = os.urandom(size)
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/file.mkv' % origin.server_address[1]
+    target = os.path.join(tempfile.mkdtemp(), 'file.mkv')
+
+    print('File %d MB, write latency %.1f ms + %.1f ms/MB'
+          % (size // MB, latency * 1000, WRITE_MB_SECONDS * 1000))
+    print('%-28s %10s %10s %12s' % ('case', 'seconds', 'MB/s', 'peak MB'))
+    cases = [('response.content', old_whole),
+             ('4 KiB sync loop', old_loop)]
+    cases += [('pipeline %d MiB chunks' % (c // MB), pipeline(c)) for c in (1 * MB, 4 * MB, 16 * MB)]
+    for name, fn in cases:
+        written, seconds, peak = measure(fn, url, target, latency)
+        assert written == size and os.path.getsize(target) == size
+        print('%-28s %10.2f %10.1f %12.1f' % (name, seconds, size / MB / seconds, peak / float(MB)))
+
+    os.remove(target)
+    origin.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Cold-start import cost per plugin action.
+
+Every click starts a fresh interpreter, so whatever yawsp imports is paid
+before the first line of a view runs. For each action in yawsp.ROUTES a
+new interpreter imports mock_xbmc, then yawsp, the handler's module and
+the modules the handler imports itself, under -X importtime. The import
+time of everything after mock_xbmc is summed (median of several runs).
+With a budget the exit status is 1 when an action goes over it.
+Run from the repository root: python -m tools.bench_importtime [budget_ms]
+"""
+
+import ast
+import os
+import re
+import subprocess
+import sys
+
+import mock_xbmc
+import yawsp
+
+ROUNDS = 5
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHILD = '''
+import mock_xbmc
+import yawsp
+for name in %r:
+    __import__(name)
+'''
+# "import time: self | cumulative | name", nesting is two spaces per level
+LINE = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def functions(module):
+    """Functions of a module and where the names it imports from yawsp come from."""
+    with open(os.path.join(ROOT, module + '.py')) as file:
+        tree = ast.parse(file.read())
+    found = {}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            found[node.name] = (module, node)
+        elif isinstance(node, ast.ImportFrom) and node.module == 'yawsp':
+            for alias in node.names:
+                found[alias.asname or alias.name] = ('yawsp', alias.name)
+    return found
+
+
+def handler_imports(module, name):
+    """Modules imported inside the handler and the functions it calls."""
+    scopes = {m: functions(m) for m in {'yawsp', module or 'yawsp'}}
+    todo, seen, found = [(module or 'yawsp', name)], set(), []
+    while todo:
+        key = todo.pop()
+        if key in seen:
+            continue
+        seen.add(key)
+        where, node = scopes[key[0]].get(key[1], (None, None))
+        if isinstance(node, str):  # imported from yawsp
+            todo.append((where, node))
+            continue
+        if node is None:
+            continue
+        for inner in ast.walk(node):
+            if isinstance(inner, ast.Import):
+                found.extend(alias.name for alias in inner.names)
+            elif isinstance(inner, ast.ImportFrom):
+                found.append(inner.module)
+            elif isinstance(inner, ast.Name) and inner.id in scopes[where]:
+                todo.append((where, inner.id))
+    return sorted(set(found))
+
+
+def measure(modules):
+    """Import time in ms of everything after mock_xbmc and the heaviest module."""
+    # Kodi keeps the bytecode of addons, compiling is not part of a click
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD % (modules,)],
+                         cwd=ROOT, env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    total, heaviest, started = 0, ('', 0), False
+    for line in out.splitlines():
+        match = LINE.match(line)
+        if match is None or match.group(2):
+            continue  # only top level imports, their time includes the nested ones
+        name, cumulative = match.group(3), int(match.group(1))
+        if name == 'mock_xbmc':
+            started = True
+            continue
+        if started:
+            total += cumulative
+            if cumulative > heaviest[1]:
+                heaviest = (name, cumulative)
+    return total / 1000.0, heaviest[0]
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    routes = dict(yawsp.ROUTES)
+    routes[''] = (None, 'menu')
+    over = []
+    print('%-18s %10s  %s' % ('action', 'median ms', 'heaviest import'))
+    for action, (module, name) in sorted(routes.items()):
+        modules = ([module] if module else []) + handler_imports(module, name)
+        measure(modules)  # writes the bytecode
+        runs = sorted(measure(modules) for _ in range(ROUNDS))
+        ms, heaviest = runs[len(runs) // 2]
+        print('%-18s %10.1f  %s' % (action or '(menu)', ms, heaviest))
+        if budget is not None and ms > budget:
+            over.append(action or '(menu)')
+    if over:
+        print('over the %.0f ms budget: %s' % (budget, ', '.join(over)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
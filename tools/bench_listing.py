@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time per 1,000 directory items: one addDirectoryItem per item vs. Listing.
+
+Runs on mock_xbmc. Every call into a Kodi module is counted and can be
+given a simulated cost in microseconds, because in Kodi each of them
+crosses from Python into the C++ core.
+Run from the repository root: python -m tools.bench_listing [microseconds_per_kodi_call]
+"""
+
+import sys
+import time
+
+import mock_xbmc
+import xbmcgui
+import xbmcplugin
+
+import yawsp
+from listing import Listing
+
+ITEMS = 1000
+ROUNDS = 5
+CALLS = [0]
+COST = [0.0]
+
+
+def crossing(fn):
+    def call(*args, **kwargs):
+        CALLS[0] += 1
+        if COST[0]:
+            deadline = time.perf_counter() + COST[0]
+            while time.perf_counter() < deadline:
+                pass
+        return fn(*args, **kwargs)
+    return call
+
+
+def instrument():
+    for name in ('addDirectoryItem', 'addDirectoryItems', 'addSortMethod', 'endOfDirectory', 'setContent'):
+        setattr(mock_xbmc.MockXBMCPlugin, name, staticmethod(crossing(getattr(mock_xbmc.MockXBMCPlugin, name))))
+    for name in ('setInfo', 'setArt', 'setProperty', 'addContextMenuItems'):
+        setattr(mock_xbmc.MockListItem, name, crossing(getattr(mock_xbmc.MockListItem, name)))
+    mock_xbmc.MockAddon.getLocalizedString = crossing(mock_xbmc.MockAddon.getLocalizedString)
+    mock_xbmc.MockXBMCGui.ListItem = staticmethod(crossing(mock_xbmc.MockXBMCGui.ListItem))
+
+
+def files():
+    return [{'ident': 'id%05d' % i, 'name': 'Some.Movie.%d.2019.1080p.mkv' % i, 'size': str(1500000000 + i)}
+            for i in range(ITEMS)]
+
+
+def per_item(items):
+    """How the views listed files before: commands and a Kodi call per item."""
+    for file in items:
+        label = yawsp.labelize(file)
+        listitem = xbmcgui.ListItem(label=label)
+        listitem.setInfo('video', {'title': label})
+        listitem.setProperty('IsPlayable', 'true')
+        commands = []
+        commands.append((yawsp._addon.getLocalizedString(30211), 'RunPlugin(' + yawsp.get_url(action='info', ident=file['ident']) + ')'))
+        commands.append((yawsp._addon.getLocalizedString(30212), 'RunPlugin(' + yawsp.get_url(action='download', ident=file['ident']) + ')'))
+        commands.append((yawsp._addon.getLocalizedString(30214), 'Container.Update(' + yawsp.get_url(action='history', toqueue=file['ident']) + ')'))
+        listitem.addContextMenuItems(commands)
+        xbmcplugin.addDirectoryItem(1, yawsp.get_url(action='play', ident=file['ident'], name=file['name']), listitem, False)
+    xbmcplugin.endOfDirectory(1)
+
+
+def batched(items):
+    listing = Listing(1, 'videos')
+    enqueue = yawsp._addon.getLocalizedString(30214)
+    for file in items:
+        commands = [(enqueue, 'Container.Update(' + yawsp.get_url(action='history', toqueue=file['ident']) + ')')]
+        listing.add(yawsp.get_url(action='play', ident=file['ident'], name=file['name']), yawsp.tolistitem(file, commands), False)
+    listing.finish()
+
+
+def measure(fn, items):
+    times = []
+    for _ in range(ROUNDS):
+        del yawsp._file_commands[:]
+        CALLS[0] = 0
+        started = time.perf_counter()
+        fn(items)
+        times.append((time.perf_counter() - started) * 1000)
+    return sorted(times)[len(times) // 2], CALLS[0]
+
+
+def main():
+    cost = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    instrument()
+    items = files()
+    print('%d items, median of %d runs' % (ITEMS, ROUNDS))
+    print('%-28s %12s %12s %16s' % ('listing', 'Kodi calls', 'ms (0 us)', 'ms (%g us/call)' % cost))
+    for name, fn in (('addDirectoryItem per item', per_item), ('Listing.addDirectoryItems', batched)):
+        COST[0] = 0
+        bare, calls = measure(fn, items)
+        COST[0] = cost / 1e6
+        loaded, calls = measure(fn, items)
+        print('%-28s %12d %12.1f %16.1f' % (name, calls, bare, loaded))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Cost of the login derivation: md5crypt before and after the bytes rewrite.
+
+legacy_md5crypt is the previous implementation (its Python 3 path), kept
+here for comparison. Both are checked to agree on random passwords, then
+timed, together with yawsp.credentials() cold and from its profile cache.
+Run from the repository root: python -m tools.bench_md5crypt [rounds]
+"""
+
+import hashlib
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+import mock_xbmc
+
+import md5crypt
+import yawsp
+
+ITOA64 = md5crypt.ITOA64
+
+
+def legacy_to64(v, n):
+    ret = ''
+    while (n - 1 >= 0):
+        n = n - 1
+        ret = ret + ITOA64[v & 0x3f]
+        v = v >> 6
+    return ret
+
+
+def legacy_md5crypt(pw, salt, magic='$1$'):
+    salt = salt.decode("utf-8").split('$', 1)[0].encode("utf-8")[:8]
+    ctx = pw + magic.encode("utf-8") + salt
+    final = hashlib.md5(pw + salt + pw).digest()
+    for pl in range(len(pw), 0, -16):
+        if pl > 16:
+            ctx = ctx + final[:16]
+        else:
+            ctx = ctx + final[:pl]
+    i = len(pw)
+    while i:
+        if i & 1:
+            ctx = ctx + chr(0).encode("utf-8")
+        else:
+            ctx = ctx + chr(pw[0]).encode("utf-8")
+        i = i >> 1
+    final = hashlib.md5(ctx).digest()
+    for i in range(1000):
+        ctx1 = ''.encode("utf-8")
+        if i & 1:
+            ctx1 = ctx1 + pw
+        else:
+            ctx1 = ctx1 + final[:16]
+        if i % 3:
+            ctx1 = ctx1 + salt
+        if i % 7:
+            ctx1 = ctx1 + pw
+        if i & 1:
+            ctx1 = ctx1 + final[:16]
+        else:
+            ctx1 = ctx1 + pw
+        final = hashlib.md5(ctx1).digest()
+    passwd = ''
+    passwd = passwd + legacy_to64((int(final[0]) << 16) | (int(final[6]) << 8) | (int(final[12])), 4)
+    passwd = passwd + legacy_to64((int(final[1]) << 16) | (int(final[7]) << 8) | (int(final[13])), 4)
+    passwd = passwd + legacy_to64((int(final[2]) << 16) | (int(final[8]) << 8) | (int(final[14])), 4)
+    passwd = passwd + legacy_to64((int(final[3]) << 16) | (int(final[9]) << 8) | (int(final[15])), 4)
+    passwd = passwd + legacy_to64((int(final[4]) << 16) | (int(final[10]) << 8) | (int(final[5])), 4)
+    passwd = passwd + legacy_to64((int(final[11])), 2)
+    return magic + salt.decode("utf-8") + '$' + passwd
+
+
+def timed(fn, rounds):
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rnd = random.Random(1)
+    for _ in range(200):
+        pw = ''.join(rnd.choice(string.printable[:94]) for _ in range(rnd.randint(1, 40))).encode('utf-8')
+        salt = ''.join(rnd.choice(ITOA64) for _ in range(8)).encode('utf-8')
+        assert legacy_md5crypt(pw, salt) == md5crypt.md5crypt(pw, salt), (pw, salt)
+
+    profile = tempfile.mkdtemp()
+    saved = yawsp._profile
+    yawsp._profile = profile
+    path = os.path.join(profile, yawsp.CREDENTIALS)
+
+    def cold():
+        if os.path.exists(path):
+            os.remove(path)
+        yawsp.credentials('user', 'correct horse battery', 'Ab3dEf9h')
+
+    cases = [
+        ('md5crypt, previous', lambda: legacy_md5crypt(b'correct horse battery', b'Ab3dEf9h')),
+        ('md5crypt, bytes rewrite', lambda: md5crypt.md5crypt(b'correct horse battery', b'Ab3dEf9h')),
+        ('credentials(), derived and stored', cold),
+        ('credentials(), from the profile', lambda: yawsp.credentials('user', 'correct horse battery', 'Ab3dEf9h')),
+    ]
+    try:
+        print('%-36s %10s' % ('step', 'median ms'))
+        for name, fn in cases:
+            print('%-36s %10.3f' % (name, timed(fn, rounds)))
+    finally:
+        yawsp._profile = saved
+        shutil.rmtree(profile)
+
+
+if __name__ == '__main__':
+    main()
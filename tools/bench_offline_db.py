@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Per-click latency of the offline database: JSON files vs. the SQLite index.
+
+Builds a synthetic archive shaped like the backup database (categories of
+items with title, plot and a few streams) and times what one click costs
+in a fresh plugin call: listing a category, opening one item and searching.
+Run from the repository root: python -m tools.bench_offline_db [items_in_biggest_category]
+"""
+
+import io
+import json
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+import zipfile
+
+import offline_db
+
+WORDS = []
+ROUNDS = 5
+PAGE = 100
+VOCABULARY = 30000
+
+
+def vocabulary(rnd):
+    return [''.join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(3, 9)))
+            for _ in range(VOCABULARY)]
+
+
+def words(rnd, count):
+    # a few words are common, most are rare, like in real titles and plots
+    return ' '.join(WORDS[min(int(rnd.paretovariate(0.8)) - 1, VOCABULARY - 1)] for _ in range(count))
+
+
+def make_category(rnd, count):
+    data = []
+    for i in range(count):
+        data.append({
+            'id': 'k%06d' % i,
+            'title': words(rnd, 3).title(),
+            'plot': words(rnd, 60),
+            'streams': [{'ident': ''.join(rnd.choice(string.ascii_letters) for _ in range(10)),
+                         'quality': rnd.choice(['720p', '1080p', '2160p']), 'lang': 'CZ',
+                         'ainfo': ', DTS', 'size': '%d GB' % rnd.randint(1, 40)} for _ in range(3)]})
+    return {'data': data}
+
+
+def timed(fn):
+    times = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    biggest = int(sys.argv[1]) if len(sys.argv) > 1 else 40000
+    rnd = random.Random(1)
+    WORDS[:] = vocabulary(rnd)
+    sizes = {'movies.json': biggest, 'series.json': biggest // 2, 'kids.json': biggest // 8,
+             'docs.json': biggest // 8, 'concerts.json': biggest // 20}
+    profile = tempfile.mkdtemp()
+    archive = os.path.join(profile, offline_db.ARCHIVE)
+    folder = os.path.join(profile, offline_db.FOLDER)
+    os.makedirs(folder)
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, count in sizes.items():
+            body = json.dumps(make_category(rnd, count))
+            zf.writestr('db/' + name, body)
+            with io.open(os.path.join(folder, name), 'w', encoding='utf8') as file:
+                file.write(body)
+
+    started = time.perf_counter()
+    offline_db.build_index(offline_db.DbArchive(archive), os.path.join(profile, offline_db.INDEX))
+    build = time.perf_counter() - started
+
+    category = 'movies.json'
+    key = 'k%06d' % (biggest - 1)  # the linear scan walks the whole list
+    files = offline_db.DbFolder(folder)
+    packed = offline_db.DbArchive(archive)
+
+    def indexed_list():
+        db = offline_db.open_db(profile)
+        db.items(category)
+        db.close()
+
+    def indexed_page(offset):
+        db = offline_db.open_db(profile)
+        db.count(category)
+        db.items(category, offset, PAGE)
+        db.close()
+
+    def indexed_jump():
+        db = offline_db.open_db(profile)
+        letters = db.letters(category)
+        db.items(category, db.position(category, letters[len(letters) // 2]), PAGE)
+        db.close()
+
+    def indexed_item():
+        db = offline_db.open_db(profile)
+        db.item(category, key)
+        db.close()
+
+    def scan_search(query):
+        # what finding a title cost before: every category parsed and scanned
+        words = query.split()
+        return [x for name in files.names() for x in files.load(name)
+                if all(w in (x['title'] + ' ' + x['plot']).lower() for w in words)]
+
+    def indexed_search(query):
+        db = offline_db.open_db(profile)
+        found = db.search(query)
+        db.close()
+        return found
+
+    sample = packed.load(category)[biggest // 2]
+    rare = ' '.join(sample['title'].lower().split()[:2])
+    common = WORDS[0] + ' ' + WORDS[1]
+
+    cases = [
+        ('list category, extracted JSON', lambda: files.load(category)),
+        ('list category, JSON from zip', lambda: offline_db.DbArchive(archive).load(category)),
+        ('list category, SQLite', indexed_list),
+        ('list first page, SQLite', lambda: indexed_page(0)),
+        ('list page at %d, SQLite' % (biggest * 3 // 4), lambda: indexed_page(biggest * 3 // 4)),
+        ('jump to letter, SQLite', indexed_jump),
+        ('open item, extracted JSON scan', lambda: next(x for x in files.load(category) if x['id'] == key)),
+        ('open item, JSON from zip scan', lambda: next(x for x in packed.load(category) if x['id'] == key)),
+        ('open item, SQLite', indexed_item),
+        ('search "%s", JSON scan' % rare, lambda: scan_search(rare)),
+        ('search "%s", SQLite' % rare, lambda: indexed_search(rare)),
+        ('search "%s", JSON scan' % common, lambda: scan_search(common)),
+        ('search "%s", SQLite' % common, lambda: indexed_search(common)),
+        ('search prefix "%s", SQLite' % WORDS[5][:2], lambda: indexed_search(WORDS[5][:2])),
+        ('search rare word "%s", SQLite' % WORDS[-1], lambda: indexed_search(WORDS[-1])),
+    ]
+    mb = 1024.0 * 1024
+    print('%d items in %d categories, biggest %d' % (sum(sizes.values()), len(sizes), biggest))
+    print('archive %.1f MB, extracted %.1f MB, index %.1f MB, index built in %.2f s' % (
+        os.path.getsize(archive) / mb,
+        sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder)) / mb,
+        os.path.getsize(os.path.join(profile, offline_db.INDEX)) / mb, build))
+    print('%-44s %10s' % ('click', 'median ms'))
+    for name, fn in cases:
+        print('%-44s %10.1f' % (name, timed(fn)))
+    shutil.rmtree(profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""End-to-end latency and request count of every router() action.
+
+Runs yawsp on mock_xbmc against tools.mock_webshare.WebshareStub with a fixed
+latency per API call and drives each action the way a click would: one
+router() call with the plugin URL's query. Settings are the defaults of
+resources/settings.xml, the Trakt client id is left empty so the Trakt
+listings make no calls outside of this machine.
+Run from the repository root: python -m tools.bench_routes [latency_ms]
+"""
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from xml.etree import ElementTree as ET
+
+import mock_xbmc
+
+import yawsp
+from tools.mock_webshare import WebshareStub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def catalogue():
+    files = []
+    for season in (1, 2):
+        for episode in range(1, 9):
+            for quality, size in (('720p', 900), ('1080p', 2100)):
+                files.append({'ident': 'dark%d%02d%s' % (season, episode, quality),
+                              'name': 'Dark.S%02dE%02d.%s.CZ.mkv' % (season, episode, quality),
+                              'size': str(size * 1024 * 1024)})
+    for quality, size in (('720p', 1400), ('1080p', 4300)):
+        files.append({'ident': 'pelisky' + quality, 'name': 'Pelisky.1999.%s.CZ.mkv' % quality,
+                      'size': str(size * 1024 * 1024)})
+    for i in range(400):
+        files.append({'ident': 'video%03d' % i, 'name': 'Home.Video.%03d.mp4' % i, 'size': str(i * 1000000)})
+    return files
+
+
+def archive():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('db/movies.json', json.dumps({'data': [
+            {'id': str(i), 'title': 'Movie %d' % i, 'streams': [
+                {'ident': 'video%03d' % i, 'quality': '1080p', 'lang': 'CZ', 'ainfo': '', 'size': '1 GB'}]}
+            for i in range(300)]}))
+    return buf.getvalue()
+
+
+def defaults():
+    settings = {}
+    for setting in ET.parse(os.path.join(ROOT, 'resources', 'settings.xml')).iter('setting'):
+        if setting.get('id'):
+            settings[setting.get('id')] = setting.get('default', '')
+    return settings
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+    stub = WebshareStub(catalogue(), latency=latency / 1000.0).start()
+    stub.blobs[yawsp.BACKUP_DB] = archive()
+    stub.queue.extend(['video%03d' % i for i in range(20)])
+    for i in range(60):
+        stub.downloaded('video%03d' % (i % 40))
+
+    profile = tempfile.mkdtemp()
+    folder = os.path.join(profile, 'downloads')
+    os.makedirs(folder)
+    addon = yawsp._addon
+    addon.settings = defaults()
+    addon.settings.update(wsuser='user', wspass='password', token='', dfolder=folder, trakt_client_id='')
+    yawsp.API, yawsp._profile = stub.url, os.path.join(profile, 'addon')
+
+    cases = [
+        ('main menu, first login', ''),
+        ('main menu', ''),
+        ('search', 'action=search'),
+        ('search results', 'action=search&what=video'),
+        ('search next page', 'action=search&what=video&offset=25'),
+        ('search, queue a file', 'action=search&what=video&offset=0&toqueue=video100&name=Home.Video.100.mp4&size=100000000'),
+        ('queue', 'action=queue'),
+        ('queue again', 'action=queue'),
+        ('queue, dequeue', 'action=queue&dequeue=video001'),
+        ('queue, refresh', 'action=queue&refresh=1'),
+        ('history', 'action=history'),
+        ('history, remove', 'action=history&remove=video005'),
+        ('history next page', 'action=history&offset=25'),
+        ('info', 'action=info&ident=pelisky1080p'),
+        ('play', 'action=play&ident=pelisky1080p&name=Pelisky'),
+        ('play again, cached link', 'action=play&ident=pelisky1080p&name=Pelisky'),
+        ('download', 'action=download&ident=pelisky720p'),
+        ('downloads', 'action=downloads'),
+        ('settings', 'action=settings'),
+        ('diagnostics', 'action=diagnostics'),
+        ('diagnostics, export', 'action=diagnostics&export=1'),
+        ('offline db, download', 'action=db'),
+        ('offline db, category', 'action=db&file=movies.json'),
+        ('offline db, item', 'action=db&file=movies.json&key=5'),
+        ('series search', 'action=series_search&series_name=Dark'),
+        ('series', 'action=series'),
+        ('series detail', 'action=series_detail&series_name=Dark'),
+        ('series season', 'action=series_season&series_name=Dark&season=1'),
+        ('series refresh', 'action=series_refresh&series_name=Dark'),
+        ('series download season', 'action=series_download&series_name=Dark&season=2'),
+        ('series trending (Trakt off)', 'action=series_trending'),
+        ('series popular (Trakt off)', 'action=series_popular'),
+        ('movie search', 'action=movie_search&movie_name=Pelisky'),
+        ('movie', 'action=movie'),
+        ('movie detail', 'action=movie_detail&movie_name=Pelisky'),
+        ('movie refresh', 'action=movie_refresh&movie_name=Pelisky'),
+        ('movie trending (Trakt off)', 'action=movie_trending'),
+        ('movie popular (Trakt off)', 'action=movie_popular'),
+        ('expired token, queue', 'action=queue&refresh=1'),
+    ]
+    covered = set()
+    print('latency %.0f ms per API call' % latency)
+    print('%-34s %9s %5s  %s' % ('click', 'ms', 'calls', 'API calls'))
+    try:
+        for name, query in cases:
+            if name.startswith('expired token'):
+                stub.expire_tokens()
+            covered.add(dict(yawsp.parse_qsl(query)).get('action', ''))
+            since = len(stub.calls)
+            started = time.perf_counter()
+            yawsp.router(query)
+            elapsed = (time.perf_counter() - started) * 1000
+            counts = stub.counts(since)
+            print('%-34s %9.1f %5d  %s' % (name, elapsed, sum(counts.values()),
+                                           ', '.join('%s %d' % item for item in sorted(counts.items()))))
+        missing = sorted(set(yawsp.ROUTES) - covered)
+        if missing:
+            print('not driven: ' + ', '.join(missing))
+    finally:
+        stub.stop()
+        shutil.rmtree(profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Series and movie search: accuracy against request cost, per strategy.
+
+Replays recorded Webshare search responses to SeriesManager.search_series
+and MovieManager.search_movie and scores what they would store against
+labelled ground truth. A strategy is the managers with other search
+settings (query spellings, season queries, paging cap, file scoring), so
+a change that saves requests can be checked for the mappings it loses.
+
+A fixture is JSON:
+
+    {"responses": {query: {"total": n, "files": [{"ident", "name", "size"}, ...]}},
+     "truth": {"series": {title: {"S01E01": [ident, ...], ...}},
+               "movies": {title: [ident, ...]}}}
+
+responses hold the files Webshare returned for a query, newest first, as
+deep as any strategy paged. truth lists the files that really are the
+episode or the movie, the one a user would pick first. --record fills in
+the responses for the titles of a fixture from the live API (log in with
+WEBSHARE_USERNAME and WEBSHARE_PASSWORD), the truth is labelled by hand.
+Without a fixture a synthetic sample is used.
+Run from the repository root: python -m tools.bench_search_quality [fixture.json] [--record fixture.json]
+"""
+
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from xml.etree import ElementTree as ET
+
+import mock_xbmc
+
+from tools.mock_webshare import WebshareStub, element, filexml
+from movie_manager import MovieManager
+from series_manager import SeriesManager
+
+Reply = namedtuple('Reply', 'content')
+
+COLUMNS = ('requests', 'correct', 'best', 'wrong', 'missed')
+
+
+def as_typed(self, name):
+    return {name}
+
+
+def dotted(self, name):
+    return {name.replace(' ', '.')}
+
+
+def largest(self, filename, file_size):
+    return int(file_size or 0)
+
+
+# name, attributes of both managers
+STRATEGIES = [
+    ('current', {}),
+    ('one page per query', {'SEARCH_MAX_RESULTS': 100}),
+    ('deeper paging', {'SEARCH_MAX_RESULTS': 1000}),
+    ('name as typed only', {'_base_variations': as_typed}),
+    ('dotted name only', {'_base_variations': dotted}),
+    ('no season queries', {'SEARCH_SEASONS': ()}),
+    ('as typed, no seasons', {'_base_variations': as_typed, 'SEARCH_SEASONS': ()}),
+    ('largest file first', {'_calculate_file_score': largest}),
+]
+
+
+class Replay:
+    """api() stand-in answering search from recorded responses."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = 0
+        self.unrecorded = set()
+
+    def __call__(self, fnct, data):
+        self.calls += 1
+        query = data.get('what', '')
+        offset, limit = int(data.get('offset') or 0), int(data.get('limit') or 25)
+        entry = self.responses.get(query)
+        if entry is None or len(entry['files']) < min(offset + limit, entry['total']):
+            self.unrecorded.add(query)
+        files = entry['files'][offset:offset + limit] if entry else []
+        total = entry['total'] if entry else 0
+        return Reply(('<?xml version="1.0" encoding="UTF-8"?><response><status>OK</status>%s%s</response>'
+                      % (element('total', total), ''.join(filexml(f) for f in files))).encode('utf-8'))
+
+
+class Recorder:
+    """api() wrapper keeping the search pages it passes on."""
+
+    def __init__(self, responses, api):
+        self.responses = responses
+        self.api = api
+
+    def __call__(self, fnct, data):
+        response = self.api(fnct, data)
+        xml = ET.fromstring(response.content)
+        if fnct == 'search' and xml.find('status').text == 'OK':
+            entry = self.responses.setdefault(data['what'], {'total': 0, 'files': []})
+            entry['total'] = int(xml.find('total').text)
+            # pages are asked for from offset 0 on, keep the ones past what we have
+            if int(data.get('offset') or 0) == len(entry['files']):
+                entry['files'].extend(dict((e.tag, e.text) for e in file) for file in xml.iter('file'))
+        return response
+
+
+def managers(attributes, profile):
+    series = type('Series', (SeriesManager,), dict(attributes))(None, profile)
+    movies = type('Movies', (MovieManager,), dict(attributes))(None, profile)
+    return series, movies
+
+
+def run(attributes, truth, api, token, profile):
+    """Search every title of truth, yield (kind, title, stored data)."""
+    series, movies = managers(attributes, profile)
+    for title in truth.get('series', {}):
+        yield 'series', title, series.search_series(title, api, token)
+    for title in truth.get('movies', {}):
+        yield 'movies', title, movies.search_movie(title, api, token)
+
+
+def score(kind, data, labels):
+    if kind == 'movies':
+        ident = (data['file'] or {}).get('ident')
+        found = {'movie': ident} if ident else {}
+        labels = {'movie': labels}
+    else:
+        found = dict(('S%02dE%02d' % (int(season), int(episode)), file['ident'])
+                     for season, episodes in data['seasons'].items() for episode, file in episodes.items())
+    correct = [key for key, ident in found.items() if ident in labels.get(key, ())]
+    return {
+        'correct': len(correct),
+        'best': sum(1 for key in correct if labels[key][0] == found[key]),
+        'wrong': len(found) - len(correct),
+        'missed': len(set(labels) - set(found)),
+    }
+
+
+def evaluate(fixture, strategies=STRATEGIES):
+    """One row per strategy and title: requests, correct, best, wrong, missed."""
+    rows = []
+    profile = tempfile.mkdtemp()
+    try:
+        for name, attributes in strategies:
+            replay = Replay(fixture['responses'])
+            calls = 0
+            started = time.perf_counter()
+            for kind, title, data in run(attributes, fixture['truth'], replay, 'token', profile):
+                row = dict(score(kind, data, fixture['truth'][kind][title]), strategy=name, title=title,
+                           requests=replay.calls - calls, ms=(time.perf_counter() - started) * 1000)
+                rows.append(row)
+                calls, started = replay.calls, time.perf_counter()
+            if replay.unrecorded:
+                rows[-1]['unrecorded'] = sorted(replay.unrecorded)
+    finally:
+        shutil.rmtree(profile)
+    return rows
+
+
+def record(fixture, api, token, strategies=STRATEGIES):
+    """Fill in the responses every strategy asks for."""
+    profile = tempfile.mkdtemp()
+    try:
+        recorder = Recorder(fixture.setdefault('responses', {}), api)
+        for name, attributes in strategies:
+            for result in run(attributes, fixture['truth'], recorder, token, profile):
+                pass
+    finally:
+        shutil.rmtree(profile)
+    return fixture
+
+
+def sample():
+    """Synthetic catalogue with look-alike titles, answered like the stub does."""
+    rnd = random.Random(49)
+    files = []
+    truth = {'series': {'Dark': {}, 'The Last of Us': {}}, 'movies': {'Pelisky': [], 'Dune': []}}
+
+    def add(name, size, labels=None):
+        ident = 'w%05d' % len(files)
+        files.append({'ident': ident, 'name': name, 'size': str(size * 1024 * 1024)})
+        if labels is not None:
+            labels.append(ident)
+
+    releases = {
+        'Dark': ('Dark.S%02dE%02d.1080p.CZ.dabing.mkv', 'Dark.S%02dE%02d.720p.WEB.EN.mkv',
+                 'Dark %dx%02d CZ titulky.avi'),
+        'The Last of Us': ('The.Last.of.Us.S%02dE%02d.2160p.CZ.mkv', 'The_Last_of_Us_S%02dE%02d_720p.mkv',
+                           'The Last of Us - %dx%02d - EN.avi'),
+    }
+    for title, seasons in (('Dark', (10, 8, 8)), ('The Last of Us', (9, 7))):
+        for season, count in enumerate(seasons, 1):
+            for episode in range(1, count + 1):
+                labels = truth['series'][title]['S%02dE%02d' % (season, episode)] = []
+                for pattern in releases[title]:
+                    if pattern is releases[title][0] or rnd.random() < 0.6:
+                        add(pattern % (season, episode), rnd.randint(400, 4000), labels)
+    # look-alikes that match the titles too
+    for episode in range(1, 14):
+        add('Dark.Matter.S01E%02d.720p.mkv' % episode, 900)
+        add('Into.the.Dark.S01E%02d.CZ.mkv' % episode, 1200)
+    for episode in range(1, 66):
+        add('Darkwing.Duck.S01E%02d.CZ.avi' % episode, 200)
+    for part in range(1, 240):
+        add('Dark.Souls.III.gameplay.part.%03d.mp4' % part, 300)
+    for part in range(1, 40):
+        add('The.Last.of.Us.Part.II.walkthrough.%02d.mp4' % part, 700)
+
+    for name, size in (('Pelisky.1999.1080p.CZ.mkv', 4300), ('Pelisky (1999) CZ dabing 720p.avi', 1400),
+                       ('Pelisky.1999.DVDRip.avi', 700)):
+        add(name, size, truth['movies']['Pelisky'])
+    add('Pelisky.zakulisi.dokument.CZ.mp4', 300)
+    for name, size in (('Dune.2021.1080p.CZ.mkv', 5200), ('Dune.2021.2160p.EN.mkv', 16000)):
+        add(name, size, truth['movies']['Dune'])
+    add('Dune.Part.Two.2024.1080p.CZ.dabing.mkv', 6100)
+    add('Dune.1984.CZ.avi', 1400)
+    rnd.shuffle(files)
+
+    stub = WebshareStub(files)
+
+    def api(fnct, data):
+        return Reply(('<response><status>OK</status>%s</response>' % stub.api_search(data)).encode('utf-8'))
+    return record({'truth': truth}, api, 'token')
+
+
+def live(path):
+    import yawsp
+    profile = tempfile.mkdtemp()
+    yawsp._profile = profile
+    yawsp._addon.settings.update(wsuser=os.getenv('WEBSHARE_USERNAME', ''),
+                                 wspass=os.getenv('WEBSHARE_PASSWORD', ''), token='')
+    try:
+        token = yawsp.revalidate()
+        if not token:
+            sys.exit('login failed, set WEBSHARE_USERNAME and WEBSHARE_PASSWORD')
+        with open(path) as f:
+            fixture = json.load(f)
+        record(fixture, yawsp.api, token)
+        with open(path, 'w') as f:
+            json.dump(fixture, f, indent=1, sort_keys=True)
+        print('recorded %d queries to %s' % (len(fixture['responses']), path))
+    finally:
+        shutil.rmtree(profile)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--record':
+        return live(sys.argv[2])
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            fixture = json.load(f)
+    else:
+        fixture = sample()
+    rows = evaluate(fixture)
+    print('%-28s %-16s %8s %7s %5s %5s %6s %8s' % (('strategy', 'title') + COLUMNS + ('ms',)))
+    for row in rows:
+        print('%-28s %-16s %8d %7d %5d %5d %6d %8.1f' % ((row['strategy'], row['title'])
+                                                         + tuple(row[c] for c in COLUMNS) + (row['ms'],)))
+    print()
+    labelled = sum(len(labels) if kind == 'series' else 1
+                   for kind, titles in fixture['truth'].items() for labels in titles.values())
+    print('%-28s %8s %7s %5s %5s %6s  of %d labelled' % (('total',) + COLUMNS + (labelled,)))
+    for name, attributes in STRATEGIES:
+        mine = [row for row in rows if row['strategy'] == name]
+        print('%-28s %8d %7d %5d %5d %6d' % ((name,) + tuple(sum(row[c] for row in mine) for c in COLUMNS)))
+        unrecorded = [query for row in mine for query in row.get('unrecorded', ())]
+        if unrecorded:
+            print('    not recorded, answered empty: ' + ', '.join(unrecorded))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Single vs. segmented adaptive downloads against a bandwidth limited server.
+
+The local server limits every connection (like a CDN does per stream) and
+the whole server (like the line does). The first case is what segments
+help with, the second shows the downloader stops adding connections which
+only compete for the same line.
+Run from the repository root: python -m tools.bench_segmented [size_mb]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import requests
+
+import downloader
+from downloader import MB
+from ratelimit import TokenBucket
+
+BLOCK = 64 * 1024
+
+
+class LimitedServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class LimitedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        data = self.server.data
+        start, end = 0, len(data) - 1
+        header = self.headers.get('Range')
+        if header:
+            first, last = header.split('=', 1)[1].split('-')
+            start = int(first)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        connection = TokenBucket(self.server.per_connection, self.server.per_connection / 10)
+        view = memoryview(data)
+        try:
+            for pos in range(start, end + 1, BLOCK):
+                block = view[pos:min(pos + BLOCK, end + 1)]
+                connection.acquire(len(block))
+                self.server.line.acquire(len(block))
+                self.wfile.write(block)
+        except (IOError, OSError):
+            pass
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(url, folder, connections):
+    path = os.path.join(folder, 'file.mkv')
+    dl = downloader.Download(requests.Session(), lambda fresh: url, path, 'bench',
+                             connections=connections)
+    started = time.perf_counter()
+    size = dl.run()
+    seconds = time.perf_counter() - started
+    os.remove(path)
+    return size, seconds, max(dl.peak_connections, 1)
+
+
+def main():
+    size = int(sys.argv[1]) * MB if len(sys.argv) > 1 else 192 * MB
+    data = os.urandom(size)
+    folder = tempfile.mkdtemp()
+    print('File %d MB' % (size // MB))
+    print('%-38s %12s %9s %8s %12s' % ('server limits', 'connections', 'seconds', 'MB/s', 'peak conns'))
+    for per_connection, line in ((4 * MB, 24 * MB), (16 * MB, 16 * MB)):
+        server = LimitedServer(('127.0.0.1', 0), LimitedHandler)
+        server.data = data
+        server.per_connection = per_connection
+        server.line = TokenBucket(line, line / 10)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:%d/file.mkv' % server.server_address[1]
+        limits = '%d MB/s per conn, %d MB/s total' % (per_connection // MB, line // MB)
+        for connections in (1, 4, 8):
+            got, seconds, peak = run(url, folder, connections)
+            assert got == size
+            label = 'single' if connections == 1 else 'up to %d' % connections
+            print('%-38s %12s %9.1f %8.1f %12d' % (limits, label, seconds, size / MB / seconds, peak))
+        server.shutdown()
+    shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time-to-first-frame and seek latency, direct vs. through the stream proxy.
+
+A local HTTP server stands in for Webshare: it supports Range requests and
+adds a fixed delay to every new request to mimic the round trips of a
+remote connection. After a seek to the middle the player keeps playing
+for a moment, then skips forward and back by a few MB like a player does
+on short seeks and after reconnects.
+Run from the repository root: python -m tools.bench_stream_proxy [latency_ms]
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import requests
+
+from stream_proxy import StreamProxy, MB
+
+FILE_SIZE = 96 * MB
+FIRST_FRAME = 512 * 1024  # bytes a player needs before it shows a frame
+PLAYED = 0.5  # seconds played after the mid seek, the proxy reads ahead meanwhile
+SKIP = 6 * MB  # a short seek, ~30 s of a 1080p stream
+ROUNDS = 5
+
+
+class OriginServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        data = self.server.data
+        start, end = 0, len(data) - 1
+        header = self.headers.get('Range')
+        if header:
+            first, last = header.split('=', 1)[1].split('-')
+            start = int(first)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        view = memoryview(data)
+        try:
+            for pos in range(start, end + 1, 256 * 1024):
+                self.wfile.write(view[pos:min(pos + 256 * 1024, end + 1)])
+        except (IOError, OSError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def timed_read(session, url, start, length):
+    """Open a ranged GET like a player does after a seek and read length bytes."""
+    started = time.perf_counter()
+    response = session.get(url, headers={'Range': 'bytes=%d-' % start}, stream=True)
+    received = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        received += len(chunk)
+        if received >= length:
+            break
+    response.close()
+    return (time.perf_counter() - started) * 1000
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.08
+    origin = OriginServer(('127.0.0.1', 0), OriginHandler)
+    origin.data = os.urandom(FILE_SIZE)
+    origin.latency = latency
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    base = 'http://127.0.0.1:%d/file' % origin.server_address[1]
+
+    proxy = StreamProxy()
+    proxy.start()
+    player = requests.Session()
+
+    results = {}
+    for rnd in range(ROUNDS):
+        url = '%s%d.mkv' % (base, rnd)  # a new file per round, proxy starts cold
+        purl = proxy.url(url)
+        mid = random.randrange(8 * MB, FILE_SIZE - 3 * SKIP)
+        tail = FILE_SIZE - 1 * MB
+        for name, target, start in (
+                ('start, direct', url, 0),
+                ('start, proxy cold', purl, 0),
+                ('start, proxy warm', purl, 0),
+                ('tail seek, direct', url, tail),
+                ('tail seek, proxy cold', purl, tail),
+                ('tail seek, proxy warm', purl, tail),
+                ('mid seek, direct', url, mid),
+                ('mid seek, proxy', purl, mid),
+                (None, None, None),
+                ('skip forward, direct', url, mid + SKIP),
+                ('skip forward, proxy', purl, mid + SKIP),
+                ('skip back, direct', url, mid + SKIP // 2),
+                ('skip back, proxy', purl, mid + SKIP // 2)):
+            if name is None:
+                time.sleep(PLAYED)
+                continue
+            length = min(FIRST_FRAME, FILE_SIZE - start)
+            results.setdefault(name, []).append(timed_read(player, target, start, length))
+
+    print('Origin latency %d ms, file %d MB, first frame %d KB, %d rounds'
+          % (latency * 1000, FILE_SIZE // MB, FIRST_FRAME // 1024, ROUNDS))
+    print('%-24s %10s' % ('case', 'median ms'))
+    for name, values in results.items():
+        print('%-24s %10.1f' % (name, median(values)))
+
+    proxy.stop()
+    origin.shutdown()
+
+
+if __name__ == '__main__':
+    main()
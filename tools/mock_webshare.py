@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Local stand-in for the Webshare XML API, for tests and benchmarks.
+
+Serves salt, login, user_data, search, file_info, file_link, queue,
+queue_file, dequeue_file, history and clear_history on 127.0.0.1 the way
+the plugin calls them (POST /api/<function>/ with form data), plus the
+files behind the links it hands out, with Range support. Every call can
+be delayed by a fixed latency and made to fail on demand.
+
+    stub = WebshareStub(files, users={'joe': 'secret'}, latency=0.05)
+    stub.start()
+    yawsp.API = stub.url
+    ...
+    stub.calls      # [(function, data), ...]
+    stub.stop()
+"""
+
+import hashlib
+import itertools
+import threading
+import time
+import zlib
+from collections import Counter
+from xml.sax.saxutils import escape
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer as ThreadingHTTPServer
+    from urlparse import parse_qs
+
+from md5crypt import md5crypt
+
+REALM = ':Webshare:'
+SALT = 'Ab3dEf9h'
+
+
+def element(tag, value):
+    return '<%s>%s</%s>' % (tag, escape(str(value)), tag)
+
+
+def filexml(file, *extra):
+    fields = [element(key, value) for key, value in file.items() if not isinstance(value, (dict, list))]
+    return '<file>%s%s</file>' % (''.join(fields), ''.join(extra))
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        data = dict((k, v if k.endswith('[]') else v[0]) for k, v in parse_qs(body).items())
+        fnct = self.path.strip('/').split('/')[-1]
+        status, content = stub.call(fnct, data)
+        self.reply(status, content.encode('utf-8'), 'text/xml; charset=UTF-8')
+
+    def do_GET(self):
+        stub = self.server.stub
+        ident = self.path.split('?')[0].rstrip('/').split('/')[-1]
+        with stub.lock:
+            stub.calls.append(('GET', {'ident': ident, 'range': self.headers.get('Range')}))
+            body = stub.blobs.get(ident)
+        if body is None:
+            self.reply(404, b'', 'text/plain')
+            return
+        status, headers = 200, {'ETag': '"%x"' % zlib.crc32(body)}
+        ranges = self.headers.get('Range')
+        if ranges:
+            start, end = ranges.split('=')[1].split('-')
+            if not start:
+                start, end = max(0, len(body) - int(end)), len(body) - 1
+            start, end = int(start), min(int(end or len(body) - 1), len(body) - 1)
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, len(body))
+            status, body = 206, body[start:end + 1]
+        self.reply(status, body, 'application/octet-stream', headers)
+
+    def reply(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebshareStub:
+    """Webshare API state: a catalogue of files, users, queue and history.
+
+    files are dicts with at least ident and name (size, type, img, ...
+    are passed through), users maps username to password.
+    """
+
+    def __init__(self, files=(), users=None, latency=0.0, vip=True):
+        self.files = [dict(file) for file in files]
+        self.by_ident = dict((file['ident'], file) for file in self.files)
+        self.users = users if users is not None else {'user': 'password'}
+        self.latency = latency
+        self.vip = vip
+        self.queue = []
+        self.history = []
+        self.download_ids = itertools.count(1)
+        self.blobs = {}
+        self.tokens = {}
+        self.calls = []
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    # setup
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def base(self):
+        return 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+    @property
+    def url(self):
+        """What to put in place of yawsp.API."""
+        return self.base + 'api/'
+
+    def fail(self, fnct, times=1, http=None):
+        """Let the next calls of fnct fail, with FATAL or with an HTTP status."""
+        with self.lock:
+            self.failures[fnct] = [times, http]
+
+    def expire_tokens(self):
+        with self.lock:
+            self.tokens.clear()
+
+    def downloaded(self, ident, when='2026-10-19 10:00:00'):
+        """Add a history entry, like a finished download does."""
+        with self.lock:
+            self.history.insert(0, {'download_id': str(next(self.download_ids)), 'ident': ident, 'ended_at': when})
+
+    def counts(self, since=0):
+        """Calls per function from the given index of calls on."""
+        with self.lock:
+            return Counter(fnct for fnct, data in self.calls[since:])
+
+    # dispatch
+
+    def call(self, fnct, data):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls.append((fnct, data))
+            failure = self.failures.get(fnct)
+            if failure:
+                failure[0] -= 1
+                if failure[0] <= 0:
+                    del self.failures[fnct]
+                if failure[1]:
+                    return failure[1], ''
+                return 200, self.fatal('FAILED', 'injected failure')
+            handler = getattr(self, 'api_' + fnct, None)
+            if handler is None:
+                return 200, self.fatal('UNKNOWN_FUNCTION', fnct)
+            if fnct not in ('salt', 'login') and data.get('wst') not in self.tokens:
+                return 200, self.fatal('NOT_LOGGED_IN', 'token expired')
+            result = handler(data)
+        if result.startswith('<?xml'):
+            return 200, result
+        return 200, '<?xml version="1.0" encoding="UTF-8"?><response><status>OK</status>%s</response>' % result
+
+    @staticmethod
+    def fatal(code, message):
+        return ('<?xml version="1.0" encoding="UTF-8"?><response><status>FATAL</status>'
+                '<code>%s</code><message>%s</message></response>' % (code, escape(message)))
+
+    # API functions, called with the lock held
+
+    def api_salt(self, data):
+        if data.get('username_or_email') not in self.users:
+            return self.fatal('SALT_FATAL_1', 'user not found')
+        return element('salt', SALT)
+
+    def api_login(self, data):
+        username = data.get('username_or_email')
+        if username not in self.users:
+            return self.fatal('LOGIN_FATAL_1', 'user not found')
+        password = hashlib.sha1(md5crypt(self.users[username].encode('utf-8'), SALT.encode('utf-8')).encode('utf-8')).hexdigest()
+        digest = hashlib.md5((username + REALM + password).encode('utf-8')).hexdigest()
+        if data.get('password') != password or data.get('digest') != digest:
+            return self.fatal('LOGIN_FATAL_3', 'wrong password')
+        token = 'token%d' % (len(self.calls))
+        self.tokens[token] = username
+        return element('token', token)
+
+    def api_user_data(self, data):
+        return element('username', self.tokens[data['wst']]) + element('vip', '1' if self.vip else '0')
+
+    def api_search(self, data):
+        words = data.get('what', '').lower().replace('.', ' ').split()
+        found = [f for f in self.files if all(w in f['name'].lower().replace('.', ' ') for w in words)]
+        if data.get('category') and data['category'] != 'video':
+            found = [f for f in found if f.get('category', 'video') == data['category']]
+        if data.get('sort') in ('largest', 'smallest'):
+            found.sort(key=lambda f: int(f.get('size', 0)), reverse=data['sort'] == 'largest')
+        offset, limit = int(data.get('offset') or 0), int(data.get('limit') or 25)
+        return element('total', len(found)) + ''.join(filexml(f) for f in found[offset:offset + limit])
+
+    def api_file_info(self, data):
+        file = self.by_ident.get(data.get('ident'))
+        if file is None:
+            return self.fatal('FILE_INFO_FATAL_1', 'file not found')
+        info = dict(file, type='mkv', width=1920, height=1080, format='H264', fps=25, bitrate=8000000, removed=0)
+        video = '<video><stream><width>1920</width><height>1080</height><format>H264</format><fps>25</fps></stream></video>'
+        audio = '<audio><stream><format>AC3</format><channels>6</channels><bitrate>448000</bitrate></stream></audio>'
+        return ''.join(element(k, v) for k, v in info.items()) + video + audio
+
+    def api_file_link(self, data):
+        ident = data.get('ident')
+        if ident not in self.by_ident and ident not in self.blobs:
+            return self.fatal('FILE_LINK_FATAL_1', 'file not found')
+        if data.get('download_type') == 'file_download' and ident in self.by_ident:
+            self.history.insert(0, {'download_id': str(next(self.download_ids)), 'ident': ident,
+                                    'ended_at': '2026-10-19 10:00:00'})
+        return element('link', self.base + 'file/' + ident)
+
+    def api_queue(self, data):
+        return element('total', len(self.queue)) + ''.join(filexml(self.by_ident[i]) for i in self.queue)
+
+    def api_queue_file(self, data):
+        if data.get('ident') not in self.by_ident:
+            return self.fatal('QUEUE_FILE_FATAL_1', 'file not found')
+        if data['ident'] not in self.queue:
+            self.queue.append(data['ident'])
+        return ''
+
+    def api_dequeue_file(self, data):
+        if data.get('ident') in self.queue:
+            self.queue.remove(data['ident'])
+        return ''
+
+    def api_history(self, data):
+        files = []
+        for entry in self.history:
+            file = self.by_ident.get(entry['ident'], {'ident': entry['ident'], 'name': entry['ident']})
+            files.append(filexml(dict(file, download_id=entry['download_id'], ended_at=entry['ended_at'])))
+        return element('total', len(files)) + ''.join(files)
+
+    def api_clear_history(self, data):
+        ids = set(data.get('ids[]', []))
+        self.history = [entry for entry in self.history if entry['download_id'] not in ids]
+        return ''
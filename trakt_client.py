@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Module: trakt_client
+# Author: agent
+# Created on: 19.10.2026
+# License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
+
+import calendar
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+import requests
+
+from ratelimit import TokenBucket
+
+BASE_URL = 'https://api.trakt.tv/'
+# Trakt allows 1000 unauthenticated GET calls per 5 minutes
+DEFAULT_RATE = 3.0
+DEFAULT_BURST = 10
+
+
+class TraktError(Exception):
+    """Raised when a Trakt request fails after all retries."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _parse_retry_after(value):
+    """Return seconds to wait from a Retry-After header value."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+def _parse_ratelimit(value):
+    """Return seconds until the window resets if X-Ratelimit says none are left."""
+    if not value:
+        return None
+    try:
+        info = json.loads(value)
+        if int(info.get('remaining', 1)) > 0:
+            return None
+        until = calendar.timegm(time.strptime(info['until'], '%Y-%m-%dT%H:%M:%SZ'))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+    return max(0.0, until - time.time())
+
+
+class TraktClient:
+    """Rate limited Trakt API client.
+
+    Every request takes a token from a client side bucket. Rate limit headers
+    sent by Trakt pause the bucket for all callers, throttled and failed
+    requests are retried with jittered exponential backoff.
+
+    on_request(endpoint, seconds, status, nbytes, retries) is called when
+    a get() ends, status is None when no response came at all.
+    """
+
+    def __init__(self, session, client_id, base_url=BASE_URL, rate=DEFAULT_RATE,
+                 burst=DEFAULT_BURST, max_retries=3, backoff=1.0, max_backoff=30.0,
+                 timeout=10, sleep=time.sleep, on_request=None):
+        self.session = session
+        self.client_id = client_id
+        self.base_url = base_url
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._sleep = sleep
+        self.on_request = on_request
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'retries': 0, 'throttled': 0, 'failures': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def metrics(self):
+        """Return request counters together with queue depth and wait time."""
+        with self._lock:
+            result = dict(self.counters)
+        result['queue_depth'] = self.bucket.waiting
+        result['wait_time'] = round(self.bucket.waited, 3)
+        return result
+
+    def _done(self, endpoint, started, response, attempt):
+        if self.on_request is not None:
+            status = nbytes = None
+            if response is not None:
+                status, nbytes = response.status_code, len(response.content)
+            self.on_request(endpoint, time.time() - started, status, nbytes, attempt)
+
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def get(self, endpoint, params=None):
+        """GET an endpoint and return decoded JSON with response headers."""
+        headers = {
+            'Content-Type': 'application/json',
+            'trakt-api-version': '2',
+            'trakt-api-key': self.client_id,
+        }
+        attempt = 0
+        started = time.time()
+        while True:
+            self.bucket.acquire()
+            self._count('requests')
+            try:
+                response = self.session.get(self.base_url + endpoint, headers=headers,
+                                            params=params or {}, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    self._done(endpoint, started, None, attempt)
+                    raise TraktError(str(e))
+                self._count('retries')
+                self._sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            reset = _parse_ratelimit(response.headers.get('X-Ratelimit'))
+            if reset:
+                self.bucket.pause_for(reset)
+
+            if 200 <= response.status_code < 300:
+                self._done(endpoint, started, response, attempt)
+                return response.json(), response.headers
+
+            if (response.status_code != 429 and response.status_code < 500) or attempt >= self.max_retries:
+                self._count('failures')
+                self._done(endpoint, started, response, attempt)
+                raise TraktError('Trakt API error %d' % response.status_code, response.status_code)
+
+            self._count('retries')
+            if response.status_code == 429:
+                self._count('throttled')
+                delay = _parse_retry_after(response.headers.get('Retry-After'))
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                # other callers would be throttled as well, hold them too
+                self.bucket.pause_for(delay + random.uniform(0, 0.1 * delay))
+            else:
+                self._sleep(self._backoff_delay(attempt))
+            attempt += 1
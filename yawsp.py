@@ -4,36 +4,32 @@
 # Created on: 10.5.2020
 # License: AGPL v.3 https://www.gnu.org/licenses/agpl-3.0.html
 
+import importlib
 import io
 import os
-import sys
 import xbmc
 import xbmcgui
 import xbmcplugin
 import xbmcaddon
 import xbmcvfs
-import requests.cookies
 from xml.etree import ElementTree as ET
-import hashlib
-from md5crypt import md5crypt
+from listing import Listing
 import traceback
 import json
-import unidecode
 import re
-import zipfile
-import uuid
-import requests
-import series_manager
-import movie_manager
+import threading
+import time
 
 # Precompiled regex patterns for performance
 _DIGITS_ONLY_RE = re.compile(r'[^\d]+')
+_UNSAFE_PATH_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
+_API_CODE_RE = re.compile(br'<code>([^<]*)</code>')
 
 try:
-    from urllib import urlencode
+    from urllib import urlencode, quote_plus
     from urlparse import parse_qsl, urlparse
 except ImportError:
-    from urllib.parse import urlencode
+    from urllib.parse import urlencode, quote_plus
     from urllib.parse import parse_qsl, urlparse
 
 try:
@@ -49,14 +45,26 @@ REALM = ':Webshare:'
 CATEGORIES = ['', 'video', 'images', 'audio', 'archives', 'docs', 'adult']
 SORTS = ['', 'recent', 'rating', 'largest', 'smallest']
 SEARCH_HISTORY = 'search_history'
+CREDENTIALS = 'credentials'
 NONE_WHAT = '%#NONE#%'
 BACKUP_DB = 'D1iIcURxlR'
+PLAYING_PROPERTY = 'yawsp.playing'
+PROXY_PROPERTY = 'yawsp.proxy'
+# episode the service prepared and the file it chose for it
+PREPARED_PROPERTY = 'yawsp.prepared'
+# link and headers of a stream the proxy may serve, by its key
+PROXY_LINK_PROPERTY = 'yawsp.proxy.%s'
 
-_url = sys.argv[0]
-_handle = int(sys.argv[1])
 _addon = xbmcaddon.Addon()
-_session = requests.Session()
-_session.headers.update(HEADERS)
+# set by main() for a plugin call, the service and tests have none to answer
+_url = 'plugin://' + _addon.getAddonInfo('id') + '/'
+_handle = -1
+_session = None
+_links = None
+_queue = None
+_metrics = None
+# API calls sent without waiting, joined once the listing is finished
+_background = []
 _profile = translatePath(_addon.getAddonInfo('profile'))
 try:
     _profile = _profile.decode("utf-8")
@@ -64,15 +72,73 @@ except:
     pass
 
 
+def session():
+    """The shared HTTP session, requests is imported with the first one."""
+    global _session
+    if _session is None:
+        import requests
+        _session = requests.Session()
+        _session.headers.update(HEADERS)
+    return _session
+
+
 def get_url(**kwargs):
     return '{0}?{1}'.format(_url, urlencode(kwargs, 'utf-8'))
 
 
+def metrics():
+    """Timing and cache figures of this process, see the diagnostics view."""
+    from metrics import Metrics
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(_profile)
+    return _metrics
+
+
 def api(fnct, data):
-    response = _session.post(API + fnct + "/", data=data)
+    started = time.time()
+    try:
+        response = session().post(API + fnct + "/", data=data)
+    except Exception as e:
+        metrics().record('api/' + fnct, time.time() - started, False, type(e).__name__)
+        raise
+    content = response.content
+    ok = b'<status>OK</status>' in content
+    if response.status_code != 200:
+        status = 'HTTP %d' % response.status_code
+    elif ok:
+        status = 'OK'
+    else:
+        code = _API_CODE_RE.search(content)
+        status = code.group(1).decode('utf-8', 'replace') if code else 'FATAL'
+    metrics().record('api/' + fnct, time.time() - started, ok, status, len(content))
     return response
 
 
+def api_later(fnct, data, done):
+    """Send an API call in a thread, done(xml) runs when it is joined.
+
+    xml is None when the call failed.
+    """
+    result = []
+
+    def call():
+        try:
+            result.append(ET.fromstring(api(fnct, data).content))
+        except Exception:
+            traceback.print_exc()
+    thread = threading.Thread(target=call)
+    thread.start()
+    _background.append((thread, result, done))
+
+
+def join_background():
+    while _background:
+        thread, result, done = _background.pop(0)
+        thread.join()
+        done(result[0] if result else None)
+
+
 def is_ok(xml):
     status = xml.find('status').text
     return status == 'OK'
@@ -82,6 +148,40 @@ def popinfo(message, heading=_addon.getAddonInfo('name'), icon=xbmcgui.NOTIFICAT
     xbmcgui.Dialog().notification(heading, message, icon, time, sound=sound)
 
 
+def credentials(username, password, salt):
+    """Password hash and digest the login sends for this salt.
+
+    md5crypt runs once per username, password and salt, the result is kept
+    in a profile file only the user can read.
+    """
+    import hashlib
+    key = hashlib.sha256('\0'.join((username, password, salt)).encode('utf-8')).hexdigest()
+    path = os.path.join(_profile, CREDENTIALS)
+    try:
+        with io.open(path, 'r', encoding='utf8') as file:
+            cached = json.loads(file.read())
+        if cached['key'] == key:
+            metrics().cache('credentials', True)
+            return cached['password'], cached['digest']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    metrics().cache('credentials', False)
+    from md5crypt import md5crypt
+    encrypted_pass = hashlib.sha1(md5crypt(password.encode('utf-8'), salt.encode('utf-8')).encode('utf-8')).hexdigest()
+    pass_digest = hashlib.md5(username.encode('utf-8') + REALM.encode('utf-8') + encrypted_pass.encode('utf-8')).hexdigest()
+    tmp = path + '.tmp'
+    try:
+        if not os.path.exists(_profile):
+            os.makedirs(_profile)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with io.open(fd, 'w', encoding='utf8') as file:
+            file.write(json.dumps({'key': key, 'password': encrypted_pass, 'digest': pass_digest}))
+        os.replace(tmp, path)
+    except Exception:
+        traceback.print_exc()
+    return encrypted_pass, pass_digest
+
+
 def login():
     username = _addon.getSetting('wsuser')
     password = _addon.getSetting('wspass')
@@ -93,12 +193,7 @@ def login():
     xml = ET.fromstring(response.content)
     if is_ok(xml):
         salt = xml.find('salt').text
-        try:
-            encrypted_pass = hashlib.sha1(md5crypt(password.encode('utf-8'), salt.encode('utf-8'))).hexdigest()
-            pass_digest = hashlib.md5(username.encode('utf-8') + REALM + encrypted_pass.encode('utf-8')).hexdigest()
-        except TypeError:
-            encrypted_pass = hashlib.sha1(md5crypt(password.encode('utf-8'), salt.encode('utf-8')).encode('utf-8')).hexdigest()
-            pass_digest = hashlib.md5(username.encode('utf-8') + REALM.encode('utf-8') + encrypted_pass.encode('utf-8')).hexdigest()
+        encrypted_pass, pass_digest = credentials(username, password, salt)
         response = api('login', {'username_or_email': username, 'password': encrypted_pass, 'digest': pass_digest, 'keep_logged_in': 1})
         xml = ET.fromstring(response.content)
         if is_ok(xml):
@@ -106,6 +201,10 @@ def login():
             _addon.setSetting('token', token)
             return token
         else:
+            try:
+                os.remove(os.path.join(_profile, CREDENTIALS))
+            except OSError:
+                pass
             popinfo(_addon.getLocalizedString(30102), icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
             _addon.openSettings()
     else:
@@ -179,16 +278,22 @@ def labelize(file):
     return label
 
 
+# (label, URL up to the ident) of the commands every file has, built once
+_file_commands = []
+
+
 def tolistitem(file, addcommands=[]):
     label = labelize(file)
-    listitem = xbmcgui.ListItem(label=label)
+    listitem = xbmcgui.ListItem(label=label, offscreen=True)
     if 'img' in file:
         listitem.setArt({'thumb': file['img']})
     listitem.setInfo('video', {'title': label})
     listitem.setProperty('IsPlayable', 'true')
-    commands = []
-    commands.append((_addon.getLocalizedString(30211), 'RunPlugin(' + get_url(action='info', ident=file['ident']) + ')'))
-    commands.append((_addon.getLocalizedString(30212), 'RunPlugin(' + get_url(action='download', ident=file['ident']) + ')'))
+    if not _file_commands:
+        _file_commands.append((_addon.getLocalizedString(30211), 'RunPlugin(' + get_url(action='info', ident='')))
+        _file_commands.append((_addon.getLocalizedString(30212), 'RunPlugin(' + get_url(action='download', ident='')))
+    ident = quote_plus(file['ident'])
+    commands = [(name, prefix + ident + ')') for name, prefix in _file_commands]
     if addcommands:
         commands = commands + addcommands
     listitem.addContextMenuItems(commands)
@@ -270,24 +375,22 @@ def removesearch(what):
                 traceback.print_exc()
 
 
-def dosearch(token, what, category, sort, limit, offset, action):
+def dosearch(listing, token, what, category, sort, limit, offset, action):
     response = api('search',
                    {'what': '' if what == NONE_WHAT else what, 'category': category, 'sort': sort, 'limit': limit, 'offset': offset, 'wst': token, 'maybe_removed': 'true'})
     xml = ET.fromstring(response.content)
     if is_ok(xml):
+        listing.content = 'videos'
 
         if offset > 0:  # prev page
-            listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30206))
-            listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
-            xbmcplugin.addDirectoryItem(_handle, get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset - limit if offset > limit else 0),
-                                        listitem, True)
+            listing.item(_addon.getLocalizedString(30206), get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset - limit if offset > limit else 0), True, icon='DefaultAddonsSearch.png')
 
         for file in xml.iter('file'):
             item = todict(file)
             commands = []
-            commands.append((_addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='search', toqueue=item['ident'], what=what, offset=offset) + ')'))
+            commands.append((_addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='search', toqueue=item['ident'], name=item['name'], size=item.get('size') or '', what=what, offset=offset) + ')'))
             listitem = tolistitem(item, commands)
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='play', ident=item['ident'], name=item['name']), listitem, False)
+            listing.add(get_url(action='play', ident=item['ident'], name=item['name']), listitem, False)
 
         try:
             total = int(xml.find('total').text)
@@ -295,9 +398,7 @@ def dosearch(token, what, category, sort, limit, offset, action):
             total = 0
 
         if offset + limit < total:  # next page
-            listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
-            listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
-            xbmcplugin.addDirectoryItem(_handle, get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset + limit), listitem, True)
+            listing.item(_addon.getLocalizedString(30207), get_url(action=action, what=what, category=category, sort=sort, limit=limit, offset=offset + limit), True, icon='DefaultAddonsSearch.png')
     else:
         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
 
@@ -305,6 +406,7 @@ def dosearch(token, what, category, sort, limit, offset, action):
 def search(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + _addon.getLocalizedString(30201))
     token = revalidate()
+    listing = Listing(_handle)
 
     updateListing = False
 
@@ -313,7 +415,7 @@ def search(params):
         updateListing = True
 
     if 'toqueue' in params:
-        toqueue(params['toqueue'], token)
+        toqueue(params, token)
         updateListing = True
 
     what = None
@@ -343,117 +445,169 @@ def search(params):
         sort = params['sort'] if 'sort' in params else SORTS[int(_addon.getSetting('ssort'))]
         limit = int(params['limit']) if 'limit' in params else int(_addon.getSetting('slimit'))
         offset = int(params['offset']) if 'offset' in params else 0
-        dosearch(token, what, category, sort, limit, offset, 'search')
+        dosearch(listing, token, what, category, sort, limit, offset, 'search')
     else:
         _addon.setSetting('slast', NONE_WHAT)
         history = loadsearch()
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30205))
-        listitem.setArt({'icon': 'DefaultAddSource.png'})
-        xbmcplugin.addDirectoryItem(_handle, get_url(action='search', ask=1), listitem, True)
+        listing.item(_addon.getLocalizedString(30205), get_url(action='search', ask=1), True, icon='DefaultAddSource.png')
 
         # newest
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30208))
-        listitem.setArt({'icon': 'DefaultAddonsRecentlyUpdated.png'})
-        xbmcplugin.addDirectoryItem(_handle, get_url(action='search', what=NONE_WHAT, sort=SORTS[1]), listitem, True)
+        listing.item(_addon.getLocalizedString(30208), get_url(action='search', what=NONE_WHAT, sort=SORTS[1]), True, icon='DefaultAddonsRecentlyUpdated.png')
 
         # biggest
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30209))
-        listitem.setArt({'icon': 'DefaultHardDisk.png'})
-        xbmcplugin.addDirectoryItem(_handle, get_url(action='search', what=NONE_WHAT, sort=SORTS[3]), listitem, True)
+        listing.item(_addon.getLocalizedString(30209), get_url(action='search', what=NONE_WHAT, sort=SORTS[3]), True, icon='DefaultHardDisk.png')
 
         for search in history:
-            listitem = xbmcgui.ListItem(label=search)
+            listitem = xbmcgui.ListItem(label=search, offscreen=True)
             listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
             commands = []
             commands.append((_addon.getLocalizedString(30213), 'Container.Update(' + get_url(action='search', remove=search) + ')'))
             listitem.addContextMenuItems(commands)
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='search', what=search, ask=1), listitem, True)
-    xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
+            listing.add(get_url(action='search', what=search, ask=1), listitem, True)
+    listing.finish(updateListing=updateListing)
 
 
 def queue(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + _addon.getLocalizedString(30202))
     token = revalidate()
+    listing = Listing(_handle, 'videos')
     updateListing = False
 
-    if 'dequeue' in params:
-        response = api('dequeue_file', {'ident': params['dequeue'], 'wst': token})
+    # the mirror is fetched again before a change is applied to it
+    mirror = queuecache()
+    files = None if 'refresh' in params else mirror.files()
+    if 'refresh' not in params:
+        metrics().cache('queue mirror', files is not None)
+    if files is None:
+        response = api('queue', {'wst': token})
         xml = ET.fromstring(response.content)
         if is_ok(xml):
-            popinfo(_addon.getLocalizedString(30106))
+            files = [todict(file) for file in xml.iter('file')]
+            mirror.replace(files)
         else:
             popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+            files = []
+        updateListing = 'refresh' in params
+
+    if 'dequeue' in params:
+        mirror.remove(params['dequeue'])
+        files = [file for file in files if file['ident'] != params['dequeue']]
+        api_later('dequeue_file', {'ident': params['dequeue'], 'wst': token}, queued(30106))
         updateListing = True
 
-    response = api('queue', {'wst': token})
-    xml = ET.fromstring(response.content)
-    if is_ok(xml):
-        for file in xml.iter('file'):
-            item = todict(file)
-            commands = []
-            commands.append((_addon.getLocalizedString(30215), 'Container.Update(' + get_url(action='queue', dequeue=item['ident']) + ')'))
-            listitem = tolistitem(item, commands)
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='play', ident=item['ident'], name=item['name']), listitem, False)
-    else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
-    xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
+    dequeue, refresh = _addon.getLocalizedString(30215), _addon.getLocalizedString(30224)
+    refresh = (refresh, 'Container.Update(' + get_url(action='queue', refresh=1) + ')')
+    for item in files:
+        commands = []
+        commands.append((dequeue, 'Container.Update(' + get_url(action='queue', dequeue=item['ident']) + ')'))
+        commands.append(refresh)
+        listitem = tolistitem(item, commands)
+        listing.add(get_url(action='play', ident=item['ident'], name=item['name']), listitem, False)
+    listing.finish(updateListing=updateListing)
 
 
-def toqueue(ident, token):
-    response = api('queue_file', {'ident': ident, 'wst': token})
-    xml = ET.fromstring(response.content)
-    if is_ok(xml):
-        popinfo(_addon.getLocalizedString(30105))
-    else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+def queuecache():
+    import queue_cache
+    global _queue
+    if _queue is None:
+        try:
+            ttl = int(_addon.getSetting('qcttl')) * 60
+        except ValueError:
+            ttl = 600
+        _queue = queue_cache.QueueCache(_profile, ttl, _addon.getSetting('wsuser'))
+    return _queue
+
+
+def queued(message):
+    """Outcome of a queue change sent in the background, a failure drops the mirror."""
+    def done(xml):
+        if xml is not None and is_ok(xml):
+            popinfo(_addon.getLocalizedString(message))
+        else:
+            queuecache().invalidate()
+            popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+    return done
+
+
+def toqueue(params, token):
+    """Queue the file of a toqueue action, its URL carries name and size for the mirror."""
+    file = {'ident': params['toqueue']}
+    for key in ('name', 'size', 'sizelized'):
+        if params.get(key):
+            file[key] = params[key]
+    queuecache().add(file)
+    api_later('queue_file', {'ident': file['ident'], 'wst': token}, queued(30105))
+
+
+def history_model(xml):
+    """Files of a history response keyed by ident, in history order.
+
+    A file downloaded several times is listed once, 'ids' holds the
+    download_id of every download because clear_history needs all of them.
+    """
+    files = {}
+    for file in xml.iter('file'):
+        ident = file.findtext('ident')
+        item = files.get(ident)
+        if item is None:
+            item = files[ident] = todict(file, ['ended_at', 'download_id', 'started_at'])
+            item['ids'] = []
+        download_id = file.findtext('download_id')
+        if download_id:
+            item['ids'].append(download_id)
+    return files
 
 
 def history(params):
     xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + _addon.getLocalizedString(30203))
     token = revalidate()
+    listing = Listing(_handle, 'videos')
     updateListing = False
 
-    if 'remove' in params:
-        remove = params['remove']
-        updateListing = True
-        response = api('history', {'wst': token})
-        xml = ET.fromstring(response.content)
-        ids = []
-        if is_ok(xml):
-            for file in xml.iter('file'):
-                if remove == file.find('ident').text:
-                    ids.append(file.find('download_id').text)
-        else:
-            popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
-        if ids:
-            rr = api('clear_history', {'ids[]': ids, 'wst': token})
-            xml = ET.fromstring(rr.content)
-            if is_ok(xml):
-                popinfo(_addon.getLocalizedString(30104))
-            else:
-                popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
-
     if 'toqueue' in params:
-        toqueue(params['toqueue'], token)
+        toqueue(params, token)
         updateListing = True
 
+    # one fetch, a removal is applied to the model instead of fetching again
     response = api('history', {'wst': token})
     xml = ET.fromstring(response.content)
-    files = []
-    if is_ok(xml):
-        for file in xml.iter('file'):
-            item = todict(file, ['ended_at', 'download_id', 'started_at'])
-            if item not in files:
-                files.append(item)
-        for file in files:
-            commands = []
-            commands.append((_addon.getLocalizedString(30213), 'Container.Update(' + get_url(action='history', remove=file['ident']) + ')'))
-            commands.append((_addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='history', toqueue=file['ident']) + ')'))
-            listitem = tolistitem(file, commands)
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='play', ident=file['ident'], name=file['name']), listitem, False)
-    else:
+    if not is_ok(xml):
         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
-    xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
+        listing.finish(updateListing=updateListing)
+        return
+    files = history_model(xml)
+
+    if 'remove' in params:
+        updateListing = True
+        file = files.get(params['remove'])
+        if file is not None and file['ids']:
+            rr = api('clear_history', {'ids[]': file['ids'], 'wst': token})
+            if is_ok(ET.fromstring(rr.content)):
+                popinfo(_addon.getLocalizedString(30104))
+                del files[params['remove']]
+            else:
+                popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+
+    try:
+        limit = max(1, int(_addon.getSetting('slimit')))
+    except ValueError:
+        limit = 25
+    offset = int(params['offset']) if 'offset' in params else 0
+    # the last item of the last page was removed
+    offset = min(offset, max(0, len(files) - 1) // limit * limit)
+
+    if offset > 0:  # prev page
+        listing.item(_addon.getLocalizedString(30206), get_url(action='history', offset=max(0, offset - limit)), True, icon='DefaultAddonsSearch.png')
+    remove, enqueue = _addon.getLocalizedString(30213), _addon.getLocalizedString(30214)
+    for file in list(files.values())[offset:offset + limit]:
+        commands = []
+        commands.append((remove, 'Container.Update(' + get_url(action='history', remove=file['ident'], offset=offset) + ')'))
+        commands.append((enqueue, 'Container.Update(' + get_url(action='history', toqueue=file['ident'], name=file['name'], size=file.get('size') or '', offset=offset) + ')'))
+        listitem = tolistitem(file, commands)
+        listing.add(get_url(action='play', ident=file['ident'], name=file['name']), listitem, False)
+    if offset + limit < len(files):  # next page
+        listing.item(_addon.getLocalizedString(30207), get_url(action='history', offset=offset + limit), True, icon='DefaultAddonsSearch.png')
+    listing.finish(updateListing=updateListing)
 
 
 def settings(params):
@@ -474,7 +628,7 @@ def fpsize(fps):
     return str(x)
 
 
-def getinfo(ident, wst):
+def getinfo(ident, wst, quiet=False):
     response = api('file_info', {'ident': ident, 'wst': wst})
     xml = ET.fromstring(response.content)
     ok = is_ok(xml)
@@ -485,7 +639,8 @@ def getinfo(ident, wst):
     if ok:
         return xml
     else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        if not quiet:
+            popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
         return None
 
 
@@ -529,7 +684,26 @@ def info(params):
         xbmcgui.Dialog().textviewer(_addon.getAddonInfo('name'), text)
 
 
-def getlink(ident, wst, dtype='video_stream'):
+def linkcache():
+    import link_cache
+    global _links
+    if _links is None:
+        try:
+            ttl = int(_addon.getSetting('lcttl')) * 60
+        except ValueError:
+            ttl = 3600
+        _links = link_cache.LinkCache(_profile, ttl)
+    return _links
+
+
+def getlink(ident, wst, dtype='video_stream', quiet=False, cached=True):
+    """Link of a file, from the link cache unless cached is False."""
+    import uuid
+    if cached:
+        link = linkcache().get(ident, dtype)
+        metrics().cache('link cache', bool(link))
+        if link:
+            return link
     # uuid experiment
     duuid = _addon.getSetting('duuid')
     if not duuid:
@@ -544,49 +718,151 @@ def getlink(ident, wst, dtype='video_stream'):
     response = api('file_link', data)
     xml = ET.fromstring(response.content)
     if is_ok(xml):
-        return xml.find('link').text
+        link = xml.find('link').text
+        linkcache().put(ident, dtype, link)
+        return link
     else:
-        popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        if not quiet:
+            popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        return None
+
+
+def fileduration(ident, wst):
+    """Return duration of a video file in seconds from file_info."""
+    xml = getinfo(ident, wst, quiet=True)
+    if xml is None:
         return None
+    try:
+        length = xml.find('length')
+        if length is not None and length.text:
+            return float(length.text)
+        # bitrate is in bits per second
+        return int(xml.find('size').text) * 8 / float(xml.find('bitrate').text)
+    except (AttributeError, TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+def store_durations(entry, wst, save):
+    """Learn missing durations of a stored file and its alternatives from file_info.
+
+    Called by the service, off the play path, choose_file only reads them.
+    """
+    if not entry.get('alternatives'):
+        return
+    learned = False
+    for candidate in [entry] + entry['alternatives']:
+        if not candidate.get('duration'):
+            seconds = fileduration(candidate['ident'], wst)
+            if seconds:
+                candidate['duration'] = seconds
+                learned = True
+    if learned:
+        save()
+
+
+def choose_file(entry):
+    """Pick the stored file of an episode or movie that streams without stalling.
+
+    Falls back to the best scored file without a throughput measurement,
+    files whose duration is not stored yet are skipped.
+    """
+    import bandwidth
+    alternatives = entry.get('alternatives')
+    if not alternatives:
+        return entry
+    throughput = bandwidth.ThroughputEstimator(_profile).estimate()
+    if not throughput:
+        return entry
+    return bandwidth.pick_streamable([entry] + alternatives, throughput, lambda candidate: candidate.get('duration'))
 
 
 def play(params):
-    token = revalidate()
-    link = getlink(params['ident'], token)
+    # Items queued into the playlist are resolved when Kodi starts them, the
+    # stored token is tried first so that costs just the file_link call.
+    queued = 'queued' in params
+    episode = 'series' in params and 'season' in params and 'episode' in params
+    token = _addon.getSetting('token') if queued else revalidate()
+    ident = params['ident']
+    prepared = None
+    if episode:
+        prepared = json.loads(xbmcgui.Window(10000).getProperty(PREPARED_PROPERTY) or 'null')
+        xbmcgui.Window(10000).clearProperty(PREPARED_PROPERTY)
+    if prepared and [prepared[key] for key in ('series', 'season', 'episode')] == [
+            params['series'], str(params['season']), str(params['episode'])]:
+        # the service chose the file and resolved its link already
+        ident = prepared['ident']
+    elif token and episode:
+        # the stored entry also reflects dead files replaced by the service
+        import series_manager
+        sm = series_manager.SeriesManager(_addon, _profile)
+        data = sm.load_series_data(params['series']) or {}
+        entry = data.get('seasons', {}).get(str(params['season']), {}).get(str(params['episode']))
+        if entry:
+            ident = choose_file(entry)['ident']
+    elif token and 'movie' in params:
+        import movie_manager
+        mm = movie_manager.MovieManager(_addon, _profile)
+        data = mm.load_movie_data(params['movie']) or {}
+        if data.get('file'):
+            ident = choose_file(data['file'])['ident']
+    link = getlink(ident, token, quiet=queued) if token else None
+    if link is None and queued:
+        token = revalidate()
+        link = getlink(ident, token) if token else None
     if link is not None:
-        headers = _session.headers
+        playing = {'ident': ident}
+        if episode:
+            playing.update(series=params['series'], season=params['season'], episode=params['episode'])
+        elif 'movie' in params:
+            playing['movie'] = params['movie']
+        xbmcgui.Window(10000).setProperty(PLAYING_PROPERTY, json.dumps(playing))
+        headers = dict(session().headers)
         if headers:
             headers.update({'Cookie': 'wst=' + token})
+        proxy_port = xbmcgui.Window(10000).getProperty(PROXY_PROPERTY)
+        if proxy_port and 'true' == _addon.getSetting('proxy'):
+            import stream_proxy
+            key = stream_proxy.new_key()
+            xbmcgui.Window(10000).setProperty(PROXY_LINK_PROPERTY % key, json.dumps([link, headers]))
+            link = stream_proxy.local_url(int(proxy_port), key)
+        elif headers:
             link = link + '|' + urlencode(headers)
         listitem = xbmcgui.ListItem(label=params['name'], path=link)
         listitem.setProperty('mimetype', 'application/octet-stream')
 
         xbmcplugin.setResolvedUrl(_handle, True, listitem)
 
-        if 'series' in params and 'season' in params and 'episode' in params:
-            try:
-                playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
-                start = int(params['episode'])
-                sm = series_manager.SeriesManager(_addon, _profile)
-                data = sm.load_series_data(params['series']) or {}
-                season_data = data.get('seasons', {}).get(str(params['season']), {})
-                for ep_num in sorted(season_data.keys(), key=int):
-                    if int(ep_num) <= start:
-                        continue
-                    ep = season_data[ep_num]
-                    ep_link = getlink(ep['ident'], token)
-                    if headers:
-                        ep_link = ep_link + '|' + urlencode(headers)
-                    li = xbmcgui.ListItem(label=f"Epizoda {ep_num} - {ep['name']}", path=ep_link)
-                    li.setProperty('mimetype', 'application/octet-stream')
-                    playlist.add(url=ep_link, listitem=li)
-            except Exception:
-                traceback.print_exc()
+        if not queued and episode:
+            queue_episodes(params['series'], params['season'], params['episode'])
     else:
         popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
         xbmcplugin.setResolvedUrl(_handle, False, xbmcgui.ListItem())
 
 
+def queue_episodes(series_name, season, start):
+    """Queue the rest of the season as plugin URLs resolved only when played."""
+    import series_manager
+    try:
+        playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+        start = int(start)
+        sm = series_manager.SeriesManager(_addon, _profile)
+        data = sm.load_series_data(series_name) or {}
+        season_data = data.get('seasons', {}).get(str(season), {})
+        for ep_num in sorted(season_data.keys(), key=int):
+            if int(ep_num) <= start:
+                continue
+            ep = season_data[ep_num]
+            url = get_url(action='play', ident=ep['ident'], name=ep['name'], series=series_name,
+                          season=season, episode=ep_num, queued=1)
+            label = f"Epizoda {ep_num} - {ep['name']}"
+            li = xbmcgui.ListItem(label=label, path=url)
+            li.setInfo('video', {'title': label})
+            li.setProperty('IsPlayable', 'true')
+            playlist.add(url=url, listitem=li)
+    except Exception:
+        traceback.print_exc()
+
+
 def join(path, file):
     if path.endswith('/') or path.endswith('\\'):
         return path + file
@@ -594,936 +870,372 @@ def join(path, file):
         return path + '/' + file
 
 
-def download(params):
-    token = revalidate()
+def download_folder():
+    """Configured download folder or None, asks to set it when missing."""
     where = _addon.getSetting('dfolder')
     if not where or not xbmcvfs.exists(where):
         popinfo('set folder!', sound=True)  # _addon.getLocalizedString(30101)
         _addon.openSettings()
-        return
-
-    local = os.path.exists(where)
-
-    normalize = 'true' == _addon.getSetting('dnormalize')
-    notify = 'true' == _addon.getSetting('dnotify')
-    every = _addon.getSetting('dnevery')
-    try:
-        every = int(_DIGITS_ONLY_RE.sub('', every))
-    except:
-        every = 10
-
-    try:
-        link = getlink(params['ident'], token, 'file_download')
-        info = getinfo(params['ident'], token)
-        name = info.find('name').text
-        if normalize:
-            name = unidecode.unidecode(name)
-        bf = io.open(os.path.join(where, name), 'wb') if local else xbmcvfs.File(join(where, name), 'w')
-        response = _session.get(link, stream=True)
-        total = response.headers.get('content-length')
-        if total is None:
-            popinfo(_addon.getLocalizedString(30301) + name, icon=xbmcgui.NOTIFICATION_WARNING, sound=True)
-            bf.write(response.content)
-        elif not notify:
-            popinfo(_addon.getLocalizedString(30302) + name)
-            bf.write(response.content)
-        else:
-            popinfo(_addon.getLocalizedString(30302) + name)
-            dl = 0
-            total = int(total)
-            pct = total / 100
-            lastpop = 0
-            for data in response.iter_content(chunk_size=4096):
-                dl += len(data)
-                bf.write(data)
-                done = int(dl / pct)
-                if done % every == 0 and lastpop != done:
-                    popinfo(str(done) + '% - ' + name)
-                    lastpop = done
-        bf.close()
-        popinfo(_addon.getLocalizedString(30303) + name, sound=True)
-    except Exception as e:
-        # TODO - remove unfinished file?
-        traceback.print_exc()
-        popinfo(_addon.getLocalizedString(30304) + name, icon=xbmcgui.NOTIFICATION_ERROR, sound=True)
-
-
-def loaddb(dbdir, file):
-    try:
-        data = {}
-        with io.open(os.path.join(dbdir, file), 'r', encoding='utf8') as file:
-            fdata = file.read()
-            file.close()
-            try:
-                data = json.loads(fdata, "utf-8")['data']
-            except TypeError:
-                data = json.loads(fdata)['data']
-        return data
-    except Exception as e:
-        traceback.print_exc()
-        return {}
+        return None
+    return where
 
 
-def db(params):
+def download(params):
+    import unidecode
+    import download_manager
     token = revalidate()
-    updateListing = False
-
-    dbdir = os.path.join(_profile, 'db')
-    if not os.path.exists(dbdir):
-        link = getlink(BACKUP_DB, token)
-        dbfile = os.path.join(_profile, 'db.zip')
-        with io.open(dbfile, 'wb') as bf:
-            response = _session.get(link, stream=True)
-            bf.write(response.content)
-            bf.flush()
-            bf.close()
-        with zipfile.ZipFile(dbfile, 'r') as zf:
-            zf.extractall(_profile)
-        os.unlink(dbfile)
-
-    if 'toqueue' in params:
-        toqueue(params['toqueue'], token)
-        updateListing = True
-
-    if 'file' in params and 'key' in params:
-        data = loaddb(dbdir, params['file'])
-        item = next((x for x in data if x['id'] == params['key']), None)
-        if item is not None:
-            for stream in item['streams']:
-                commands = []
-                commands.append(
-                    (_addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='db', file=params['file'], key=params['key'], toqueue=stream['ident']) + ')'))
-                listitem = tolistitem({'ident': stream['ident'], 'name': stream['quality'] + ' - ' + stream['lang'] + stream['ainfo'], 'sizelized': stream['size']}, commands)
-                xbmcplugin.addDirectoryItem(_handle, get_url(action='play', ident=stream['ident'], name=item['title']), listitem, False)
-    elif 'file' in params:
-        data = loaddb(dbdir, params['file'])
-        for item in data:
-            listitem = xbmcgui.ListItem(label=item['title'])
-            if 'plot' in item:
-                listitem.setInfo('video', {'title': item['title'], 'plot': item['plot']})
-            xbmcplugin.addDirectoryItem(_handle, get_url(action='db', file=params['file'], key=item['id']), listitem, True)
-    else:
-        if os.path.exists(dbdir):
-            dbfiles = [f for f in os.listdir(dbdir) if os.path.isfile(os.path.join(dbdir, f))]
-            for dbfile in dbfiles:
-                listitem = xbmcgui.ListItem(label=os.path.splitext(dbfile)[0])
-                xbmcplugin.addDirectoryItem(_handle, get_url(action='db', file=dbfile), listitem, True)
-    xbmcplugin.addSortMethod(_handle, xbmcplugin.SORT_METHOD_LABEL)
-    xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
-
-
-def menu():
-    revalidate()
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name'))
-
-    # Add Movies Manager menu item
-    listitem = xbmcgui.ListItem(label='Filmy')
-    listitem.setArt({'icon': 'DefaultMovies.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='movie'), listitem, True)
-
-    # Add Series Manager menu item
-    listitem = xbmcgui.ListItem(label='Serialy')
-    listitem.setArt({'icon': 'DefaultTVShows.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='series'), listitem, True)
+    if not download_folder():
+        return
+    ident = params['ident']
+    info = getinfo(ident, token)
+    if info is None:
+        return
+    name = info.find('name').text
+    if 'true' == _addon.getSetting('dnormalize'):
+        name = unidecode.unidecode(name)
+    download_manager.send(_profile, {'cmd': 'add', 'ident': ident, 'name': name}, wait=0)
+    popinfo(_addon.getLocalizedString(30305) + name)
 
-    listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30201))
-    listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='search'), listitem, True)
 
-    listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30202))
-    listitem.setArt({'icon': 'DefaultPlaylist.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='queue'), listitem, True)
+def download_path(where, folder, name):
+    """Path of a downloaded file, folder is relative to the download folder or None."""
+    local = os.path.exists(where)
+    if folder:
+        where = os.path.join(where, *folder.split('/')) if local else join(where, folder)
+    return os.path.join(where, name) if local else join(where, name)
 
-    listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30203))
-    listitem.setArt({'icon': 'DefaultAddonsUpdates.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='history'), listitem, True)
 
-    if 'true' == _addon.getSetting('experimental'):
-        listitem = xbmcgui.ListItem(label='Backup DB')
-        listitem.setArt({'icon': 'DefaultAddonsZip.png'})
-        xbmcplugin.addDirectoryItem(_handle, get_url(action='db'), listitem, True)
+def existing_size(path):
+    """Size of an already downloaded file or None."""
+    if os.path.exists(path):
+        return os.path.getsize(path)
+    if xbmcvfs.exists(path):
+        return xbmcvfs.Stat(path).st_size()
+    return None
 
-    listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30204))
-    listitem.setArt({'icon': 'DefaultAddonService.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='settings'), listitem, False)
 
-    xbmcplugin.endOfDirectory(_handle)
+def safe_name(name):
+    """Name usable as a file or folder on any filesystem."""
+    return ' '.join(_UNSAFE_PATH_RE.sub(' ', name).split()).strip(' .') or '_'
 
 
-def series_menu(params):
-    """Handle Series functionality"""
+def make_download(job, throttle):
+    """Build the downloader for a job of the download manager (runs in the service)."""
+    import downloader
+    where = _addon.getSetting('dfolder')
+    if not where or not xbmcvfs.exists(where):
+        raise IOError('download folder is not set')
+    local = os.path.exists(where)
+    try:
+        chunk_size = int(_addon.getSetting('dchunk')) * downloader.MB
+    except ValueError:
+        chunk_size = downloader.CHUNK_SIZE
+    try:
+        connections = int(_addon.getSetting('dsegments'))
+    except ValueError:
+        connections = downloader.CONNECTIONS
+    ident = job['ident']
+    token = None
+
+    def resolve(fresh):
+        nonlocal token
+        if fresh:
+            # link or token may have expired while downloading
+            linkcache().invalidate(ident, 'file_download')
+        if fresh or token is None:
+            token = revalidate()
+        return getlink(ident, token, 'file_download', quiet=True, cached=not fresh)
+
+    path = download_path(where, job.get('folder'), job['name'])
+    folder = os.path.dirname(path) if local else path[:path.rfind('/') + 1]
+    if local and not os.path.exists(folder):
+        os.makedirs(folder)
+    elif not local and not xbmcvfs.exists(folder):
+        xbmcvfs.mkdirs(folder)
+    target = downloader.LocalTarget() if local else downloader.VfsTarget()
+    return downloader.Download(session(), resolve, path, ident, target, chunk_size=chunk_size,
+                               connections=connections, throttle=throttle)
+
+
+def downloads(params):
+    import download_manager
+    import downloader
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + _addon.getLocalizedString(30210))
+    listing = Listing(_handle)
     updateListing = False
-    # Initialize SeriesManager
-    sm = series_manager.SeriesManager(_addon, _profile)
-
-    if 'remove' in params:
-        sm.remove_series(params['remove'])
+    if 'cmd' in params:
+        download_manager.send(_profile, {'cmd': params['cmd'], 'id': params.get('id')})
         updateListing = True
 
-    series_manager.create_series_menu(sm, _handle, end=False)
-    xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
-
-
-def series_search(params):
-    """Search for a TV series and organize it into seasons and episodes"""
-    token = revalidate()
-
-    # Determine series name
-    series_name = params.get('series_name')
-    if not series_name:
-        series_name = ask(None)
-    if not series_name:
-        xbmcplugin.endOfDirectory(_handle, succeeded=False)
-        return
-
-    # Initialize SeriesManager
-    sm = series_manager.SeriesManager(_addon, _profile)
-
-    # If series already exists locally, open it without refreshing
-    if sm.load_series_data(series_name):
-        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
-        return
-
-    # Show progress dialog
-    progress = xbmcgui.DialogProgress()
-    progress.create('YaWSP', f'Vyhledavam serial {series_name}...')
-
-    try:
-        # Search for the series
-        series_data = sm.search_series(series_name, api, token)
-
-        if not series_data or not series_data['seasons']:
-            progress.close()
-            popinfo('Nenalezeny zadne epizody tohoto serialu', icon=xbmcgui.NOTIFICATION_WARNING)
-            xbmcplugin.endOfDirectory(_handle, succeeded=False)
-            return
-
-        # Success
-        progress.close()
-        popinfo(f'Nalezeno {sum(len(season) for season in series_data["seasons"].values())} epizod v {len(series_data["seasons"])} sezonach')
-
-        # Redirect to series detail
-        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
-
-    except Exception as e:
-        progress.close()
-        traceback.print_exc()
-        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
-        xbmcplugin.endOfDirectory(_handle, succeeded=False)
-
+    states = {download_manager.QUEUED: 30310, download_manager.RUNNING: 30311, download_manager.PAUSED: 30312,
+              download_manager.DONE: 30313, download_manager.FAILED: 30314}
+    for job in download_manager.load_jobs(_profile):
+        status = _addon.getLocalizedString(states.get(job['state'], 30310))
+        if job['state'] == download_manager.RUNNING:
+            if job.get('size'):
+                status += ' %d%%' % (job['done'] * 100 // job['size'])
+            status += ' ' + downloader.sizeof(job.get('rate') or 0) + '/s'
+        elif job['state'] == download_manager.PAUSED and job.get('size'):
+            status += ' %d%%' % (job['done'] * 100 // job['size'])
+        listitem = xbmcgui.ListItem(label='[' + status + '] ' + job['name'], offscreen=True)
+        if job.get('error'):
+            listitem.setInfo('video', {'title': job['name'], 'plot': job['error']})
+        commands = []
+        if job['state'] in (download_manager.QUEUED, download_manager.RUNNING):
+            toggle = 'pause'
+            commands.append((_addon.getLocalizedString(30216), 'Container.Update(' + get_url(action='downloads', cmd='pause', id=job['id']) + ')'))
+        else:
+            toggle = 'resume'
+            if job['state'] != download_manager.DONE:
+                commands.append((_addon.getLocalizedString(30217), 'Container.Update(' + get_url(action='downloads', cmd='resume', id=job['id']) + ')'))
+        commands.append((_addon.getLocalizedString(30218), 'Container.Update(' + get_url(action='downloads', cmd='up', id=job['id']) + ')'))
+        commands.append((_addon.getLocalizedString(30219), 'Container.Update(' + get_url(action='downloads', cmd='down', id=job['id']) + ')'))
+        commands.append((_addon.getLocalizedString(30220), 'Container.Update(' + get_url(action='downloads', cmd='remove', id=job['id']) + ')'))
+        commands.append((_addon.getLocalizedString(30221), 'Container.Update(' + get_url(action='downloads', cmd='clear') + ')'))
+        listitem.addContextMenuItems(commands)
+        listitem.setArt({'icon': 'DefaultAddonsUpdates.png'})
+        listing.add(get_url(action='downloads', cmd=toggle, id=job['id']), listitem, True)
+    listing.finish(updateListing=updateListing, cacheToDisc=False)
 
-def series_detail(params):
-    """Show seasons for a series"""
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + params['series_name'])
 
-    series_name = params['series_name']
-    sm = series_manager.SeriesManager(_addon, _profile)
-    series_data = sm.load_series_data(series_name)
-    if not series_data:
-        xbmcgui.Dialog().notification('YaWSP', 'Data serialu nenalezena', xbmcgui.NOTIFICATION_WARNING)
-        xbmcplugin.endOfDirectory(_handle, succeeded=False)
-        return
-
-    # Add refresh option
-    listitem = xbmcgui.ListItem(label='Aktualizovat serial')
-    listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='series_refresh', series_name=series_name), listitem, True)
-
-    show_info = _trakt_show_info(series_name)
-    poster = None
-    plot = ''
-    rating = None
-    if show_info:
-        img = show_info.get('images', {}).get('poster')
-        poster = img[0] if isinstance(img, list) and img else None
-        if poster and not poster.startswith('http'):
-            poster = 'https://' + poster
-        plot = show_info.get('overview') or ''
-        rating = show_info.get('rating')
-
-    for season_num in sorted(series_data['seasons'].keys(), key=int):
-        season_name = f'Rada {season_num}'
-        listitem = xbmcgui.ListItem(label=season_name)
-        art = {'icon': 'DefaultFolder.png'}
-        if poster:
-            art['thumb'] = poster
-        listitem.setArt(art)
-        info = {'title': f'{series_name} - {season_name}'}
-        if plot:
-            info['plot'] = plot
-        if rating is not None:
-            info['rating'] = rating
-        listitem.setInfo('video', info)
-        xbmcplugin.addDirectoryItem(_handle, get_url(action='series_season', series_name=series_name, season=season_num), listitem, True)
-
-    xbmcplugin.endOfDirectory(_handle)
-
-
-def series_season(params):
-    """Show episodes for a season"""
-    series_name = params['series_name']
-    season = params['season']
-
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + series_name + " \\ " + f"Rada {season}")
-
-    sm = series_manager.SeriesManager(_addon, _profile)
-    season_str = str(season)
-    series_data = sm.load_series_data(series_name)
-    if not series_data or season_str not in series_data['seasons']:
-        xbmcgui.Dialog().notification('YaWSP', 'Data sezony nenalezena', xbmcgui.NOTIFICATION_WARNING)
-        xbmcplugin.endOfDirectory(_handle, succeeded=False)
+def diagnostics(params):
+    """Per endpoint latency, cache hit rates and the slowest calls of the rolling log."""
+    stats = metrics()
+    stats.flush()
+    if 'report' in params:
+        xbmcgui.Dialog().textviewer(_addon.getLocalizedString(30225), stats.report())
+        xbmcplugin.setResolvedUrl(_handle, False, xbmcgui.ListItem())
         return
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + _addon.getLocalizedString(30225))
+    updateListing = False
+    if 'export' in params:
+        try:
+            popinfo(_addon.getLocalizedString(30108) + stats.export())
+        except Exception as e:
+            traceback.print_exc()
+            popinfo(str(e), icon=xbmcgui.NOTIFICATION_ERROR)
+        updateListing = True
+    if 'clear' in params:
+        stats.clear()
+        updateListing = True
 
-    show_slug = _trakt_search('show', series_name)
-    episode_details = {}
-    if show_slug:
-        eps, _ = _trakt_request(f'shows/{show_slug}/seasons/{season_str}',
-                                {'extended': 'episodes,full,images'})
-        if isinstance(eps, list):
-            for ep in eps:
-                episode_details[str(ep.get('number'))] = ep
-
-    season_data = series_data['seasons'][season_str]
-    for episode_num in sorted(season_data.keys(), key=int):
-        episode = season_data[episode_num]
-        info_data = episode_details.get(str(episode_num), {})
-        label = f"Epizoda {episode_num} - {episode['name']}"
-
-        listitem = xbmcgui.ListItem(label=label)
-        art = {'icon': 'DefaultVideo.png'}
-        shot = info_data.get('images', {}).get('screenshot')
-        thumb = shot[0] if isinstance(shot, list) and shot else None
-        if thumb and not thumb.startswith('http'):
-            thumb = 'https://' + thumb
-        if thumb:
-            art['thumb'] = thumb
-        listitem.setArt(art)
-        listitem.setProperty('IsPlayable', 'true')
-
-        meta = {'title': label}
-        overview = info_data.get('overview')
-        if overview:
-            meta['plot'] = overview
-        rating = info_data.get('rating')
-        if rating is not None:
-            meta['rating'] = rating
-        listitem.setInfo('video', meta)
-
-        url = get_url(
-            action='play',
-            ident=episode['ident'],
-            name=episode['name'],
-            series=series_name,
-            season=season,
-            episode=episode_num
-        )
-        xbmcplugin.addDirectoryItem(_handle, url, listitem, False)
-
-    xbmcplugin.endOfDirectory(_handle)
-
-
-def series_refresh(params):
-    """Refresh series data"""
-    token = revalidate()
-    series_name = params['series_name']
-
-    # Initialize SeriesManager and perform search
-    sm = series_manager.SeriesManager(_addon, _profile)
-
-    # Show progress dialog
-    progress = xbmcgui.DialogProgress()
-    progress.create('YaWSP', f'Aktualizuji data pro serial {series_name}...')
-
+    listing = Listing(_handle)
+    report = get_url(action='diagnostics', report=1)
+    endpoints, caches, slowest = stats.summary()
+    for row in endpoints:
+        label = '%s: %dx, p50 %.0f ms, p95 %.0f ms' % (row['endpoint'], row['calls'], row['p50'], row['p95'])
+        if row['failed'] or row['retries']:
+            label += ', failed %d, retries %d' % (row['failed'], row['retries'])
+        listing.item(label, report, False, icon='DefaultNetwork.png')
+    for row in caches:
+        listing.item('%s: %.0f%% (%d/%d)' % (row['cache'], row['rate'] * 100, row['hits'], row['hits'] + row['misses']),
+                     report, False, icon='DefaultAddonsZip.png')
+    if slowest:
+        listing.item('[B]' + _addon.getLocalizedString(30228) + '[/B]', report, False)
+        for entry in slowest:
+            listing.item('%.0f ms %s %s (%s)' % (entry['ms'], entry['e'], entry['s'],
+                                                 time.strftime('%d.%m. %H:%M', time.localtime(entry['t']))),
+                         report, False, icon='DefaultIconWarning.png' if not entry['ok'] else None)
+    listing.item(_addon.getLocalizedString(30226), get_url(action='diagnostics', export=1), True, icon='DefaultAddonsUpdates.png')
+    listing.item(_addon.getLocalizedString(30227), get_url(action='diagnostics', clear=1), True, icon='DefaultIconError.png')
+    listing.finish(updateListing=updateListing, cacheToDisc=False)
+
+
+def db_update(source, token):
+    """Apply a newer backup database once the check interval has passed."""
+    import offline_db
     try:
-        # Search for the series
-        series_data = sm.search_series(series_name, api, token)
-
-        if not series_data or not series_data['seasons']:
-            progress.close()
-            popinfo('Nenalezeny zadne epizody tohoto serialu', icon=xbmcgui.NOTIFICATION_WARNING)
-            xbmcplugin.endOfDirectory(_handle, succeeded=False)
-            return
-
-        # Success
-        progress.close()
-        popinfo(f'Aktualizovano: {sum(len(season) for season in series_data["seasons"].values())} epizod v {len(series_data["seasons"])} sezonach')
-
-        # Redirect to series detail to refresh the view
-        xbmc.executebuiltin(f'Container.Update({get_url(action="series_detail", series_name=series_name)})')
-
-    except Exception as e:
-        progress.close()
-        traceback.print_exc()
-        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
-        xbmcplugin.endOfDirectory(_handle, succeeded=False)
-
-
-def _trakt_request(endpoint, params=None):
-    """Helper to call Trakt API. Returns JSON data and response headers."""
-    client_id = _addon.getSetting('trakt_client_id')
-    if not client_id:
-        popinfo('Missing Trakt client id', icon=xbmcgui.NOTIFICATION_WARNING)
-        return [], {}
-
-    headers = {
-        'Content-Type': 'application/json',
-        'trakt-api-version': '2',
-        'trakt-api-key': client_id,
-    }
-
+        interval = float(_addon.getSetting('dbcheck')) * 3600
+    except ValueError:
+        interval = 24 * 3600
+    if interval <= 0 or time.time() - float(source.meta('checked') or 0) < interval:
+        return source
+    # a failed check waits for the next interval too
+    source.set_meta('checked', int(time.time()))
+    source.close()
     try:
-        response = _session.get('https://api.trakt.tv/' + endpoint,
-                                headers=headers,
-                                params=params or {}, timeout=10)
-        if response.status_code == 200:
-            return response.json(), response.headers
-        else:
-            popinfo('Trakt API error', icon=xbmcgui.NOTIFICATION_WARNING)
+        changed = offline_db.update(session(), getlink(BACKUP_DB, token), _profile)
+        if changed:
+            popinfo(_addon.getLocalizedString(30306) % len(changed))
     except Exception:
         traceback.print_exc()
-        popinfo('Trakt API request failed', icon=xbmcgui.NOTIFICATION_WARNING)
-    return [], {}
-
-
-def _trakt_search(media_type, query):
-    """Search Trakt for a show or movie and return its slug."""
-    data, _ = _trakt_request(f'search/{media_type}', {'query': query, 'limit': 1})
-    if data:
-        item = data[0].get(media_type) or data[0].get('show') or data[0].get('movie')
-        if isinstance(item, dict):
-            ids = item.get('ids', {})
-            return ids.get('slug') or ids.get('trakt')
-    return None
+    return offline_db.open_db(_profile)
 
 
-def _trakt_show_info(name_or_slug):
-    """Return detailed show info including images."""
-    slug = name_or_slug
-    if not slug or ' ' in slug:
-        slug = _trakt_search('show', name_or_slug)
-    if slug:
-        info, _ = _trakt_request(f'shows/{slug}', {'extended': 'full,images'})
-        if isinstance(info, dict):
-            return info
-    return {}
-
-
-def _trakt_movie_info(name_or_slug):
-    """Return detailed movie info including images."""
-    slug = name_or_slug
-    if not slug or ' ' in slug:
-        slug = _trakt_search('movie', name_or_slug)
-    if slug:
-        info, _ = _trakt_request(f'movies/{slug}', {'extended': 'full,images'})
-        if isinstance(info, dict):
-            return info
-    return {}
-
-
-def _trakt_episode_info(show_slug, season, episode):
-    """Return detailed episode info including screenshot."""
-    if not show_slug:
-        return {}
-    data, _ = _trakt_request(f'shows/{show_slug}/seasons/{season}',
-                             {'extended': 'episodes,full,images'})
-    if isinstance(data, list):
-        for ep in data:
-            if str(ep.get('number')) == str(episode):
-                return ep
-    return {}
-
-
-def series_trending(params):
-    """List trending series from Trakt with paging."""
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + ' \\ ' +
-                                 _addon.getLocalizedString(30401))
-
-    page = int(params.get('page', '1'))
-    limit = 20
-
-    data, headers = _trakt_request('shows/trending',
-                                   {'limit': limit, 'page': page,
-                                    'extended': 'full,images'})
-
-    if page > 1:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30206))
-        listitem.setArt({'icon': 'DefaultTVShows.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='series_trending', page=page - 1),
-                                    listitem, True)
-
-    for item in data:
-        show = item.get('show', {})
-        title = show.get('title')
-        if not title:
-            continue
-        watchers = item.get('watchers', 0)
-        label = f"{title} ({watchers} users)"
-        listitem = xbmcgui.ListItem(label=label)
-        poster = show.get('images', {}).get('poster')
-        thumb = poster[0] if isinstance(poster, list) and poster else None
-        if thumb and not thumb.startswith('http'):
-            thumb = 'https://' + thumb
-        art = {'icon': 'DefaultTVShows.png'}
-        if thumb:
-            art['thumb'] = thumb
-        listitem.setArt(art)
-        info = {'title': title}
-        overview = show.get('overview')
-        if overview:
-            info['plot'] = overview
-        rating = show.get('rating')
-        if rating is not None:
-            info['rating'] = rating
-        listitem.setInfo('video', info)
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='series_search', series_name=title),
-                                    listitem, True)
-
-    page_count = int(headers.get('X-Pagination-Page-Count', page))
-    if page < page_count:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
-        listitem.setArt({'icon': 'DefaultTVShows.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='series_trending', page=page + 1),
-                                    listitem, True)
-
-    xbmcplugin.endOfDirectory(_handle)
-
-
-def series_popular(params):
-    """List popular series from Trakt with paging."""
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + ' \\ ' +
-                                 _addon.getLocalizedString(30402))
-
-    page = int(params.get('page', '1'))
-    limit = 20
-
-    data, headers = _trakt_request('shows/popular',
-                                   {'limit': limit, 'page': page,
-                                    'extended': 'full,images'})
-
-    if page > 1:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30206))
-        listitem.setArt({'icon': 'DefaultTVShows.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='series_popular', page=page - 1),
-                                    listitem, True)
-
-    for show in data:
-        title = show.get('title')
-        if not title:
-            continue
-        watchers = 0
-        ids = show.get('ids', {})
-        slug = ids.get('slug') or ids.get('trakt')
-        if slug:
-            stats, _ = _trakt_request(f'shows/{slug}/stats')
-            if isinstance(stats, dict):
-                watchers = stats.get('watchers', 0)
-        label = f"{title} ({watchers} users)"
-        listitem = xbmcgui.ListItem(label=label)
-        poster = show.get('images', {}).get('poster')
-        thumb = poster[0] if isinstance(poster, list) and poster else None
-        if thumb and not thumb.startswith('http'):
-            thumb = 'https://' + thumb
-        art = {'icon': 'DefaultTVShows.png'}
-        if thumb:
-            art['thumb'] = thumb
-        listitem.setArt(art)
-        info = {'title': title}
-        overview = show.get('overview')
-        if overview:
-            info['plot'] = overview
-        rating = show.get('rating')
-        if rating is not None:
-            info['rating'] = rating
-        listitem.setInfo('video', info)
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='series_search', series_name=title),
-                                    listitem, True)
-
-    page_count = int(headers.get('X-Pagination-Page-Count', page))
-    if page < page_count:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
-        listitem.setArt({'icon': 'DefaultTVShows.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='series_popular', page=page + 1),
-                                    listitem, True)
-
-    xbmcplugin.endOfDirectory(_handle)
-
-
-def movie_menu(params):
-    """Handle Movies functionality"""
+def db(params):
+    import offline_db
+    token = revalidate()
     updateListing = False
-    # Initialize MovieManager
-    mm = movie_manager.MovieManager(_addon, _profile)
-
-    if 'remove' in params:
-        mm.remove_item(params['remove'])
-        updateListing = True
-
-    # Create movie menu similar to series menu
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ Movies")
-
-    # Add "Search for new movie" option
-    listitem = xbmcgui.ListItem(label="Hledat novy film")
-    listitem.setArt({'icon': 'DefaultAddSource.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='movie_search'), listitem, True)
-
-    # Trending from Trakt
-    listitem = xbmcgui.ListItem(label="Trending movies")
-    listitem.setArt({'icon': 'DefaultRecentlyAddedMovies.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='movie_trending'), listitem, True)
-
-    # Popular from Trakt
-    listitem = xbmcgui.ListItem(label="Popular movies")
-    listitem.setArt({'icon': 'DefaultMovies.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='movie_popular'), listitem, True)
-
-    # List existing movies
-    try:
-        movie_list = []
-        for filename in os.listdir(mm.db_path):
-            if filename.endswith('.json'):
-                movie_name = os.path.splitext(filename)[0]
-                proper_name = movie_name.replace('_', ' ')
-                file_path = os.path.join(mm.db_path, filename)
-                mtime = 0
-                try:
-                    mtime = os.path.getmtime(file_path)
-                except Exception as e:
-                    xbmc.log(f'YaWSP Movie: Error accessing {filename}: {str(e)}', level=xbmc.LOGERROR)
-                movie_list.append({
-                    'name': proper_name,
-                    'filename': filename,
-                    'safe_name': movie_name,
-                    'mtime': mtime
-                })
-
-        movie_list.sort(key=lambda m: m.get('mtime', 0), reverse=True)
-    except Exception as e:
-        xbmc.log(f'YaWSP Movie: Error listing movies: {str(e)}', level=xbmc.LOGERROR)
-        movie_list = []
-
-    for movie in movie_list:
-        listitem = xbmcgui.ListItem(label=movie['name'])
-        listitem.setArt({'icon': 'DefaultVideo.png'})
-        commands = []
-        commands.append((_addon.getLocalizedString(30213),
-                         'Container.Update(' + get_url(action='movie', remove=movie['name']) + ')'))
-        listitem.addContextMenuItems(commands)
-        xbmcplugin.addDirectoryItem(_handle, get_url(action='movie_detail', movie_name=movie['name']), listitem, True)
-
-    xbmcplugin.endOfDirectory(_handle, updateListing=updateListing)
 
+    source = offline_db.open_db(_profile)
+    if source is None:
+        link = getlink(BACKUP_DB, token)
+        try:
+            offline_db.download_archive(session(), link, os.path.join(_profile, offline_db.ARCHIVE))
+        except Exception:
+            traceback.print_exc()
+            popinfo(_addon.getLocalizedString(30107), icon=xbmcgui.NOTIFICATION_WARNING)
+        source = offline_db.open_db(_profile)
+    elif 'file' not in params and 'search' not in params:
+        source = db_update(source, token)
 
-def movie_search(params):
-    """Search for a movie"""
-    token = revalidate()
+    if 'toqueue' in params:
+        toqueue(params, token)
+        updateListing = True
 
-    # Determine movie name
-    movie_name = params.get('movie_name')
-    if not movie_name:
-        movie_name = ask(None)
-    if not movie_name:
+    if source is None:
+        # nothing downloaded, the error was already shown
         xbmcplugin.endOfDirectory(_handle, succeeded=False)
         return
 
-    # Initialize MovieManager
-    mm = movie_manager.MovieManager(_addon, _profile)
-
-    # If movie already exists locally, play it without refreshing
-    if mm.load_movie_data(movie_name):
-        xbmc.executebuiltin(f'Container.Update({get_url(action="movie_detail", movie_name=movie_name)})')
-        return
-
-    # Show progress dialog
-    progress = xbmcgui.DialogProgress()
-    progress.create('YaWSP', f'Vyhledavam film {movie_name}...')
-
-    try:
-        # Search for the movie
-        movie_data = mm.search_movie(movie_name, api, token)
-
-        if not movie_data or not movie_data['file']:
-            progress.close()
-            popinfo('Nenalezen zadny film', icon=xbmcgui.NOTIFICATION_WARNING)
+    listing = Listing(_handle)
+    if 'search' in params:
+        if 'what' not in params:
+            what = ask(None)
+            source.close()
+            if what:
+                # list the results under a URL that holds the query, going back does not ask again
+                xbmc.executebuiltin(f'Container.Update({get_url(action="db", search=1, what=what)})')
             xbmcplugin.endOfDirectory(_handle, succeeded=False)
             return
-
-        # Success
-        progress.close()
-        popinfo(f'Nalezen film: {movie_data["file"]["name"]}')
-
-        # Redirect to movie detail
-        xbmc.executebuiltin(f'Container.Update({get_url(action="movie_detail", movie_name=movie_name)})')
-
-    except Exception as e:
-        progress.close()
-        traceback.print_exc()
-        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
+        xbmcplugin.setPluginCategory(_handle, _addon.getLocalizedString(30222) + " \\ " + params['what'])
+        for dbfile, key, title, plot in source.search(params['what']):
+            listitem = xbmcgui.ListItem(label=title + ' [' + os.path.splitext(dbfile)[0] + ']', offscreen=True)
+            if plot is not None:
+                listitem.setInfo('video', {'title': title, 'plot': plot})
+            listing.add(get_url(action='db', file=dbfile, key=key), listitem, True)
+        # results are ranked, keep their order
+    elif 'file' in params and 'key' in params:
+        item = source.item(params['file'], params['key'])
+        listing.content = 'videos'
+        listing.sort_methods = (xbmcplugin.SORT_METHOD_LABEL,)
+        if item is not None:
+            for stream in item['streams']:
+                commands = []
+                commands.append(
+                    (_addon.getLocalizedString(30214), 'Container.Update(' + get_url(action='db', file=params['file'], key=params['key'], toqueue=stream['ident'], name=stream['quality'] + ' - ' + stream['lang'] + stream['ainfo'], sizelized=stream['size']) + ')'))
+                listitem = tolistitem({'ident': stream['ident'], 'name': stream['quality'] + ' - ' + stream['lang'] + stream['ainfo'], 'sizelized': stream['size']}, commands)
+                listing.add(get_url(action='play', ident=stream['ident'], name=item['title']), listitem, False)
+    elif 'file' in params and 'jump' in params:
+        letters = source.letters(params['file'])
+        choice = xbmcgui.Dialog().select(_addon.getLocalizedString(30223), [letter.upper() for letter in letters])
+        if choice >= 0:
+            offset = source.position(params['file'], letters[choice])
+            xbmc.executebuiltin(f'Container.Update({get_url(action="db", file=params["file"], offset=offset)})')
+        source.close()
         xbmcplugin.endOfDirectory(_handle, succeeded=False)
+        return
+    elif 'file' in params:
+        try:
+            limit = max(1, int(_addon.getSetting('dbpage')))
+        except ValueError:
+            limit = 100
+        offset = int(params['offset']) if 'offset' in params else 0
+        total = source.count(params['file'])
+        xbmcplugin.setPluginCategory(_handle, os.path.splitext(params['file'])[0])
 
+        listing.item(_addon.getLocalizedString(30223), get_url(action='db', file=params['file'], jump=1), True, icon='DefaultAddonsSearch.png')
+        if offset > 0:  # prev page
+            listing.item(_addon.getLocalizedString(30206), get_url(action='db', file=params['file'], offset=max(0, offset - limit)), True, icon='DefaultAddonsSearch.png')
 
-def movie_detail(params):
-    """Show movie detail and play option"""
-    movie_name = params['movie_name']
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + " \\ " + movie_name)
-
-    # Initialize MovieManager
-    mm = movie_manager.MovieManager(_addon, _profile)
-
-    movie_data = mm.load_movie_data(movie_name)
-    if not movie_data:
-        xbmcgui.Dialog().notification('YaWSP', 'Data filmu nenalezena', xbmcgui.NOTIFICATION_WARNING)
-        xbmcplugin.endOfDirectory(_handle, succeeded=False)
-        return
+        # only this page is read from the index
+        for key, title, plot in source.items(params['file'], offset, limit):
+            listitem = xbmcgui.ListItem(label=title, offscreen=True)
+            if plot is not None:
+                listitem.setInfo('video', {'title': title, 'plot': plot})
+            listing.add(get_url(action='db', file=params['file'], key=key), listitem, True)
 
-    # Add "Refresh movie" option
-    listitem = xbmcgui.ListItem(label="Aktualizovat film")
-    listitem.setArt({'icon': 'DefaultAddonsSearch.png'})
-    xbmcplugin.addDirectoryItem(_handle, get_url(action='movie_refresh', movie_name=movie_name), listitem, True)
-
-    # Show movie file if available
-    if movie_data['file']:
-        movie_file = movie_data['file']
-        movie_title = f"{movie_name} - {movie_file['name']}"
-        info = _trakt_movie_info(movie_name)
-        poster = None
-        plot = ''
-        rating = None
-        if info:
-            img = info.get('images', {}).get('poster')
-            poster = img[0] if isinstance(img, list) and img else None
-            if poster and not poster.startswith('http'):
-                poster = 'https://' + poster
-            plot = info.get('overview') or ''
-            rating = info.get('rating')
-
-        listitem = xbmcgui.ListItem(label=movie_title)
-        art = {'icon': 'DefaultVideo.png'}
-        if poster:
-            art['thumb'] = poster
-        listitem.setArt(art)
-        listitem.setProperty('IsPlayable', 'true')
-        meta = {'title': movie_title}
-        if plot:
-            meta['plot'] = plot
-        if rating is not None:
-            meta['rating'] = rating
-        listitem.setInfo('video', meta)
-
-        url = get_url(action='play', ident=movie_file['ident'], name=movie_file['name'])
-        xbmcplugin.addDirectoryItem(_handle, url, listitem, False)
-
-    xbmcplugin.endOfDirectory(_handle)
-
-
-def movie_refresh(params):
-    """Refresh movie data"""
-    token = revalidate()
-    movie_name = params['movie_name']
+        if offset + limit < total:  # next page
+            listing.item(_addon.getLocalizedString(30207), get_url(action='db', file=params['file'], offset=offset + limit), True, icon='DefaultAddonsSearch.png')
+        # already in title order, sorting would mix the page items in
+    else:
+        listing.sort_methods = (xbmcplugin.SORT_METHOD_LABEL,)
+        listitem = listing.item(_addon.getLocalizedString(30222), get_url(action='db', search=1), True, icon='DefaultAddonsSearch.png')
+        # stays above the categories when sorted by label
+        listitem.setProperty('SpecialSort', 'top')
+        for dbfile in source.categories():
+            listing.item(os.path.splitext(dbfile)[0], get_url(action='db', file=dbfile))
+    source.close()
+    listing.finish(updateListing=updateListing)
 
-    # Initialize MovieManager and perform search
-    mm = movie_manager.MovieManager(_addon, _profile)
 
-    # Show progress dialog
-    progress = xbmcgui.DialogProgress()
-    progress.create('YaWSP', f'Aktualizuji data pro film {movie_name}...')
+def menu(params=None):
+    revalidate()
+    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name'))
+    listing = Listing(_handle)
 
-    try:
-        # Search for the movie
-        movie_data = mm.search_movie(movie_name, api, token)
+    # Add Movies Manager menu item
+    listing.item('Filmy', get_url(action='movie'), True, icon='DefaultMovies.png')
 
-        if not movie_data or not movie_data['file']:
-            progress.close()
-            popinfo('Nenalezen zadny film', icon=xbmcgui.NOTIFICATION_WARNING)
-            xbmcplugin.endOfDirectory(_handle, succeeded=False)
-            return
+    # Add Series Manager menu item
+    listing.item('Serialy', get_url(action='series'), True, icon='DefaultTVShows.png')
 
-        # Success
-        progress.close()
-        popinfo(f'Aktualizovano: {movie_data["file"]["name"]}')
+    listing.item(_addon.getLocalizedString(30201), get_url(action='search'), True, icon='DefaultAddonsSearch.png')
 
-        # Redirect to movie detail to refresh the view
-        xbmc.executebuiltin(f'Container.Update({get_url(action="movie_detail", movie_name=movie_name)})')
+    listing.item(_addon.getLocalizedString(30202), get_url(action='queue'), True, icon='DefaultPlaylist.png')
 
-    except Exception as e:
-        progress.close()
-        traceback.print_exc()
-        popinfo(f'Chyba: {str(e)}', icon=xbmcgui.NOTIFICATION_ERROR)
-        xbmcplugin.endOfDirectory(_handle, succeeded=False)
+    listing.item(_addon.getLocalizedString(30203), get_url(action='history'), True, icon='DefaultAddonsUpdates.png')
 
+    listing.item(_addon.getLocalizedString(30210), get_url(action='downloads'), True, icon='DefaultNetwork.png')
 
-def movie_trending(params):
-    """List trending movies from Trakt with paging."""
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + ' \\ Trending movies')
-
-    page = int(params.get('page', '1'))
-    limit = 20
-
-    data, headers = _trakt_request('movies/trending',
-                                   {'limit': limit, 'page': page,
-                                    'extended': 'full,images'})
-
-    if page > 1:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30206))
-        listitem.setArt({'icon': 'DefaultMovies.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='movie_trending', page=page - 1),
-                                    listitem, True)
-
-    for item in data:
-        movie = item.get('movie', {})
-        title = movie.get('title')
-        if not title:
-            continue
-        watchers = item.get('watchers', 0)
-        label = f"{title} ({watchers} users)"
-        listitem = xbmcgui.ListItem(label=label)
-        poster = movie.get('images', {}).get('poster')
-        thumb = poster[0] if isinstance(poster, list) and poster else None
-        if thumb and not thumb.startswith('http'):
-            thumb = 'https://' + thumb
-        art = {'icon': 'DefaultMovies.png'}
-        if thumb:
-            art['thumb'] = thumb
-        listitem.setArt(art)
-        info = {'title': title}
-        overview = movie.get('overview')
-        if overview:
-            info['plot'] = overview
-        rating = movie.get('rating')
-        if rating is not None:
-            info['rating'] = rating
-        listitem.setInfo('video', info)
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='movie_search', movie_name=title),
-                                    listitem, True)
-
-    page_count = int(headers.get('X-Pagination-Page-Count', page))
-    if page < page_count:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
-        listitem.setArt({'icon': 'DefaultMovies.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='movie_trending', page=page + 1),
-                                    listitem, True)
-
-    xbmcplugin.endOfDirectory(_handle)
-
-
-def movie_popular(params):
-    """List popular movies from Trakt with paging."""
-    xbmcplugin.setPluginCategory(_handle, _addon.getAddonInfo('name') + ' \\ Popular movies')
-
-    page = int(params.get('page', '1'))
-    limit = 20
-
-    data, headers = _trakt_request('movies/popular',
-                                   {'limit': limit, 'page': page,
-                                    'extended': 'full,images'})
-
-    if page > 1:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30206))
-        listitem.setArt({'icon': 'DefaultMovies.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='movie_popular', page=page - 1),
-                                    listitem, True)
-
-    for movie in data:
-        title = movie.get('title')
-        if not title:
-            continue
-        watchers = 0
-        ids = movie.get('ids', {})
-        slug = ids.get('slug') or ids.get('trakt')
-        if slug:
-            stats, _ = _trakt_request(f'movies/{slug}/stats')
-            if isinstance(stats, dict):
-                watchers = stats.get('watchers', 0)
-        label = f"{title} ({watchers} users)"
-        listitem = xbmcgui.ListItem(label=label)
-        poster = movie.get('images', {}).get('poster')
-        thumb = poster[0] if isinstance(poster, list) and poster else None
-        if thumb and not thumb.startswith('http'):
-            thumb = 'https://' + thumb
-        art = {'icon': 'DefaultMovies.png'}
-        if thumb:
-            art['thumb'] = thumb
-        listitem.setArt(art)
-        info = {'title': title}
-        overview = movie.get('overview')
-        if overview:
-            info['plot'] = overview
-        rating = movie.get('rating')
-        if rating is not None:
-            info['rating'] = rating
-        listitem.setInfo('video', info)
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='movie_search', movie_name=title),
-                                    listitem, True)
-
-    page_count = int(headers.get('X-Pagination-Page-Count', page))
-    if page < page_count:
-        listitem = xbmcgui.ListItem(label=_addon.getLocalizedString(30207))
-        listitem.setArt({'icon': 'DefaultMovies.png'})
-        xbmcplugin.addDirectoryItem(_handle,
-                                    get_url(action='movie_popular', page=page + 1),
-                                    listitem, True)
-
-    xbmcplugin.endOfDirectory(_handle)
+    if 'true' == _addon.getSetting('experimental'):
+        listing.item('Backup DB', get_url(action='db'), True, icon='DefaultAddonsZip.png')
+
+    listing.item(_addon.getLocalizedString(30225), get_url(action='diagnostics'), True, icon='DefaultIconInfo.png')
+
+    listing.item(_addon.getLocalizedString(30204), get_url(action='settings'), False, icon='DefaultAddonService.png')
+
+    listing.finish()
+
+
+# action -> (module, handler), None is this module. Other modules are
+# imported only when one of their actions runs.
+ROUTES = {
+    'search': (None, 'search'),
+    'queue': (None, 'queue'),
+    'history': (None, 'history'),
+    'settings': (None, 'settings'),
+    'info': (None, 'info'),
+    'play': (None, 'play'),
+    'download': (None, 'download'),
+    'downloads': (None, 'downloads'),
+    'db': (None, 'db'),
+    'diagnostics': (None, 'diagnostics'),
+    # Series Manager actions
+    'series': ('manager_views', 'series_menu'),
+    'series_search': ('manager_views', 'series_search'),
+    'series_trending': ('manager_views', 'series_trending'),
+    'series_popular': ('manager_views', 'series_popular'),
+    'series_detail': ('manager_views', 'series_detail'),
+    'series_season': ('manager_views', 'series_season'),
+    'series_refresh': ('manager_views', 'series_refresh'),
+    'series_download': ('manager_views', 'series_download'),
+    # Movie Manager actions
+    'movie': ('manager_views', 'movie_menu'),
+    'movie_search': ('manager_views', 'movie_search'),
+    'movie_trending': ('manager_views', 'movie_trending'),
+    'movie_popular': ('manager_views', 'movie_popular'),
+    'movie_detail': ('manager_views', 'movie_detail'),
+    'movie_refresh': ('manager_views', 'movie_refresh'),
+}
+
+
+def main(argv):
+    """Answer a plugin call, argv is the plugin URL, the handle and the query string."""
+    global _url, _handle
+    _url = argv[0]
+    _handle = int(argv[1])
+    router(argv[2][1:])
 
 
 def router(paramstring):
     params = dict(parse_qsl(paramstring))
-    if params:
-        if params['action'] == 'search':
-            search(params)
-        elif params['action'] == 'queue':
-            queue(params)
-        elif params['action'] == 'history':
-            history(params)
-        elif params['action'] == 'settings':
-            settings(params)
-        elif params['action'] == 'info':
-            info(params)
-        elif params['action'] == 'play':
-            play(params)
-        elif params['action'] == 'download':
-            download(params)
-        elif params['action'] == 'db':
-            db(params)
-        # Series Manager actions
-        elif params['action'] == 'series':
-            series_menu(params)
-        elif params['action'] == 'series_search':
-            series_search(params)
-        elif params['action'] == 'series_trending':
-            series_trending(params)
-        elif params['action'] == 'series_popular':
-            series_popular(params)
-        elif params['action'] == 'series_detail':
-            series_detail(params)
-        elif params['action'] == 'series_season':
-            series_season(params)
-        elif params['action'] == 'series_refresh':
-            series_refresh(params)
-        # Movie Manager actions
-        elif params['action'] == 'movie':
-            movie_menu(params)
-        elif params['action'] == 'movie_search':
-            movie_search(params)
-        elif params['action'] == 'movie_trending':
-            movie_trending(params)
-        elif params['action'] == 'movie_popular':
-            movie_popular(params)
-        elif params['action'] == 'movie_detail':
-            movie_detail(params)
-        elif params['action'] == 'movie_refresh':
-            movie_refresh(params)
-        else:
-            menu()
+    module, name = ROUTES.get(params.get('action'), (None, 'menu'))
+    if module is None:
+        handler = globals()[name]
     else:
-        menu()
\ No newline at end of file
+        handler = getattr(importlib.import_module(module), name)
+    handler(params)
+    join_background()
+    if _metrics is not None:
+        _metrics.flush()